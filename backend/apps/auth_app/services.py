@@ -7,6 +7,7 @@ from django.db import transaction
 from django.contrib.auth.models import update_last_login
 from .repositories import OTPRepository, UserRepository
 from .serializers import UserMinimalSerializer
+from apps.subscription.services import SubscriptionStateService
 
 logger = logging.getLogger(__name__)
 audit_logger = logging.getLogger('audit')
@@ -90,12 +91,7 @@ class AuthService:
 
         # Subscription check for Sales Executives
         if requested_role == "SALES_EXECUTIVE" and user.parent:
-            owner = user.parent
-            try:
-                subscription = owner.subscription
-                if not subscription or subscription.status != 'ACTIVE' or not subscription.is_active():
-                     return None, "Your plan has expired. Please contact your Owner to upgrade the subscription."
-            except Exception:
+            if not SubscriptionStateService.has_access(user.parent):
                 return None, "Your plan has expired. Please contact your Owner to upgrade the subscription."
 
         # 5. Role Validation
@@ -128,12 +124,7 @@ class AuthService:
 
         # Subscription check for Sales Executives
         if requested_role == "SALES_EXECUTIVE" and user.parent:
-            owner = user.parent
-            try:
-                subscription = owner.subscription
-                if not subscription or subscription.status != 'ACTIVE' or not subscription.is_active():
-                     return None, "Your plan has expired. Please contact your Owner to upgrade the subscription."
-            except Exception:
+            if not SubscriptionStateService.has_access(user.parent):
                 return None, "Your plan has expired. Please contact your Owner to upgrade the subscription."
 
         if requested_role:
@@ -0,0 +1,214 @@
+"""
+Checkout discount engine.
+
+An owner's active `DiscountRule` rows are compiled once into plain dicts keyed
+by code and cached under a per-owner version (bumped by the rule signals), and
+the Super Admin discount policy is cached the same way, so pricing a cart with
+promo codes costs no queries once warm. `evaluate` walks the cart once: item
+codes discount their own line, bill codes are checked against the discounted
+cart value and then either spread over the lines before tax or kept as an
+after-tax bill discount, and the whole discount is capped by the global policy.
+Deactivating a rule reaches other workers only because the cache is shared
+(CACHES in settings); the TTL merely bounds how long a stale entry can live.
+"""
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from . import tax
+
+POLICY_CACHE_KEY = "discount_policy"
+RULES_VERSION_KEY = "discount_rules_version:{owner_id}"
+RULES_CACHE_KEY = "discount_rules:{owner_id}:{version}"
+
+DEFAULT_POLICY = {
+    'enabled': True,
+    'allow_percent': True,
+    'allow_flat': True,
+    'max_percent': Decimal('100'),
+    'max_amount': Decimal('10000'),
+    'level': 'BOTH',
+    'before_tax': True,
+}
+
+
+def _cache_timeout():
+    return getattr(settings, 'DISCOUNT_CACHE_TIMEOUT', 300)
+
+
+def get_policy():
+    """Global discount switches and limits from the Super Admin settings."""
+    policy = cache.get(POLICY_CACHE_KEY)
+    if policy is None:
+        from apps.super_admin.models import SystemSettings
+        system_settings = SystemSettings.objects.first()
+        policy = dict(DEFAULT_POLICY)
+        if system_settings:
+            policy.update(
+                enabled=system_settings.enable_discounts,
+                allow_percent=system_settings.allow_percent_discount,
+                allow_flat=system_settings.allow_flat_discount,
+                max_percent=system_settings.max_discount_percentage,
+                max_amount=system_settings.max_discount_amount,
+                level=system_settings.allowed_discount_level,
+                before_tax=system_settings.discount_tax_config != 'AFTER_TAX',
+            )
+        cache.set(POLICY_CACHE_KEY, policy, _cache_timeout())
+    return policy
+
+
+def invalidate_policy():
+    cache.delete(POLICY_CACHE_KEY)
+
+
+def policy_violation(discount_type, value, applies_to, policy=None):
+    """(field, message) when a rule breaks the global policy, else None."""
+    policy = policy or get_policy()
+    if not policy['enabled']:
+        return 'detail', "Discount module is currently disabled by Super Admin."
+    if discount_type == 'percentage':
+        if not policy['allow_percent']:
+            return 'discount_type', "Percentage discounts are disabled by Super Admin."
+        if value > policy['max_percent']:
+            return 'value', f"Percentage cannot exceed global limit of {policy['max_percent']}% set by Super Admin."
+    elif discount_type == 'flat':
+        if not policy['allow_flat']:
+            return 'discount_type', "Flat-rate discounts are disabled by Super Admin."
+        if value > policy['max_amount']:
+            return 'value', f"Discount amount cannot exceed global limit of ₹{policy['max_amount']} set by Super Admin."
+    if policy['level'] == 'ITEM_ONLY' and applies_to == 'bill':
+        return 'applies_to', "Global rules only allow Item-level discounts."
+    if policy['level'] == 'BILL_ONLY' and applies_to == 'item':
+        return 'applies_to', "Global rules only allow Bill-level discounts."
+    return None
+
+
+def rules_version(owner_id):
+    return cache.get_or_set(RULES_VERSION_KEY.format(owner_id=owner_id), 1, None)
+
+
+def invalidate_rules(owner_id):
+    key = RULES_VERSION_KEY.format(owner_id=owner_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def compiled_rules(owner):
+    """{CODE: rule dict} for the owner's active rules that have not yet expired."""
+    owner_id = owner.id if owner else 0
+    key = RULES_CACHE_KEY.format(owner_id=owner_id, version=rules_version(owner_id))
+    rules = cache.get(key)
+    if rules is None:
+        from .models import DiscountRule
+        rows = DiscountRule.objects.filter(owner=owner, is_active=True, valid_to__gte=timezone.now()).values(
+            'id', 'code', 'discount_type', 'value', 'applies_to', 'min_order_value',
+            'max_discount_value', 'valid_from', 'valid_to', 'requires_approval',
+        )
+        rules = {row['code'].upper(): row for row in rows}
+        cache.set(key, rules, _cache_timeout())
+    return rules
+
+
+def _rule_amount(rule, base):
+    if rule['discount_type'] == 'percentage':
+        amount = tax.money(base * rule['value'] / 100)
+        if rule['max_discount_value'] is not None:
+            amount = min(amount, rule['max_discount_value'])
+    else:
+        amount = rule['value']
+    return min(tax.money(amount), base)
+
+
+def evaluate(owner, lines, bill_codes=(), can_approve=True, now=None):
+    """
+    Apply promo codes to a cart. `lines` are tax-engine line dicts that may carry
+    a `discount_code`; each gets a `discount_amount` set in place. Returns
+    {'bill_discount': after-tax bill discount, 'applied': [(rule_id, amount)]}.
+    """
+    item_codes = {line['discount_code'].strip().upper() for line in lines if line.get('discount_code')}
+    bill_codes = {code.strip().upper() for code in bill_codes if code}
+    result = {'bill_discount': tax.ZERO, 'applied': []}
+    if not item_codes and not bill_codes:
+        return result
+
+    policy = get_policy()
+    rules = compiled_rules(owner)
+    now = now or timezone.now()
+
+    def resolve(code, applies_to):
+        rule = rules.get(code)
+        if rule is None or rule['applies_to'] != applies_to or not rule['valid_from'] <= now <= rule['valid_to']:
+            raise ValidationError(f"Discount code {code} is not valid for this {applies_to}.")
+        if rule['requires_approval'] and not can_approve:
+            raise ValidationError(f"Discount code {code} needs owner approval.")
+        violation = policy_violation(rule['discount_type'], rule['value'], applies_to, policy)
+        if violation:
+            raise ValidationError(f"Discount code {code}: {violation[1]}")
+        return rule
+
+    item_applied, bill_applied = {}, {}
+    gross_total = cart_value = tax.ZERO
+    bases = []
+    for line in lines:
+        gross = tax.money(tax.to_decimal(line.get('quantity')) * tax.to_decimal(line.get('unit_price')))
+        discount = tax.ZERO
+        code = (line.get('discount_code') or '').strip().upper()
+        if code:
+            rule = resolve(code, 'item')
+            discount = _rule_amount(rule, gross)
+            item_applied[rule['id']] = item_applied.get(rule['id'], tax.ZERO) + discount
+        line['discount_amount'] = discount
+        gross_total += gross
+        cart_value += gross - discount
+        bases.append(gross - discount)
+
+    bill_discount = tax.ZERO
+    for code in sorted(bill_codes):
+        rule = resolve(code, 'bill')
+        if cart_value < rule['min_order_value']:
+            raise ValidationError(f"Discount code {code} needs a minimum bill of {rule['min_order_value']}.")
+        amount = _rule_amount(rule, cart_value - bill_discount)
+        bill_applied[rule['id']] = amount
+        bill_discount += amount
+
+    # Global cap: the whole discount may not exceed max_percent of the cart
+    cap = tax.money(gross_total * policy['max_percent'] / 100)
+    item_discount = gross_total - cart_value
+    if item_discount > cap:
+        raise ValidationError(f"Discounts cannot exceed {policy['max_percent']}% of the bill.")
+    if item_discount + bill_discount > cap:
+        ratio = (cap - item_discount) / bill_discount
+        bill_applied = {rule_id: tax.money(amount * ratio) for rule_id, amount in bill_applied.items()}
+        bill_discount = sum(bill_applied.values(), tax.ZERO)
+
+    if bill_discount and policy['before_tax']:
+        # Spread the bill discount over the lines so GST is charged on the reduced value
+        last = max(range(len(lines)), key=lambda index: bases[index])
+        remaining = bill_discount
+        for index, line in enumerate(lines):
+            if index != last:
+                share = tax.money(bill_discount * bases[index] / cart_value)
+                line['discount_amount'] += share
+                remaining -= share
+        lines[last]['discount_amount'] += remaining
+    else:
+        result['bill_discount'] = bill_discount
+
+    for applied in (item_applied, bill_applied):
+        result['applied'].extend((rule_id, amount) for rule_id, amount in applied.items() if amount)
+    return result
+
+
+def log_applied(invoice, applied, user):
+    """Bulk-write one DiscountLog per rule used on the invoice."""
+    from .models import DiscountLog
+    if applied:
+        DiscountLog.objects.bulk_create([
+            DiscountLog(rule_id=rule_id, invoice=invoice, applied_by=user, discount_amount=amount)
+            for rule_id, amount in applied
+        ])
@@ -0,0 +1,50 @@
+"""
+Rebuild the per-day product sales summary behind the product rankings.
+Invoices refresh their own day as they change; run this to backfill after a
+deploy or to repair days changed outside the billing services.
+
+Usage:
+    python manage.py refresh_product_sales              # last 2 days, every owner
+    python manage.py refresh_product_sales --days 365
+    python manage.py refresh_product_sales --owner-id 12 --days 30
+
+Cron (nightly):
+    15 1 * * * python manage.py refresh_product_sales >> logs/product_sales.log 2>&1
+"""
+
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from apps.billing.models import Invoice, ProductSalesDaily
+from apps.reports.services import ProductSalesService
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Rebuild daily product sales summaries from completed invoices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=2, help='How many days back to rebuild (including today)')
+        parser.add_argument('--owner-id', type=int, help='Only rebuild this owner')
+
+    def handle(self, *args, **options):
+        end = timezone.localdate()
+        start = end - timedelta(days=max(options['days'], 1) - 1)
+        if options.get('owner_id'):
+            if not User.objects.filter(pk=options['owner_id']).exists():
+                raise CommandError(f"Owner {options['owner_id']} not found")
+            owner_ids = [options['owner_id']]
+        else:
+            # Owners who billed in the window, plus any with summary rows to clear
+            owner_ids = set(Invoice.objects.filter(
+                owner__isnull=False, invoice_date__date__gte=start
+            ).values_list('owner_id', flat=True).distinct().order_by())
+            owner_ids.update(ProductSalesDaily.objects.filter(day__gte=start).values_list('owner_id', flat=True).distinct().order_by())
+
+        rows = 0
+        owners = 0
+        for owner_id in sorted(owner_ids):
+            rows += ProductSalesService.refresh(owner_id, start, end)
+            owners += 1
+        self.stdout.write(self.style.SUCCESS(f"✓ {rows} product-days summarised for {owners} owners ({start} to {end})"))
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:44
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0005_return_tracking'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='discountrule',
+            index=models.Index(fields=['owner', 'is_active', 'valid_to'], name='discount_rule_active_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:57
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0006_discount_rule_active_idx'),
+        ('customer', '0009_customer_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['status', 'invoice_date', 'owner'], include=('total_amount',), name='invoice_revenue_cover_idx'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.db.models import F, Sum, DecimalField, Index, UniqueConstraint, Chec
 from decimal import Decimal
 from apps.customer.models import Customer
 from apps.product.models import Product
+from .tax import compute_lines, money, split_tax, to_decimal
 
 class Invoice(models.Model):
     """POS Invoice/Bill information."""
@@ -147,6 +148,8 @@ class Invoice(models.Model):
             Index(fields=['customer', 'invoice_date']),
             Index(fields=['status', 'invoice_date']),
             Index(fields=['payment_status']),
+            # Cross-tenant revenue reports: filter on status/date, group by owner, sum totals
+            Index(fields=['status', 'invoice_date', 'owner'], include=['total_amount'], name='invoice_revenue_cover_idx'),
         ]
         constraints = [
             UniqueConstraint(fields=['invoice_number', 'owner'], name='unique_invoice_number_per_owner'),
@@ -157,27 +160,29 @@ class Invoice(models.Model):
     def __str__(self):
         return f"Invoice-{self.invoice_number}"
 
-    def calculate_tax(self):
-        """Calculate and update GST amounts."""
+    def calculate_tax(self, interstate=False):
+        """Calculate GST on the subtotal at the invoice-level rate."""
         if self.billing_mode == 'without_gst':
-            self.cgst_amount = Decimal('0')
-            self.sgst_amount = Decimal('0')
-            self.igst_amount = Decimal('0')
+            tax_amount = Decimal('0')
         else:
-            # Default: CGST + SGST (18% total)
-            # Convert tax_rate to Decimal to avoid type mismatch with float
-            tax_rate_decimal = Decimal(str(self.tax_rate)) if not isinstance(self.tax_rate, Decimal) else self.tax_rate
-            tax_amount = self.subtotal * (tax_rate_decimal / Decimal('100'))
-            self.cgst_amount = tax_amount / 2
-            self.sgst_amount = tax_amount / 2
-            self.igst_amount = Decimal('0')
-
-    def calculate_total(self):
+            tax_amount = money(to_decimal(self.subtotal) * to_decimal(self.tax_rate) / Decimal('100'))
+        self.cgst_amount, self.sgst_amount, self.igst_amount = split_tax(tax_amount, interstate)
+
+    def calculate_total(self, interstate=False):
         """Calculate invoice total."""
-        self.calculate_tax()
+        self.calculate_tax(interstate)
         self.total_amount = self.subtotal - self.discount_amount + self.cgst_amount + self.sgst_amount + self.igst_amount
         return self.total_amount
 
+    def apply_tax_totals(self, totals):
+        """Copy totals computed by `apps.billing.tax` from the invoice's own lines."""
+        self.subtotal = totals['subtotal']
+        self.cgst_amount = totals['cgst_amount']
+        self.sgst_amount = totals['sgst_amount']
+        self.igst_amount = totals['igst_amount']
+        self.total_amount = totals['total_amount']
+        return self.total_amount
+
     def get_remaining_amount(self):
         """Get unpaid amount."""
         return self.total_amount - self.paid_amount
@@ -203,6 +208,7 @@ class InvoiceItem(models.Model):
     product_code = models.CharField(max_length=50)
     
     quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    returned_quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     unit_price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
     
     discount_percent = models.DecimalField(
@@ -227,25 +233,38 @@ class InvoiceItem(models.Model):
 
     class Meta:
         ordering = ['id']
+        constraints = [
+            CheckConstraint(check=Q(returned_quantity__lte=F('quantity')), name='invoice_item_returned_lte_quantity'),
+        ]
 
     def __str__(self):
         return f"{self.product_name} x{self.quantity}"
 
-    def calculate_line_total(self):
-        """Calculate line item total with discount and tax."""
-        subtotal = self.quantity * self.unit_price
-        self.discount_amount = subtotal * (self.discount_percent / Decimal('100'))
-        after_discount = subtotal - self.discount_amount
-        
-        if self.invoice.billing_mode == 'with_gst':
-            self.tax_amount = after_discount * (self.tax_rate / Decimal('100'))
-            self.line_total = after_discount + self.tax_amount
-        else:
-            self.tax_amount = Decimal('0')
-            self.line_total = after_discount
-        
+    def calculate_line_total(self, billing_mode=None):
+        """Calculate line item total with discount and tax.
+
+        Pass `billing_mode` when pricing many lines of one invoice to skip the
+        lazy `self.invoice` fetch.
+        """
+        if billing_mode is None:
+            billing_mode = self.invoice.billing_mode
+        self.apply_tax_result(compute_lines([self.tax_input()], with_gst=billing_mode == 'with_gst')[0])
         return self.line_total
 
+    def tax_input(self):
+        return {
+            'quantity': self.quantity,
+            'unit_price': self.unit_price,
+            'discount_percent': self.discount_percent,
+            'discount_amount': self.discount_amount,
+            'tax_rate': self.tax_rate,
+        }
+
+    def apply_tax_result(self, result):
+        self.discount_amount = result['discount_amount']
+        self.tax_amount = result['tax_amount']
+        self.line_total = result['line_total']
+
 class InvoiceReturn(models.Model):
     """Return/Refund against an invoice."""
     
@@ -273,6 +292,12 @@ class InvoiceReturn(models.Model):
         validators=[MinValueValidator(0)]
     )
     
+    # GST reversed by this return (credit note)
+    taxable_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    cgst_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    sgst_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    igst_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
+    
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='initiated', db_index=True)
     
     notes = models.TextField(blank=True, null=True)
@@ -337,41 +362,12 @@ class DiscountRule(models.Model):
 
     def clean(self):
         from django.core.exceptions import ValidationError
-        from apps.super_admin.models import SystemSettings
-        from apps.common.models import CompanyProfile
-
-        # 1. Check Global Settings (Super Admin)
-        try:
-            settings = SystemSettings.objects.first()
-            if settings:
-                if not settings.enable_discounts:
-                    raise ValidationError("Discounts are globally disabled by Super Admin.")
-
-                if self.discount_type == 'percentage':
-                    if not settings.allow_percent_discount:
-                        raise ValidationError("Percentage discounts are globally disabled.")
-                    if self.value > settings.max_discount_percentage:
-                        raise ValidationError(f"Discount cannot exceed global limit of {settings.max_discount_percentage}%.")
-                
-                if self.discount_type == 'flat':
-                    if not settings.allow_flat_discount:
-                        raise ValidationError("Flat amount discounts are globally disabled.")
-                    if self.value > settings.max_discount_amount:
-                        raise ValidationError(f"Discount amount cannot exceed global limit of {settings.max_discount_amount}.")
-                
-                # Check level restrictions
-                if settings.allowed_discount_level == 'ITEM_ONLY' and self.applies_to == 'bill':
-                    raise ValidationError("Global rules only allow Item-level discounts.")
-                if settings.allowed_discount_level == 'BILL_ONLY' and self.applies_to == 'item':
-                    raise ValidationError("Global rules only allow Bill-level discounts.")
-
-        except SystemSettings.DoesNotExist:
-            pass # Should ideally exist, but don't block if not init
-
-        # 2. Check Company Settings (Owner) - Logic usually handled in Views/Serializers or here if we have context
-        # Since DiscountRule is linked to created_by, we can infer company if needed, but usually CompanyProfile is global or 1:1 in this system
-        # Assuming single tenant or handled by context.
-        pass
+        from .discounts import policy_violation
+
+        # Global Settings (Super Admin), read through the cached discount policy
+        violation = policy_violation(self.discount_type, self.value, self.applies_to)
+        if violation:
+            raise ValidationError(violation[1])
 
     def save(self, *args, **kwargs):
         self.clean()
@@ -386,6 +382,7 @@ class DiscountRule(models.Model):
             Index(fields=['code']),
             Index(fields=['valid_from', 'valid_to']),
             Index(fields=['is_active']),
+            Index(fields=['owner', 'is_active', 'valid_to'], name='discount_rule_active_idx'),
         ]
 
     def __str__(self):
@@ -410,3 +407,29 @@ class DiscountLog(models.Model):
 
     def __str__(self):
         return f"{self.rule.code if self.rule else 'Unknown'} on {self.invoice.invoice_number}"
+
+class ProductSalesDaily(models.Model):
+    """
+    Net sales of one product on one day (completed invoices, less returns).
+    Rebuilt for the affected day whenever an invoice changes, so product
+    rankings over any window sum a few rows per product instead of invoice lines.
+    """
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='product_sales_daily')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    day = models.DateField()
+    quantity = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # Taxable value
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)  # FIFO cost from the movement ledger
+    invoices = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            UniqueConstraint(fields=['owner', 'product', 'day'], name='unique_product_sales_day'),
+        ]
+        indexes = [
+            Index(fields=['owner', 'day'], name='product_sales_owner_day_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} on {self.day}: {self.quantity}"
@@ -35,6 +35,10 @@ class InvoiceItemRepository:
     def create_item(invoice, **kwargs):
         return InvoiceItem.objects.create(invoice=invoice, **kwargs)
 
+    @staticmethod
+    def bulk_create_items(items):
+        return InvoiceItem.objects.bulk_create(items)
+
 class InvoiceReturnRepository:
     @staticmethod
     def get_returns_by_invoice(invoice):
@@ -1,12 +1,12 @@
 from rest_framework import serializers
 from .models import Invoice, InvoiceItem, InvoiceReturn, DiscountRule, DiscountLog
-from apps.super_admin.models import SystemSettings
+from .discounts import policy_violation
 
 class InvoiceItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = InvoiceItem
         fields = [
-            'id', 'product', 'product_name', 'product_code', 'quantity',
+            'id', 'product', 'product_name', 'product_code', 'quantity', 'returned_quantity',
             'unit_price', 'discount_percent', 'discount_amount', 'line_total',
             'tax_rate', 'tax_amount'
         ]
@@ -105,9 +105,12 @@ class InvoiceReturnSerializer(serializers.ModelSerializer):
         model = InvoiceReturn
         fields = [
             'id', 'return_number', 'invoice', 'reason', 'returned_items',
-            'return_amount', 'refund_amount', 'status', 'notes', 'created_at'
+            'return_amount', 'refund_amount', 'taxable_amount', 'cgst_amount', 'sgst_amount', 'igst_amount',
+            'status', 'notes', 'processed_at', 'created_at'
+        ]
+        read_only_fields = [
+            'return_number', 'taxable_amount', 'cgst_amount', 'sgst_amount', 'igst_amount', 'processed_at', 'created_at'
         ]
-        read_only_fields = ['return_number', 'created_at']
 
 class DiscountRuleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -122,37 +125,13 @@ class DiscountRuleSerializer(serializers.ModelSerializer):
 
     def validate(self, data):
         """Enforce Super Admin Global Controls"""
-        settings = SystemSettings.objects.first()
-        if not settings:
-            return data # Should ideally not happen, but fail safe
-
-        # 1. Check if feature is enabled
-        if not settings.enable_discounts:
-            raise serializers.ValidationError({"detail": "Discount module is currently disabled by Super Admin."})
-
         discount_type = data.get('discount_type', self.instance.discount_type if self.instance else 'percentage')
         value = data.get('value', self.instance.value if self.instance else 0)
+        applies_to = data.get('applies_to', self.instance.applies_to if self.instance else 'bill')
 
-        # 2. Check Allowed Types
-        if discount_type == 'percentage' and not settings.allow_percent_discount:
-            raise serializers.ValidationError({"discount_type": "Percentage discounts are disabled by Super Admin."})
-        
-        if discount_type == 'flat' and not settings.allow_flat_discount:
-             raise serializers.ValidationError({"discount_type": "Flat-rate discounts are disabled by Super Admin."})
-
-        # 3. Check Global Limits
-        if discount_type == 'percentage':
-            if value > settings.max_discount_percentage:
-                raise serializers.ValidationError({
-                    "value": f"Percentage cannot exceed global limit of {settings.max_discount_percentage}% set by Super Admin."
-                })
-        
-        elif discount_type == 'flat':
-             if value > settings.max_discount_amount:
-                raise serializers.ValidationError({
-                    "value": f"Discount amount cannot exceed global limit of ₹{settings.max_discount_amount} set by Super Admin."
-                })
-
+        violation = policy_violation(discount_type, value, applies_to)
+        if violation:
+            raise serializers.ValidationError({violation[0]: violation[1]})
         return data
 
 class DiscountLogSerializer(serializers.ModelSerializer):
@@ -1,14 +1,23 @@
+import copy
 import logging
 import uuid
 from decimal import Decimal
 from django.db import transaction, models
+from django.db.models import Case, F, IntegerField, Value, When
 from django.utils import timezone
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from .repositories import InvoiceRepository, InvoiceItemRepository, InvoiceReturnRepository, DiscountRepository
+from .models import Invoice, InvoiceItem
 from .serializers import InvoiceSerializer
+from . import discounts, tax
 from apps.common.serializers import CompanyProfileSerializer
 from apps.common.helpers import get_user_owner
 from apps.common.models import CompanyProfile
+from apps.customer.services import CustomerLedgerService, CustomerStatsService
+from apps.product.models import InventoryBatch, InventoryMovement, Product
+from apps.product.signals import detect_threshold_crossing
+from apps.reports.services import GSTReturnCache, ProductSalesService
+from apps.subscription import quotas
 from apps.super_admin.models import SystemSettings
 from apps.users.utils import has_permission
 
@@ -81,6 +90,7 @@ class BillingService:
     def create_invoice(cls, user, data):
         cls._check_billing_permission(user)
         owner = get_user_owner(user)
+        quotas.reserve(owner, 'invoices')
         
         # 1. Prepare Initial Data
         company_profile = CompanyProfile.objects.filter(owner=owner).first()
@@ -115,70 +125,75 @@ class BillingService:
         
         invoice.tax_rate = Decimal(str(data.get('tax_rate', '18')))
 
-        # 4. Process Items
+        # 4. Place of supply decides CGST/SGST vs IGST for every line
+        customer_state = None
+        if invoice.customer:
+            address = invoice.customer.addresses.filter(models.Q(type='billing') | models.Q(is_default=True)).first() or invoice.customer.addresses.first()
+            if address:
+                customer_state = address.state
+        interstate = tax.is_interstate(company_snapshot.get('state'), customer_state)
+
+        # 5. Price all lines in one pass; lines without their own rate use the invoice rate
         items_data = data.get('items', [])
+        line_inputs = []
         for item in items_data:
             product_id = item.get('id')
             valid_product_id = int(product_id) if (isinstance(product_id, int) or (isinstance(product_id, str) and product_id.isdigit())) else None
+            line_inputs.append({
+                'product_id': valid_product_id,
+                'product_name': item.get('name', 'Unknown Product'),
+                'product_code': item.get('sku', ''),
+                'quantity': int(item.get('qty', 1)),
+                'unit_price': Decimal(str(item.get('price', 0))),
+                'tax_rate': Decimal(str(item['tax'])) if item.get('tax') not in (None, '') else None,
+                'discount_code': item.get('discount_code'),
+            })
 
-            invoice_item = InvoiceItemRepository.create_item(
+        # Promo codes: item codes discount their line, bill codes the whole cart
+        bill_codes = data.get('discount_codes') or ([data['discount_code']] if data.get('discount_code') else [])
+        promotions = discounts.evaluate(owner, line_inputs, bill_codes, can_approve=user.is_superuser or owner == user)
+        invoice.discount_amount = tax.money(invoice.discount_amount) + promotions['bill_discount']
+
+        pricing = tax.compute_invoice(
+            line_inputs,
+            with_gst=invoice.billing_mode == 'with_gst',
+            interstate=interstate,
+            default_rate=invoice.tax_rate,
+            discount_amount=invoice.discount_amount,
+        )
+        invoice_items = InvoiceItemRepository.bulk_create_items([
+            InvoiceItem(
                 invoice=invoice,
-                product_id=valid_product_id,
-                product_name=item.get('name', 'Unknown Product'),
-                product_code=item.get('sku', ''),
-                quantity=int(item.get('qty', 1)),
-                unit_price=Decimal(str(item.get('price', 0))),
-                tax_rate=Decimal(str(item.get('tax', 0))),
-                discount_percent=0 
+                product_id=line['product_id'],
+                product_name=line['product_name'],
+                product_code=line['product_code'],
+                quantity=line['quantity'],
+                unit_price=line['unit_price'],
+                tax_rate=result['tax_rate'],
+                discount_percent=0,
+                discount_amount=result['discount_amount'],
+                tax_amount=result['tax_amount'],
+                line_total=result['line_total'],
             )
-            invoice_item.calculate_line_total()
-            invoice_item.save()
-
-            if valid_product_id:
-                try:
-                    from apps.product.models import Product
-                    product = Product.objects.get(id=valid_product_id)
-                    product.deduct_stock(
-                        quantity=invoice_item.quantity,
-                        reference_id=invoice.id,
-                        reference_type='invoice',
-                        user=user
-                    )
-                except Product.DoesNotExist:
-                    pass
-
-        # 5. Final Calculations
-        from django.db.models import Sum
-        invoice.subtotal = invoice.items.aggregate(total=Sum('line_total'))['total'] or Decimal('0')
-        
-        # GST State Logic
-        customer_state = None
-        if invoice.customer:
-            address = invoice.customer.addresses.filter(models.Q(type='billing') | models.Q(is_default=True)).first() or invoice.customer.addresses.first()
-            if address:
-                customer_state = address.state
+            for line, result in zip(line_inputs, pricing['lines'])
+        ])
 
-        company_state = (company_snapshot.get('state') or '').lower()
-        
-        if invoice.billing_mode == 'with_gst':
-            tax_rate_decimal = Decimal(str(invoice.tax_rate))
-            tax_amount = invoice.subtotal * (tax_rate_decimal / Decimal('100'))
-            
-            if customer_state and company_state and customer_state.lower() != company_state:
-                 invoice.igst_amount = tax_amount
-                 invoice.cgst_amount = Decimal('0')
-                 invoice.sgst_amount = Decimal('0')
-            else:
-                 invoice.cgst_amount = tax_amount / 2
-                 invoice.sgst_amount = tax_amount / 2
-                 invoice.igst_amount = Decimal('0')
-            
-            invoice.total_amount = invoice.subtotal - invoice.discount_amount + invoice.igst_amount + invoice.cgst_amount + invoice.sgst_amount
-        else:
-             invoice.calculate_total()
-        
+        products = Product.objects.in_bulk({line['product_id'] for line in line_inputs if line['product_id']})
+        for invoice_item, result in zip(invoice_items, pricing['lines']):
+            product = products.get(invoice_item.product_id)
+            if product:
+                product.deduct_stock(
+                    quantity=invoice_item.quantity,
+                    reference_id=invoice.id,
+                    reference_type='invoice',
+                    user=user,
+                    unit_price=(result['taxable_value'] / invoice_item.quantity).quantize(Decimal('0.0001')),
+                )
+
+        # 6. Final Calculations
+        invoice.apply_tax_totals(pricing)
         if billing_settings.get('invoice_round_off', False):
-            invoice.total_amount = Decimal(str(round(float(invoice.total_amount))))
+            invoice.total_amount = tax.round_off(invoice.total_amount)
         
         # Payment Status
         requested_payment_status = data.get('payment_status', 'unpaid')
@@ -190,26 +205,58 @@ class BillingService:
             invoice.payment_status = requested_payment_status
         
         invoice.save()
+        discounts.log_applied(invoice, promotions['applied'], user)
+        CustomerLedgerService.post_invoice(invoice)
+        if invoice.status == 'completed':
+            ProductSalesService.schedule_refresh(invoice)
+            CustomerStatsService.schedule_refresh(invoice)
         return invoice
 
+    @classmethod
+    def price_invoice(cls, invoice):
+        """Recompute line, tax and HSN figures for an invoice from its stored items."""
+        return tax.compute_invoice(
+            invoice.items.values(
+                'quantity', 'unit_price', 'discount_percent', 'discount_amount', 'tax_rate', hsn_code=models.F('product__hsn_code')
+            ),
+            with_gst=invoice.billing_mode == 'with_gst',
+            interstate=invoice.igst_amount > 0,
+            discount_amount=invoice.discount_amount,
+        )
+
     @classmethod
     def get_invoice(cls, user, pk):
         owner = get_user_owner(user) if not user.is_super_admin else None
         return InvoiceRepository.get_invoice_by_id(pk, owner=owner)
 
     @classmethod
+    @transaction.atomic
     def update_invoice(cls, user, pk, data, partial=False):
         cls._check_billing_permission(user)
         invoice = cls.get_invoice(user, pk)
+        before = copy.copy(invoice)
         serializer = InvoiceSerializer(invoice, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        return serializer.save()
+        invoice = serializer.save()
+        CustomerLedgerService.post_invoice_change(before, invoice)
+        GSTReturnCache.invalidate(invoice.owner_id)
+        ProductSalesService.schedule_refresh(invoice)
+        if before.invoice_date != invoice.invoice_date:
+            ProductSalesService.schedule_refresh(before)
+        CustomerStatsService.schedule_refresh(invoice)
+        return invoice
 
     @classmethod
+    @transaction.atomic
     def delete_invoice(cls, user, pk):
         cls._check_billing_permission(user)
         invoice = cls.get_invoice(user, pk)
+        # Settle its open debit before the entries lose their invoice link
+        CustomerLedgerService.post_invoice_change(invoice)
         invoice.delete()
+        GSTReturnCache.invalidate(invoice.owner_id)
+        ProductSalesService.schedule_refresh(invoice)
+        CustomerStatsService.schedule_refresh(invoice)
         return True
 
     @classmethod
@@ -220,15 +267,13 @@ class BillingService:
         if invoice.status != 'draft':
             raise ValidationError("Items can only be added to draft invoices.")
         
-        from django.db.models import Sum
-        for item_data in items_data:
-            from .models import InvoiceItem
-            item = InvoiceItem.objects.create(invoice=invoice, **item_data)
-            item.calculate_line_total()
-            item.save()
-        
-        invoice.subtotal = invoice.items.aggregate(total=Sum('line_total'))['total'] or Decimal('0')
-        invoice.calculate_total()
+        new_items = [InvoiceItem(invoice=invoice, **item_data) for item_data in items_data]
+        for item in new_items:
+            item.calculate_line_total(billing_mode=invoice.billing_mode)
+        InvoiceItemRepository.bulk_create_items(new_items)
+
+        # Re-price the whole bill so invoice totals come from the same line math
+        invoice.apply_tax_totals(cls.price_invoice(invoice))
         invoice.save()
         return invoice
 
@@ -239,36 +284,263 @@ class BillingService:
         if invoice.status == 'cancelled':
             raise ValidationError("Cannot complete a cancelled invoice.")
         invoice.complete()
+        GSTReturnCache.invalidate(invoice.owner_id)
+        ProductSalesService.schedule_refresh(invoice)
+        CustomerStatsService.schedule_refresh(invoice)
         return invoice
 
     @classmethod
+    @transaction.atomic
     def cancel_invoice(cls, user, pk):
         cls._check_billing_permission(user)
         invoice = cls.get_invoice(user, pk)
         if invoice.status in ['cancelled', 'returned']:
             raise ValidationError(f"Cannot cancel a {invoice.status} invoice.")
         invoice.cancel()
+        GSTReturnCache.invalidate(invoice.owner_id)
+        ProductSalesService.schedule_refresh(invoice)
+        CustomerStatsService.schedule_refresh(invoice)
+        # Write off whatever the customer still owed on it
+        CustomerLedgerService.post([{
+            'customer_id': invoice.customer_id, 'entry_type': 'adjustment', 'invoice_id': invoice.id,
+            'credit': invoice.total_amount - invoice.paid_amount,
+            'description': f"Invoice {invoice.invoice_number} cancelled",
+        }])
         return invoice
 
     @classmethod
-    @transaction.atomic
     def create_return(cls, user, pk, data):
         cls._check_billing_permission(user)
         invoice = cls.get_invoice(user, pk)
-        
-        return_number = f"RET-{timezone.now().strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
-        
+        return InvoiceReturnService.process_return(user, invoice, data)
+
+class InvoiceReturnService:
+    """
+    Processes a return against an invoice in a fixed number of queries.
+
+    Returned quantities are validated against the locked invoice lines in one read
+    and valued with the shared tax engine, so the credit note reverses exactly the
+    line tax that was billed. Stock goes back to the batches the sale consumed
+    (read from the invoice's sale movements) through set-wise CASE updates, and
+    `return` movements carrying the original unit cost and price are bulk-inserted
+    so FIFO margins net the return out. The invoice totals, paid amount, status
+    and customer ledger move in the same transaction.
+    """
+
+    @staticmethod
+    def _case_increment(field, increments):
+        return Case(
+            *[When(id=pk, then=F(field) + Value(amount)) for pk, amount in increments.items()],
+            default=F(field),
+            output_field=IntegerField(),
+        )
+
+    @staticmethod
+    def _parse_quantities(returned_items):
+        quantities = {}
+        for entry in returned_items or []:
+            try:
+                item_id, quantity = int(entry['item_id']), int(entry['quantity'])
+            except (KeyError, TypeError, ValueError):
+                raise ValidationError("Each returned item needs an integer item_id and quantity.")
+            if quantity <= 0:
+                raise ValidationError(f"Return quantity for item {item_id} must be positive.")
+            quantities[item_id] = quantities.get(item_id, 0) + quantity
+        if not quantities:
+            raise ValidationError("returned_items must list at least one {item_id, quantity}.")
+        return quantities
+
+    @staticmethod
+    def _allocate_to_batches(invoice, quantities_by_product):
+        """
+        Split each product's returned quantity over the batches its sale drew from,
+        latest consumed first, net of earlier returns. Returns
+        [(product_id, batch_id, quantity, unit_cost, unit_price)]; units with no
+        sale movement left come back as loose stock (batch_id None, unknown cost).
+        """
+        outstanding = {}
+        rows = InventoryMovement.objects.filter(
+            product_id__in=quantities_by_product,
+            reference_id=invoice.id,
+            reference_type__in=['invoice', 'invoice_return'],
+        ).values_list('product_id', 'batch_id', 'quantity', 'unit_cost', 'unit_price').order_by('id')
+        for product_id, batch_id, quantity, unit_cost, unit_price in rows:
+            entry = outstanding.setdefault((product_id, batch_id), [0, unit_cost, unit_price])
+            entry[0] -= quantity  # sales are negative, earlier returns positive
+            if quantity < 0:
+                entry[1], entry[2] = unit_cost, unit_price
+
+        allocations = []
+        for product_id, quantity in quantities_by_product.items():
+            candidates = [(key, entry) for key, entry in outstanding.items() if key[0] == product_id and entry[0] > 0]
+            for (_, batch_id), (available, unit_cost, unit_price) in reversed(candidates):
+                if quantity <= 0:
+                    break
+                take = min(available, quantity)
+                allocations.append((product_id, batch_id, take, unit_cost, unit_price))
+                quantity -= take
+            if quantity > 0:
+                allocations.append((product_id, None, quantity, None, None))
+        return allocations
+
+    @classmethod
+    @transaction.atomic
+    def process_return(cls, user, invoice, data):
+        invoice = Invoice.objects.select_for_update().get(pk=invoice.pk)
+        if invoice.status in ('draft', 'cancelled'):
+            raise ValidationError(f"Cannot return items on a {invoice.status} invoice.")
+        quantities = cls._parse_quantities(data.get('returned_items'))
+
+        # 1. Validate against the invoice lines (one locked read)
+        items = {item.id: item for item in invoice.items.select_for_update()}
+        unknown = set(quantities) - set(items)
+        if unknown:
+            raise ValidationError(f"Items {sorted(unknown)} are not on invoice {invoice.invoice_number}.")
+        for item_id, quantity in quantities.items():
+            item = items[item_id]
+            if quantity > item.quantity - item.returned_quantity:
+                raise ValidationError(
+                    f"Cannot return {quantity} of {item.product_name}; "
+                    f"{item.quantity - item.returned_quantity} left on the invoice."
+                )
+
+        # 2. Value the return with the invoice's own line tax
+        returned = [items[item_id] for item_id in quantities]
+        pricing = tax.compute_invoice(
+            [
+                dict(item.tax_input(), quantity=quantities[item.id],
+                     discount_amount=item.discount_amount * quantities[item.id] / item.quantity)
+                for item in returned
+            ],
+            with_gst=invoice.billing_mode == 'with_gst',
+            interstate=invoice.igst_amount > 0,
+        )
+        # The bill-level discount is given back in proportion to the pre-discount value returned
+        remaining = invoice.subtotal + invoice.cgst_amount + invoice.sgst_amount + invoice.igst_amount
+        discount_share = Decimal('0')
+        if invoice.discount_amount > 0 and remaining > 0:
+            discount_share = min(tax.money(invoice.discount_amount * pricing['total_amount'] / remaining), invoice.discount_amount)
+        return_amount = min(pricing['total_amount'] - discount_share, invoice.total_amount)
+        new_total = invoice.total_amount - return_amount
+        min_refund = max(invoice.paid_amount - new_total, Decimal('0'))
+        refund_amount = tax.money(data['refund_amount']) if data.get('refund_amount') not in (None, '') else min_refund
+        if refund_amount < min_refund:
+            raise ValidationError(f"Refund at least {min_refund}; the customer has paid more than the reduced bill.")
+        if refund_amount > invoice.paid_amount:
+            raise ValidationError(f"Cannot refund more than the {invoice.paid_amount} paid on this invoice.")
+
+        InvoiceItem.objects.filter(id__in=quantities).update(
+            returned_quantity=cls._case_increment('returned_quantity', quantities)
+        )
+
+        # 3. Restock products and the batches the sale consumed
+        quantities_by_product, unit_prices = {}, {}
+        for item, result in zip(returned, pricing['lines']):
+            if item.product_id:
+                quantities_by_product[item.product_id] = quantities_by_product.get(item.product_id, 0) + quantities[item.id]
+                unit_prices[item.product_id] = (result['taxable_value'] / quantities[item.id]).quantize(Decimal('0.0001'))
+        if quantities_by_product:
+            cls._restock(user, invoice, quantities_by_product, unit_prices)
+
+        # 4. Credit note, invoice totals and customer ledger
+        now = timezone.now()
+        return_number = f"RET-{now.strftime('%Y%m%d')}-{str(uuid.uuid4())[:6].upper()}"
         return_obj = InvoiceReturnRepository.create_return(
             return_number=return_number,
             invoice=invoice,
-            reason=data.get('reason'),
-            returned_items=data.get('returned_items', []),
-            return_amount=data.get('return_amount', 0),
-            refund_amount=data.get('refund_amount', 0),
-            created_by_id=user.id
+            reason=data.get('reason') or '',
+            notes=data.get('notes'),
+            returned_items=[{'item_id': item_id, 'quantity': quantity} for item_id, quantity in quantities.items()],
+            return_amount=return_amount,
+            refund_amount=refund_amount,
+            taxable_amount=pricing['subtotal'],
+            cgst_amount=pricing['cgst_amount'],
+            sgst_amount=pricing['sgst_amount'],
+            igst_amount=pricing['igst_amount'],
+            status='processed',
+            created_by_id=user.id,
+            processed_by_id=user.id,
+            processed_at=now,
         )
+
+        invoice.subtotal = max(invoice.subtotal - pricing['subtotal'], Decimal('0'))
+        invoice.cgst_amount = max(invoice.cgst_amount - pricing['cgst_amount'], Decimal('0'))
+        invoice.sgst_amount = max(invoice.sgst_amount - pricing['sgst_amount'], Decimal('0'))
+        invoice.igst_amount = max(invoice.igst_amount - pricing['igst_amount'], Decimal('0'))
+        invoice.discount_amount -= discount_share
+        invoice.total_amount = new_total
+        invoice.paid_amount -= refund_amount
+        if invoice.paid_amount >= invoice.total_amount:
+            invoice.payment_status = 'paid'
+        else:
+            invoice.payment_status = 'partial' if invoice.paid_amount > 0 else 'unpaid'
+        if all(item.returned_quantity + quantities.get(item.id, 0) >= item.quantity for item in items.values()):
+            invoice.status = 'returned'
+        invoice.save(update_fields=[
+            'subtotal', 'cgst_amount', 'sgst_amount', 'igst_amount', 'discount_amount', 'total_amount',
+            'paid_amount', 'payment_status', 'status', 'updated_at',
+        ])
+        GSTReturnCache.invalidate(invoice.owner_id)
+        ProductSalesService.schedule_refresh(invoice)
+        CustomerStatsService.schedule_refresh(invoice)
+
+        # Returned goods reduce what the customer owes; cash refunded puts it back.
+        CustomerLedgerService.post([
+            {
+                'customer_id': invoice.customer_id, 'entry_type': 'return', 'invoice_id': invoice.id,
+                'credit': return_amount, 'reference_id': return_number,
+                'description': f"Return {return_number}",
+            },
+            {
+                'customer_id': invoice.customer_id, 'entry_type': 'refund', 'invoice_id': invoice.id,
+                'debit': refund_amount, 'reference_id': return_number,
+                'description': f"Refund for {return_number}",
+            },
+        ])
         return return_obj
 
+    @classmethod
+    def _restock(cls, user, invoice, quantities_by_product, unit_prices):
+        products = Product.objects.select_for_update().in_bulk(list(quantities_by_product))
+        allocations = cls._allocate_to_batches(invoice, quantities_by_product)
+
+        batch_increments = {}
+        movements = []
+        for product_id, batch_id, quantity, unit_cost, unit_price in allocations:
+            if product_id not in products:
+                continue
+            if batch_id:
+                batch_increments[batch_id] = batch_increments.get(batch_id, 0) + quantity
+            movements.append(InventoryMovement(
+                batch_id=batch_id,
+                product_id=product_id,
+                change_type='return',
+                quantity=quantity,
+                unit_cost=unit_cost if unit_cost is not None else (products[product_id].cost_price or 0),
+                unit_price=unit_price if unit_price is not None else unit_prices.get(product_id),
+                reference_id=invoice.id,
+                reference_type='invoice_return',
+                created_by_id=user.id if user else None,
+            ))
+
+        now = timezone.now()
+        Product.objects.filter(id__in=products).update(
+            stock=cls._case_increment('stock', {pk: quantities_by_product[pk] for pk in products}),
+            updated_at=now,
+        )
+        if batch_increments:
+            InventoryBatch.objects.filter(id__in=batch_increments).update(
+                remaining_quantity=cls._case_increment('remaining_quantity', batch_increments),
+                updated_at=now,
+            )
+        InventoryMovement.objects.bulk_create(movements)
+
+        # Emit threshold events from the in-memory products (no extra reads).
+        for product_id, product in products.items():
+            old_stock = product.stock
+            product.stock = old_stock + quantities_by_product[product_id]
+            detect_threshold_crossing(product, old_stock)
+
 class DiscountService:
     @classmethod
     def list_rules(cls, user):
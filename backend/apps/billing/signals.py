@@ -0,0 +1,22 @@
+"""
+Cache invalidation for the discount engine.
+
+Compiled discount rules are cached per owner and the global discount policy
+once for everyone; both are dropped here whenever their source rows change.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from apps.super_admin.models import SystemSettings
+from . import discounts
+from .models import DiscountRule
+
+
+@receiver([post_save, post_delete], sender=DiscountRule)
+def invalidate_discount_rules(sender, instance, **kwargs):
+    discounts.invalidate_rules(instance.owner_id or 0)
+
+
+@receiver(post_save, sender=SystemSettings)
+def invalidate_discount_policy(sender, **kwargs):
+    discounts.invalidate_policy()
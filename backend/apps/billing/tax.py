@@ -0,0 +1,141 @@
+"""
+GST computation shared by billing, returns and tax reports.
+
+Everything works on plain line dicts so one call can price a single bill, every
+line of a batch of invoices, or rows streamed out of a `.values()` query. Each
+line is taxed once on its own taxable value (quantity x price less discount);
+the tax is rounded per line and split into CGST/SGST (intra-state) or IGST
+(inter-state). Invoice totals and HSN summaries are sums of those rounded
+figures, so the numbers on a bill, a return and a GST report always agree.
+
+Line keys: quantity, unit_price, discount_percent (or a flat discount_amount),
+tax_rate, hsn_code, plus the optional per-line overrides with_gst and interstate
+(used when a batch mixes invoices).
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+ZERO = Decimal('0')
+CENT = Decimal('0.01')
+HUNDRED = Decimal('100')
+
+
+def to_decimal(value):
+    if value is None or value == '':
+        return ZERO
+    if isinstance(value, Decimal):
+        return value
+    return Decimal(str(value))
+
+
+def money(value):
+    return to_decimal(value).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def round_off(amount):
+    """Round a bill total to the nearest rupee."""
+    return to_decimal(amount).quantize(Decimal('1'), rounding=ROUND_HALF_UP).quantize(CENT)
+
+
+def is_interstate(company_state, customer_state):
+    """Place of supply: IGST only when both states are known and differ."""
+    company_state = (company_state or '').strip().lower()
+    customer_state = (customer_state or '').strip().lower()
+    return bool(company_state and customer_state and company_state != customer_state)
+
+
+def split_tax(tax_amount, interstate=False):
+    """Return (cgst, sgst, igst); SGST takes the odd paisa so the halves add up."""
+    tax_amount = money(tax_amount)
+    if interstate:
+        return ZERO, ZERO, tax_amount
+    cgst = (tax_amount / 2).quantize(CENT, rounding=ROUND_HALF_UP)
+    return cgst, tax_amount - cgst, ZERO
+
+
+def compute_lines(lines, with_gst=True, interstate=False, default_rate=None):
+    """Price every line in one pass; returns a list of result dicts in input order."""
+    default_rate = to_decimal(default_rate)
+    factors = {}
+    results = []
+    for line in lines:
+        quantity = to_decimal(line.get('quantity'))
+        gross = quantity * to_decimal(line.get('unit_price'))
+        discount_percent = to_decimal(line.get('discount_percent'))
+        if discount_percent:
+            discount = money(gross * discount_percent / HUNDRED)
+        else:
+            discount = min(money(line.get('discount_amount')), money(gross))
+        taxable = money(gross) - discount
+
+        rate = line.get('tax_rate')
+        rate = default_rate if rate is None else to_decimal(rate)
+        if not line.get('with_gst', with_gst):
+            rate = ZERO
+        factor = factors.get(rate)
+        if factor is None:
+            factor = factors[rate] = rate / HUNDRED
+
+        tax = money(taxable * factor)
+        cgst, sgst, igst = split_tax(tax, line.get('interstate', interstate))
+        results.append({
+            'hsn_code': line.get('hsn_code') or '',
+            'quantity': quantity,
+            'tax_rate': rate,
+            'discount_amount': discount,
+            'taxable_value': taxable,
+            'cgst_amount': cgst,
+            'sgst_amount': sgst,
+            'igst_amount': igst,
+            'tax_amount': tax,
+            'line_total': taxable + tax,
+        })
+    return results
+
+
+def summarize(results, discount_amount=ZERO):
+    """Invoice-level totals from computed lines, less any bill-level discount."""
+    subtotal = cgst = sgst = igst = ZERO
+    for row in results:
+        subtotal += row['taxable_value']
+        cgst += row['cgst_amount']
+        sgst += row['sgst_amount']
+        igst += row['igst_amount']
+    return {
+        'subtotal': subtotal,
+        'cgst_amount': cgst,
+        'sgst_amount': sgst,
+        'igst_amount': igst,
+        'tax_amount': cgst + sgst + igst,
+        'total_amount': subtotal - money(discount_amount) + cgst + sgst + igst,
+    }
+
+
+def hsn_summary(results):
+    """Group computed lines by (HSN code, rate), sorted the way GSTR-1 lists them."""
+    groups = {}
+    for row in results:
+        key = (row['hsn_code'], row['tax_rate'])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                'hsn_code': key[0], 'tax_rate': key[1], 'quantity': ZERO,
+                'taxable_value': ZERO, 'cgst_amount': ZERO, 'sgst_amount': ZERO,
+                'igst_amount': ZERO, 'tax_amount': ZERO, 'total_value': ZERO,
+            }
+        group['quantity'] += row['quantity']
+        group['taxable_value'] += row['taxable_value']
+        group['cgst_amount'] += row['cgst_amount']
+        group['sgst_amount'] += row['sgst_amount']
+        group['igst_amount'] += row['igst_amount']
+        group['tax_amount'] += row['tax_amount']
+        group['total_value'] += row['line_total']
+    return [groups[key] for key in sorted(groups)]
+
+
+def compute_invoice(lines, with_gst=True, interstate=False, default_rate=None, discount_amount=ZERO):
+    """Lines, totals and HSN summary for a single bill."""
+    results = compute_lines(lines, with_gst=with_gst, interstate=interstate, default_rate=default_rate)
+    totals = summarize(results, discount_amount=discount_amount)
+    totals['lines'] = results
+    totals['hsn_summary'] = hsn_summary(results)
+    return totals
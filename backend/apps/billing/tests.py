@@ -62,3 +62,250 @@ class BillingModelTests(TestCase):
         )
         item.calculate_line_total()
         self.assertEqual(item.line_total, Decimal('2360.00'))
+
+
+class TaxEngineTests(TestCase):
+    """Test the shared GST engine and its use in billing."""
+
+    def test_lines_split_by_place_of_supply_and_hsn(self):
+        """Test per-line rounding, CGST/SGST vs IGST and the HSN summary."""
+        from .tax import compute_invoice
+        lines = [
+            {'quantity': 3, 'unit_price': '33.33', 'tax_rate': '5', 'hsn_code': '0401'},
+            {'quantity': 1, 'unit_price': '100.00', 'discount_percent': '10', 'tax_rate': '18', 'hsn_code': '8471'},
+            {'quantity': 2, 'unit_price': '10.00', 'tax_rate': '5', 'hsn_code': '0401'},
+        ]
+        local = compute_invoice(lines)
+        self.assertEqual(local['subtotal'], Decimal('209.99'))
+        self.assertEqual(local['cgst_amount'] + local['sgst_amount'], Decimal('22.20'))
+        self.assertEqual(local['cgst_amount'], Decimal('11.10'))
+        self.assertEqual(local['total_amount'], Decimal('232.19'))
+        self.assertEqual([row['hsn_code'] for row in local['hsn_summary']], ['0401', '8471'])
+        self.assertEqual(local['hsn_summary'][0]['taxable_value'], Decimal('119.99'))
+
+        interstate = compute_invoice(lines, interstate=True)
+        self.assertEqual(interstate['igst_amount'], Decimal('22.20'))
+        self.assertEqual(interstate['cgst_amount'], Decimal('0'))
+
+    def test_create_invoice_taxes_lines_once(self):
+        """Test invoice totals are not taxed a second time at the invoice rate."""
+        from apps.common.models import CompanyProfile
+        from apps.customer.models import CustomerAddress
+        from apps.auth_app.models import User
+        from .services import BillingService
+        owner = User.objects.create_user(phone='9000000050', password='test123', is_superuser=True)
+        CompanyProfile.objects.create(
+            owner=owner, company_name='Tax Co', company_code='TAX', tax_id='29ABCDE1234F1Z5',
+            email='tax@example.com', phone='9000000050', state='Karnataka', established_date='2020-04-01'
+        )
+        customer = Customer.objects.create(phone='9222222222', name='Outstation', owner=owner)
+        CustomerAddress.objects.create(
+            customer=customer, type='billing', address_line_1='1 Road', city='Pune',
+            state='Maharashtra', postal_code='411001', is_default=True
+        )
+
+        invoice = BillingService.create_invoice(owner, {
+            'customer': customer.id,
+            'billing_mode': 'with_gst',
+            'tax_rate': '18',
+            'items': [
+                {'name': 'Laptop', 'sku': 'L1', 'qty': 1, 'price': '1000.00', 'tax': '18'},
+                {'name': 'Milk', 'sku': 'M1', 'qty': 2, 'price': '50.00', 'tax': '5'},
+            ],
+        })
+        self.assertEqual(invoice.subtotal, Decimal('1100.00'))
+        self.assertEqual(invoice.igst_amount, Decimal('185.00'))
+        self.assertEqual(invoice.cgst_amount, Decimal('0'))
+        self.assertEqual(invoice.total_amount, Decimal('1285.00'))
+        self.assertEqual(sorted(invoice.items.values_list('line_total', flat=True)), [Decimal('105.00'), Decimal('1180.00')])
+
+
+class InvoiceReturnServiceTests(TestCase):
+    """Test returns restock, reverse tax and settle the invoice."""
+
+    def setUp(self):
+        from apps.auth_app.models import User
+        from apps.product.models import InventoryBatch
+        from .services import BillingService
+        self.owner = User.objects.create_user(phone='9000000070', password='test123', is_superuser=True)
+        category = Category.objects.create(name='Returns')
+        self.products = []
+        for index in range(3):
+            product = Product.objects.create(
+                product_code=f'RET{index}', name=f'Returnable {index}', category=category,
+                unit_price=Decimal('100.00'), cost_price=Decimal('50.00'), tax_rate=Decimal('18.00'),
+                stock=20, reorder_level=0, owner=self.owner
+            )
+            InventoryBatch.objects.create(product=product, received_quantity=20, remaining_quantity=20, unit_cost=Decimal('40.00'))
+            self.products.append(product)
+        self.invoice = BillingService.create_invoice(self.owner, {
+            'billing_mode': 'with_gst',
+            'status': 'completed',
+            'payment_status': 'paid',
+            'items': [{'id': p.id, 'name': p.name, 'sku': p.product_code, 'qty': 4, 'price': '100.00', 'tax': '18'} for p in self.products],
+        })
+        self.items = list(self.invoice.items.order_by('id'))
+
+    def test_return_restocks_batches_and_reverses_tax(self):
+        """Test a partial return refunds the paid invoice and puts stock back on its batch."""
+        from apps.product.models import InventoryMovement
+        from .services import BillingService
+        first = self.items[0]
+        return_obj = BillingService.create_return(self.owner, self.invoice.id, {
+            'reason': 'Damaged', 'returned_items': [{'item_id': first.id, 'quantity': 3}],
+        })
+
+        self.assertEqual(return_obj.taxable_amount, Decimal('300.00'))
+        self.assertEqual(return_obj.cgst_amount, Decimal('27.00'))
+        self.assertEqual(return_obj.return_amount, Decimal('354.00'))
+        self.assertEqual(return_obj.refund_amount, Decimal('354.00'))
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.total_amount, Decimal('1062.00'))
+        self.assertEqual(self.invoice.paid_amount, Decimal('1062.00'))
+        self.assertEqual(self.invoice.payment_status, 'paid')
+        self.assertEqual(self.invoice.status, 'completed')
+
+        product = self.products[0]
+        product.refresh_from_db()
+        self.assertEqual(product.stock, 19)
+        self.assertEqual(product.batches.get().remaining_quantity, 19)
+        movement = InventoryMovement.objects.get(change_type='return')
+        self.assertEqual((movement.quantity, movement.unit_cost, movement.unit_price), (3, Decimal('40.00'), Decimal('100.0000')))
+
+        with self.assertRaises(Exception):
+            BillingService.create_return(self.owner, self.invoice.id, {'returned_items': [{'item_id': first.id, 'quantity': 2}]})
+
+    def test_bulk_return_costs_a_fixed_number_of_queries(self):
+        """Test returning every line uses as many queries as returning one, and closes the invoice."""
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import BillingService
+        with CaptureQueriesContext(connection) as single:
+            BillingService.create_return(self.owner, self.invoice.id, {'returned_items': [{'item_id': self.items[0].id, 'quantity': 1}]})
+        with CaptureQueriesContext(connection) as bulk:
+            BillingService.create_return(self.owner, self.invoice.id, {
+                'returned_items': [{'item_id': item.id, 'quantity': 4 if index else 3} for index, item in enumerate(self.items)],
+            })
+        self.assertEqual(len(bulk), len(single))
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.status, 'returned')
+        self.assertEqual(self.invoice.total_amount, Decimal('0.00'))
+        self.assertEqual(self.invoice.paid_amount, Decimal('0.00'))
+        self.assertEqual(sorted(Product.objects.filter(owner=self.owner).values_list('stock', flat=True)), [20, 20, 20])
+
+
+    def test_return_gives_back_only_the_discounted_price(self):
+        """Test a bill-level discount is apportioned so a full return credits no more than was billed."""
+        from .services import BillingService
+        customer = Customer.objects.create(phone='9333333332', name='Discounted', owner=self.owner)
+        product = self.products[0]
+        invoice = BillingService.create_invoice(self.owner, {
+            'billing_mode': 'with_gst', 'status': 'completed', 'customer': customer.id, 'discount_amount': '100.00',
+            'items': [{'id': product.id, 'name': product.name, 'sku': product.product_code, 'qty': 10, 'price': '100.00', 'tax': '18'}],
+        })
+        self.assertEqual(invoice.total_amount, Decimal('1080.00'))
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_credit_used, Decimal('1080.00'))
+        item = invoice.items.get()
+
+        half = BillingService.create_return(self.owner, invoice.id, {'returned_items': [{'item_id': item.id, 'quantity': 5}]})
+        rest = BillingService.create_return(self.owner, invoice.id, {'returned_items': [{'item_id': item.id, 'quantity': 5}]})
+
+        self.assertEqual((half.return_amount, rest.return_amount), (Decimal('540.00'), Decimal('540.00')))
+        invoice.refresh_from_db()
+        self.assertEqual((invoice.total_amount, invoice.discount_amount), (Decimal('0.00'), Decimal('0.00')))
+        customer.refresh_from_db()
+        self.assertEqual(customer.current_credit_used, Decimal('0.00'))
+
+
+class DiscountEngineTests(TestCase):
+    """Test compiled discount rules applied at checkout."""
+
+    def setUp(self):
+        from datetime import timedelta
+        from django.core.cache import cache
+        from django.utils import timezone
+        from apps.auth_app.models import User
+        from .models import DiscountRule
+        cache.clear()
+        self.owner = User.objects.create_user(phone='9000000080', password='test123', is_superuser=True)
+        window = {'valid_from': timezone.now() - timedelta(days=1), 'valid_to': timezone.now() + timedelta(days=1)}
+        DiscountRule.objects.create(
+            name='Ten off item', code='ITEM10', discount_type='percentage', value=Decimal('10'),
+            applies_to='item', created_by=self.owner, owner=self.owner, **window
+        )
+        DiscountRule.objects.create(
+            name='Fifty off', code='BILL50', discount_type='flat', value=Decimal('50'), applies_to='bill',
+            min_order_value=Decimal('500'), created_by=self.owner, owner=self.owner, **window
+        )
+
+    def test_codes_discount_lines_before_tax_and_are_logged(self):
+        """Test item and bill codes reduce taxable value and write one log per rule."""
+        from .models import DiscountLog
+        from .services import BillingService
+        invoice = BillingService.create_invoice(self.owner, {
+            'billing_mode': 'with_gst',
+            'discount_code': 'bill50',
+            'items': [
+                {'name': 'Shirt', 'sku': 'S1', 'qty': 2, 'price': '300.00', 'tax': '5', 'discount_code': 'ITEM10'},
+                {'name': 'Cap', 'sku': 'C1', 'qty': 1, 'price': '100.00', 'tax': '5'},
+            ],
+        })
+        # 600 - 60 item discount, then 50 spread 540:100 over the lines before tax
+        self.assertEqual(invoice.subtotal, Decimal('590.00'))
+        self.assertEqual(invoice.discount_amount, Decimal('0'))
+        self.assertEqual(sorted(invoice.items.values_list('discount_amount', flat=True)), [Decimal('7.81'), Decimal('102.19')])
+        self.assertEqual(invoice.cgst_amount + invoice.sgst_amount, Decimal('29.50'))
+        logs = dict(DiscountLog.objects.filter(invoice=invoice).values_list('rule__code', 'discount_amount'))
+        self.assertEqual(logs, {'ITEM10': Decimal('60.00'), 'BILL50': Decimal('50.00')})
+
+    def test_warm_cache_evaluates_without_queries_and_rejects_bad_codes(self):
+        """Test compiled rules are served from cache and invalid carts are refused."""
+        from rest_framework.exceptions import ValidationError
+        from . import discounts
+        lines = [{'quantity': 1, 'unit_price': '100.00', 'discount_code': 'ITEM10'}]
+        discounts.evaluate(self.owner, [dict(line) for line in lines])
+        with self.assertNumQueries(0):
+            result = discounts.evaluate(self.owner, lines)
+        self.assertEqual(lines[0]['discount_amount'], Decimal('10.00'))
+        self.assertEqual(result['applied'][0][1], Decimal('10.00'))
+
+        with self.assertRaises(ValidationError):
+            discounts.evaluate(self.owner, [{'quantity': 1, 'unit_price': '100.00'}], ['BILL50'])
+        with self.assertRaises(ValidationError):
+            discounts.evaluate(self.owner, [{'quantity': 1, 'unit_price': '100.00', 'discount_code': 'NOPE'}])
+
+class InvoiceLedgerSyncTests(TestCase):
+    """Test direct invoice edits and deletes keep receivables in step with the ledger."""
+
+    def setUp(self):
+        from apps.auth_app.models import User
+        from apps.customer.services import CustomerLedgerService
+        self.owner = User.objects.create_user(phone='9000000071', password='test123', is_superuser=True)
+        self.customer = Customer.objects.create(phone='9333333331', name='Ledger Sync', owner=self.owner)
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-SYNC-1', customer=self.customer, owner=self.owner,
+            status='completed', total_amount=Decimal('1000.00'), paid_amount=Decimal('200.00')
+        )
+        CustomerLedgerService.post_invoice(self.invoice)
+
+    def test_edit_posts_the_difference(self):
+        from .services import BillingService
+        BillingService.update_invoice(self.owner, self.invoice.id, {'paid_amount': '500.00'}, partial=True)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_credit_used, Decimal('500.00'))
+
+        BillingService.update_invoice(self.owner, self.invoice.id, {'status': 'cancelled'}, partial=True)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_credit_used, Decimal('0.00'))
+
+    def test_delete_settles_the_open_debit(self):
+        from apps.customer.models import CustomerLedgerEntry
+        from .services import BillingService
+        BillingService.delete_invoice(self.owner, self.invoice.id)
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_credit_used, Decimal('0.00'))
+        self.assertFalse(CustomerLedgerEntry.objects.filter(customer=self.customer, open_amount__gt=0).exists())
@@ -0,0 +1,117 @@
+"""
+Streaming readers for tabular uploads (CSV / XLSX / JSON) used by the bulk import jobs.
+
+Rows are yielded one at a time as `(row_number, dict)` so callers can validate and
+write in fixed-size chunks without loading the whole file into memory.
+"""
+import csv
+import io
+import json
+import os
+from itertools import islice
+
+from rest_framework.exceptions import ValidationError
+
+SUPPORTED_EXTENSIONS = ('.csv', '.xlsx', '.json', '.jsonl')
+
+
+def _normalise_header(value):
+    return str(value or '').strip().lower().replace(' ', '_')
+
+
+def _clean_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.strip()
+    return value
+
+
+def iter_csv_rows(fileobj):
+    """Yield (row_number, row_dict) from a binary CSV file object."""
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    try:
+        header = [_normalise_header(h) for h in next(reader)]
+    except StopIteration:
+        return
+    for index, values in enumerate(reader, start=2):
+        if not any(v.strip() for v in values):
+            continue
+        yield index, {key: _clean_cell(val) for key, val in zip(header, values) if key}
+
+
+def iter_xlsx_rows(fileobj):
+    """Yield (row_number, row_dict) from an XLSX workbook (first sheet)."""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ValidationError("XLSX import requires the 'openpyxl' package. Upload a CSV file instead.")
+
+    workbook = load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        try:
+            header = [_normalise_header(h) for h in next(rows)]
+        except StopIteration:
+            return
+        for index, values in enumerate(rows, start=2):
+            if not any(v not in (None, '') for v in values):
+                continue
+            yield index, {key: _clean_cell(val) for key, val in zip(header, values) if key}
+    finally:
+        workbook.close()
+
+
+def _json_row(index, item):
+    if not isinstance(item, dict):
+        raise ValidationError(f"Row {index}: expected a JSON object")
+    return index, {_normalise_header(key): _clean_cell(val) for key, val in item.items()}
+
+
+def iter_json_rows(fileobj):
+    """Yield (row_number, row_dict) from a JSON array of objects."""
+    try:
+        data = json.load(io.TextIOWrapper(fileobj, encoding='utf-8-sig'))
+    except ValueError as e:
+        raise ValidationError(f"Invalid JSON file: {e}")
+    if isinstance(data, dict):
+        data = data.get('rows') or data.get('items') or []
+    for index, item in enumerate(data, start=1):
+        yield _json_row(index, item)
+
+
+def iter_jsonl_rows(fileobj):
+    """Yield (row_number, row_dict) from JSON Lines, one object per line (true streaming)."""
+    for index, line in enumerate(io.TextIOWrapper(fileobj, encoding='utf-8-sig'), start=1):
+        if not line.strip():
+            continue
+        try:
+            item = json.loads(line)
+        except ValueError as e:
+            raise ValidationError(f"Line {index}: invalid JSON ({e})")
+        yield _json_row(index, item)
+
+
+def iter_tabular_rows(fileobj, file_name):
+    """Dispatch on file extension and stream rows from the upload."""
+    extension = os.path.splitext(file_name or '')[1].lower()
+    if extension == '.csv':
+        return iter_csv_rows(fileobj)
+    if extension == '.xlsx':
+        return iter_xlsx_rows(fileobj)
+    if extension == '.json':
+        return iter_json_rows(fileobj)
+    if extension == '.jsonl':
+        return iter_jsonl_rows(fileobj)
+    raise ValidationError(f"Unsupported file type '{extension}'. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+
+def chunked(iterable, size):
+    """Split an iterable into lists of at most `size` items."""
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
@@ -0,0 +1,86 @@
+"""
+Lightweight background job runner.
+
+There is no task queue in this deployment, so jobs run on a daemon thread once the
+surrounding transaction commits. Progress is persisted on `BackgroundJob` so any
+worker process can report it. Management commands call `run_job` directly.
+"""
+import logging
+import threading
+
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from .models import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+# Cap stored row errors so a badly formatted file cannot bloat the job row.
+MAX_ERROR_REPORT_ROWS = 1000
+
+
+def run_job(job, handler):
+    """Execute `handler(job)` synchronously and record the outcome on the job."""
+    BackgroundJob.objects.filter(pk=job.pk).update(status='running', started_at=timezone.now())
+    job.status = 'running'
+    try:
+        result = handler(job) or {}
+        job.status = 'completed'
+        job.result = result
+    except Exception as e:
+        logger.exception("Background job %s failed", job.pk)
+        job.status = 'failed'
+        job.result = {'detail': str(e)}
+    job.finished_at = timezone.now()
+    job.save(update_fields=[
+        'status', 'result', 'finished_at', 'total_rows', 'processed_rows',
+        'success_count', 'error_count', 'error_report'
+    ])
+    return job
+
+
+def start_background_job(job, handler):
+    """Run `handler(job)` on a worker thread after the current transaction commits."""
+    def _target():
+        close_old_connections()
+        try:
+            run_job(job, handler)
+        finally:
+            close_old_connections()
+
+    def _start():
+        threading.Thread(target=_target, name=f"job-{job.pk}", daemon=True).start()
+
+    transaction.on_commit(_start)
+    return job
+
+
+def report_progress(job, processed_rows, success_count, error_count, new_errors=None):
+    """Persist chunk progress without touching the rest of the job row."""
+    job.processed_rows = processed_rows
+    job.success_count = success_count
+    job.error_count = error_count
+    if new_errors:
+        room = MAX_ERROR_REPORT_ROWS - len(job.error_report)
+        if room > 0:
+            job.error_report.extend(new_errors[:room])
+    BackgroundJob.objects.filter(pk=job.pk).update(
+        processed_rows=processed_rows,
+        success_count=success_count,
+        error_count=error_count,
+        error_report=job.error_report,
+    )
+
+
+def run_after_commit(func, *args, **kwargs):
+    """Fire-and-forget `func(*args, **kwargs)` on a worker thread once the transaction commits."""
+    def _target():
+        close_old_connections()
+        try:
+            func(*args, **kwargs)
+        except Exception:
+            logger.exception("Deferred task %s failed", getattr(func, '__name__', func))
+        finally:
+            close_old_connections()
+
+    transaction.on_commit(lambda: threading.Thread(target=_target, daemon=True).start())
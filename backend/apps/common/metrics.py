@@ -0,0 +1,121 @@
+"""
+Declarative metrics engine.
+
+A spec is a list of `Metric`s. Each one names the `Source` it reads (a queryset
+to aggregate, or a function returning a dict), the aggregate expressions it
+needs, and how to turn the collected values into its output. The engine merges
+the aggregates of every metric per source, computing identical expressions once
+even when metrics give them different aliases, so each source costs exactly one
+query. Independent sources run concurrently on a bounded thread pool, except
+inside an open transaction, whose uncommitted rows only its own connection can
+see. Failures propagate instead of turning into zeros.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import close_old_connections, connection
+
+
+class Source:
+    """Where metric values come from: `queryset(context)` to aggregate, or `fetch(context)` -> dict."""
+
+    def __init__(self, name, queryset=None, fetch=None):
+        if (queryset is None) == (fetch is None):
+            raise ImproperlyConfigured(f"Source {name} needs exactly one of queryset or fetch.")
+        self.name = name
+        self.queryset = queryset
+        self.fetch = fetch
+
+
+class Metric:
+    """
+    One output value at a dotted `name` ('sales.total'). `compute(values)` gets
+    every collected value keyed by alias; without it the single aggregate's
+    value is returned as is.
+    """
+
+    def __init__(self, name, source, aggregates=None, compute=None):
+        if compute is None and len(aggregates or {}) != 1:
+            raise ImproperlyConfigured(f"Metric {name} needs compute() unless it has exactly one aggregate.")
+        self.name = name
+        self.source = source
+        self.aggregates = aggregates or {}
+        self.compute = compute or (lambda values, alias=next(iter(self.aggregates), None): values[alias])
+
+
+class MetricsEngine:
+    def __init__(self, metrics, max_workers=None):
+        self.metrics = list(metrics)
+        self.max_workers = max_workers or getattr(settings, 'METRICS_MAX_WORKERS', 4)
+        self.sources = {}
+        self.plans = {}     # source name -> {alias: expression} actually queried
+        self.aliases = {}   # requested alias -> queried alias
+        for metric in self.metrics:
+            self._register(metric)
+
+    def _register(self, metric):
+        source = metric.source
+        known = self.sources.setdefault(source.name, source)
+        if known is not source:
+            raise ImproperlyConfigured(f"Two different sources are named {source.name}.")
+        plan = self.plans.setdefault(source.name, {})
+        for alias, expression in metric.aggregates.items():
+            if alias in self.aliases:
+                if self._expression(alias) != expression:
+                    raise ImproperlyConfigured(f"Aggregate alias {alias} is defined twice with different expressions.")
+                continue
+            duplicate = next((queried for queried, existing in plan.items() if existing == expression), None)
+            if duplicate is None:
+                plan[alias] = expression
+                duplicate = alias
+            self.aliases[alias] = duplicate
+
+    def _expression(self, alias):
+        queried = self.aliases[alias]
+        return next(plan[queried] for plan in self.plans.values() if queried in plan)
+
+    def _run_source(self, name, context, threaded):
+        source = self.sources[name]
+        started = time.perf_counter()
+        try:
+            if source.fetch is not None:
+                values = source.fetch(context)
+            else:
+                values = source.queryset(context).aggregate(**self.plans[name]) if self.plans[name] else {}
+        finally:
+            if threaded:
+                close_old_connections()
+        return values, (time.perf_counter() - started) * 1000
+
+    def run(self, context):
+        """Returns (nested results, {source name: milliseconds})."""
+        names = list(self.sources)
+        threaded = self.max_workers > 1 and len(names) > 1 and not connection.in_atomic_block
+        if threaded:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(names))) as pool:
+                outcomes = list(pool.map(lambda name: self._run_source(name, context, True), names))
+        else:
+            outcomes = [self._run_source(name, context, False) for name in names]
+
+        values, timings = {}, {}
+        for name, (source_values, elapsed) in zip(names, outcomes):
+            values.update(source_values)
+            timings[name] = round(elapsed, 2)
+        for alias, queried in self.aliases.items():
+            values[alias] = values[queried]
+
+        results = {}
+        for metric in self.metrics:
+            *groups, leaf = metric.name.split('.')
+            target = results
+            for group in groups:
+                target = target.setdefault(group, {})
+            target[leaf] = metric.compute(values)
+        return results, timings
+
+    @staticmethod
+    def server_timing(timings):
+        """Format timings for a `Server-Timing` response header."""
+        return ', '.join(f"{name};dur={elapsed}" for name, elapsed in timings.items())
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('common', '0008_document_sequence'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='documentsequence',
+            name='doc_type',
+            field=models.CharField(choices=[('invoice', 'Invoice'), ('po', 'Purchase Order'), ('grn', 'Goods Receipt Note'), ('customer', 'Customer')], max_length=20),
+        ),
+    ]
@@ -332,3 +332,77 @@ class AppNotification(models.Model):
         
     def __str__(self):
         return f"{self.title} - {self.user.username}"
+
+
+class BackgroundJob(models.Model):
+    """
+    Long-running work (bulk imports, recalculations) executed outside the request cycle.
+    Progress and per-row errors are written back here so clients can poll for status.
+    """
+
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('failed', 'Failed'),
+    ]
+
+    job_type = models.CharField(max_length=50, db_index=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', db_index=True)
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='background_jobs')
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name='created_background_jobs')
+
+    source_file = models.FileField(upload_to='jobs/', blank=True, null=True)
+    options = models.JSONField(default=dict, blank=True)
+
+    total_rows = models.IntegerField(default=0)
+    processed_rows = models.IntegerField(default=0)
+    success_count = models.IntegerField(default=0)
+    error_count = models.IntegerField(default=0)
+    error_report = models.JSONField(default=list, blank=True, help_text="Per-row errors: [{'row': n, 'errors': {...}}]")
+    result = models.JSONField(default=dict, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', 'job_type', '-created_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.job_type} #{self.pk} ({self.status})"
+
+
+class DocumentSequence(models.Model):
+    """
+    Locked counter for human-readable document numbers (PO, GRN, customer ids, ...).
+    One row per owner and document type; owner is NULL for numbers that must be
+    unique across all tenants. Seeded from the matching SystemSettings sequence
+    (customer ids from the highest existing CUS- number).
+    """
+
+    DOC_TYPE_CHOICES = [
+        ('invoice', 'Invoice'),
+        ('po', 'Purchase Order'),
+        ('grn', 'Goods Receipt Note'),
+        ('customer', 'Customer'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='document_sequences')
+    doc_type = models.CharField(max_length=20, choices=DOC_TYPE_CHOICES)
+    next_value = models.PositiveIntegerField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['owner', 'doc_type'], name='unique_owner_document_sequence'),
+            models.UniqueConstraint(
+                fields=['doc_type'], condition=models.Q(owner__isnull=True), name='unique_global_document_sequence'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.doc_type} sequence ({self.owner_id or 'global'}) -> {self.next_value}"
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 from django.contrib.auth import get_user_model
-from .models import CompanyProfile, EmailTemplate, NotificationPreference, AuditTrail, SystemSettings
+from .models import CompanyProfile, EmailTemplate, NotificationPreference, AuditTrail, SystemSettings, BackgroundJob
 
 User = get_user_model()
 
@@ -189,6 +189,25 @@ class SystemSettingsSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['id', 'created_at', 'updated_at', 'updated_by']
     
+    def _validate_number_format(self, value):
+        """Number formats must render with the supported placeholders and include {SEQUENCE}."""
+        if '{SEQUENCE}' not in value:
+            raise serializers.ValidationError("Format must include {SEQUENCE}.")
+        try:
+            value.format(PREFIX='P', YEAR='2000', MONTH='01', DAY='01', SEQUENCE=1)
+        except (KeyError, IndexError, ValueError):
+            raise serializers.ValidationError("Format may only use {PREFIX}, {YEAR}, {MONTH}, {DAY} and {SEQUENCE}.")
+        return value
+
+    def validate_invoice_number_format(self, value):
+        return self._validate_number_format(value)
+
+    def validate_po_number_format(self, value):
+        return self._validate_number_format(value)
+
+    def validate_grn_number_format(self, value):
+        return self._validate_number_format(value)
+
     def validate_default_tax_rate(self, value):
         """Validate tax rate is between 0 and 100."""
         if not (0 <= value <= 100):
@@ -230,3 +249,22 @@ class SystemSettingsSerializer(serializers.ModelSerializer):
         if value < 1:
             raise serializers.ValidationError("API rate limit period must be at least 1 minute.")
         return value
+
+
+class BackgroundJobSerializer(serializers.ModelSerializer):
+    """Serialize BackgroundJob status for polling clients."""
+    progress_percent = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BackgroundJob
+        fields = [
+            'id', 'job_type', 'status', 'options', 'total_rows', 'processed_rows',
+            'success_count', 'error_count', 'progress_percent', 'error_report',
+            'result', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+    def get_progress_percent(self, obj):
+        if not obj.total_rows:
+            return 100 if obj.status == 'completed' else 0
+        return min(100, round(obj.processed_rows * 100 / obj.total_rows))
@@ -0,0 +1,13 @@
+"""
+Keeps document sequence counters in step with System Settings.
+"""
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+
+from . import sequences
+from .models import SystemSettings
+
+
+@receiver(post_save, sender=SystemSettings)
+def sync_document_sequences(sender, instance, **kwargs):
+    sequences.sync_from_settings(instance)
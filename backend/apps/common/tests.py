@@ -1,3 +1,85 @@
-from django.test import TestCase
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
 
-# Create your tests here.
+from .models import DocumentSequence, SystemSettings
+from . import sequences
+
+User = get_user_model()
+
+class DocumentSequenceTests(TestCase):
+    """Test locked document number sequences."""
+
+    def setUp(self):
+        sequences.clear_reserved_blocks()
+        self.owner = User.objects.create_user(phone='9000000020', password='test123')
+        self.other = User.objects.create_user(phone='9000000021', password='test123')
+        SystemSettings.objects.create(po_prefix='PO', po_number_format='{PREFIX}/{SEQUENCE}', next_po_sequence=100)
+
+    def test_sequences_are_per_owner_and_seeded_from_settings(self):
+        """Test each owner counts independently from the configured start."""
+        self.assertEqual(sequences.next_number('po', owner=self.owner), 'PO/100')
+        self.assertEqual(sequences.next_number('po', owner=self.owner), 'PO/101')
+        self.assertEqual(sequences.next_number('po', owner=self.other), 'PO/100')
+        self.assertEqual(DocumentSequence.objects.get(owner=self.owner, doc_type='po').next_value, 102)
+
+    @override_settings(DOCUMENT_SEQUENCE_BLOCK_SIZES={'po': 5})
+    def test_block_reservation_serves_from_memory(self):
+        """Test a committed block hands out numbers without touching the counter."""
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(sequences.next_value('po', owner=self.owner), 100)
+        with self.assertNumQueries(0):
+            self.assertEqual(sequences.next_value('po', owner=self.owner), 101)
+        self.assertEqual(DocumentSequence.objects.get(owner=self.owner, doc_type='po').next_value, 105)
+
+
+    def test_raising_the_setting_moves_existing_counters(self):
+        """Test a higher start in System Settings applies to counters already in use, a lower one does not."""
+        sequences.next_value('po', owner=self.owner)
+        system_settings = SystemSettings.objects.get()
+        system_settings.next_po_sequence = 5000
+        system_settings.save()
+        self.assertEqual(sequences.next_value('po', owner=self.owner), 5000)
+
+        system_settings.next_po_sequence = 10
+        system_settings.save()
+        self.assertEqual(sequences.next_value('po', owner=self.owner), 5001)
+
+
+class MetricsEngineTests(TestCase):
+    """Test declarative metrics run one deduplicated aggregate per source."""
+
+    def setUp(self):
+        from decimal import Decimal
+        from apps.billing.models import Invoice
+        self.owner = User.objects.create_user(phone='9000000022', password='test123')
+        for number, total, payment_status in [('M1', '100.00', 'paid'), ('M2', '60.00', 'unpaid')]:
+            Invoice.objects.create(
+                invoice_number=number, owner=self.owner, status='completed', total_amount=Decimal(total),
+                paid_amount=Decimal(total) if payment_status == 'paid' else 0, payment_status=payment_status
+            )
+
+    def test_identical_aggregates_are_computed_once(self):
+        from django.db.models import Count, Sum
+        from apps.billing.models import Invoice
+        from .metrics import Metric, MetricsEngine, Source
+        invoices = Source('invoices', queryset=lambda owner: Invoice.objects.filter(owner=owner))
+        engine = MetricsEngine([
+            Metric('sales.total', invoices, {'total': Sum('total_amount')}),
+            Metric('growth.current', invoices, {'current': Sum('total_amount')}),
+            Metric('sales.average', invoices, {'total': Sum('total_amount'), 'count': Count('id')},
+                   lambda v: v['total'] / v['count']),
+        ])
+        self.assertEqual(list(engine.plans['invoices']), ['total', 'count'])
+        with self.assertNumQueries(1):
+            results, timings = engine.run(self.owner)
+        self.assertEqual(results, {'sales': {'total': 160, 'average': 80}, 'growth': {'current': 160}})
+        self.assertEqual(list(timings), ['invoices'])
+
+    def test_comprehensive_analytics_spec(self):
+        from apps.dashboard.services import ComprehensiveAnalyticsService
+        metrics, timings = ComprehensiveAnalyticsService.get_analytics(self.owner, days=30)
+        self.assertEqual(set(timings), {'invoices', 'customers', 'customer_stats', 'products', 'low_stock'})
+        self.assertEqual(metrics['sales_metrics']['total_invoices'], 2)
+        self.assertEqual(metrics['sales_metrics']['average_invoice_value'], 80.0)
+        self.assertEqual(metrics['payment_metrics']['collection_rate'], 62.5)
+        self.assertEqual(metrics['growth_metrics']['current_period_sales'], 160.0)
@@ -3,7 +3,7 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     CompanyProfileViewSet, EmailTemplateViewSet,
     NotificationPreferenceViewSet, AuditTrailViewSet,
-    SystemSettingsViewSet
+    SystemSettingsViewSet, BackgroundJobViewSet
 )
 
 router = DefaultRouter()
@@ -12,6 +12,7 @@ router.register(r'email-templates', EmailTemplateViewSet, basename='email-templa
 router.register(r'notifications', NotificationPreferenceViewSet, basename='notification-preference')
 router.register(r'audit', AuditTrailViewSet, basename='audit-trail')
 router.register(r'settings', SystemSettingsViewSet, basename='system-settings')
+router.register(r'jobs', BackgroundJobViewSet, basename='background-job')
 
 urlpatterns = [
     path('', include(router.urls)),
@@ -9,12 +9,13 @@ from django.db.models import Q
 from django.utils import timezone
 from datetime import timedelta
 
-from .models import CompanyProfile, EmailTemplate, NotificationPreference, AuditTrail, SystemSettings
+from .models import CompanyProfile, EmailTemplate, NotificationPreference, AuditTrail, SystemSettings, BackgroundJob
 from .serializers import (
     CompanyProfileSerializer, EmailTemplateSerializer,
     NotificationPreferenceSerializer, AuditTrailSerializer,
-    SystemSettingsSerializer
+    SystemSettingsSerializer, BackgroundJobSerializer
 )
+from .helpers import get_user_owner
 import base64
 import uuid
 from django.core.files.base import ContentFile
@@ -436,3 +437,22 @@ class SystemSettingsViewSet(viewsets.ViewSet):
                 serializer.save(updated_by=request.user)
                 return Response(serializer.data)
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class BackgroundJobViewSet(viewsets.ReadOnlyModelViewSet):
+    """
+    Poll progress and error reports of background jobs (imports etc.).
+    Users see jobs belonging to their business; super admins see all.
+    """
+    serializer_class = BackgroundJobSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = StandardResultsSetPagination
+    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filterset_fields = ['job_type', 'status']
+    ordering = ['-created_at']
+
+    def get_queryset(self):
+        user = self.request.user
+        if user.is_super_admin:
+            return BackgroundJob.objects.all()
+        return BackgroundJob.objects.filter(owner=get_user_owner(user))
@@ -0,0 +1,51 @@
+"""
+Import customers from a CSV/XLSX file for one business owner.
+
+Usage:
+    python manage.py import_customers customers.csv --owner-phone 9876543210
+"""
+import os
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.common.importers import iter_tabular_rows
+from apps.common.jobs import run_job
+from apps.common.models import BackgroundJob
+from apps.customer.services import CustomerImportService
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = 'Bulk import/upsert customers from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Path to the CSV/XLSX file')
+        parser.add_argument('--owner-phone', required=True, help='Phone of the business owner the customers belong to')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        try:
+            owner = User.objects.get(phone=options['owner_phone'], parent__isnull=True)
+        except User.DoesNotExist:
+            raise CommandError(f"No owner with phone {options['owner_phone']}")
+
+        job = BackgroundJob.objects.create(
+            job_type=CustomerImportService.JOB_TYPE,
+            owner=owner,
+            options={'file_name': os.path.basename(path)}
+        )
+
+        def handler(job):
+            with open(path, 'rb') as fileobj:
+                return CustomerImportService.import_rows(job, iter_tabular_rows(fileobj, path))
+
+        job = run_job(job, handler)
+        if job.status == 'failed':
+            raise CommandError(job.result.get('detail', 'Import failed'))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {job.processed_rows} rows: {job.result['created']} created, "
+            f"{job.result['updated']} updated, {job.error_count} failed (job #{job.pk})"
+        ))
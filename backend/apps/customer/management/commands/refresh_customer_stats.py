@@ -0,0 +1,50 @@
+"""
+Refresh per-customer RFM stats and segments.
+Invoices refresh their own customer's figures as they change; run this nightly
+to re-bucket every owner's scores and segments (recency follows the calendar),
+and with --full to backfill or repair the table.
+
+Usage:
+    python manage.py refresh_customer_stats                 # changed customers, every owner
+    python manage.py refresh_customer_stats --full
+    python manage.py refresh_customer_stats --owner-id 12 --full
+
+Cron (nightly):
+    30 1 * * * python manage.py refresh_customer_stats >> logs/customer_stats.log 2>&1
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.billing.models import Invoice
+from apps.customer.models import CustomerStats
+from apps.customer.services import CustomerStatsService
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Refresh customer recency/frequency/monetary stats from completed invoices"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--full', action='store_true', help='Recompute every customer instead of only changed ones')
+        parser.add_argument('--owner-id', type=int, help='Only refresh this owner')
+
+    def handle(self, *args, **options):
+        if options.get('owner_id'):
+            if not User.objects.filter(pk=options['owner_id']).exists():
+                raise CommandError(f"Owner {options['owner_id']} not found")
+            owner_ids = [options['owner_id']]
+        else:
+            # Owners with customer invoices, plus any with stats rows to clear
+            owner_ids = set(Invoice.objects.filter(
+                owner__isnull=False, customer__isnull=False
+            ).values_list('owner_id', flat=True).distinct().order_by())
+            owner_ids.update(CustomerStats.objects.filter(owner__isnull=False).values_list('owner_id', flat=True).distinct().order_by())
+
+        refresh = CustomerStatsService.refresh if options['full'] else CustomerStatsService.refresh_changed
+        customers = rescored = 0
+        for owner_id in sorted(owner_ids):
+            customers += refresh(owner_id)
+            rescored += CustomerStatsService.rescore(owner_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"✓ {customers} customers refreshed, {rescored} rescored for {len(owner_ids)} owners"
+        ))
@@ -0,0 +1,77 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:23
+
+import django.db.models.deletion
+from decimal import Decimal
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def open_ledger_from_invoices(apps, schema_editor):
+    """Seed one opening debit per unsettled invoice and sync the running balance."""
+    Customer = apps.get_model('customer', 'Customer')
+    Invoice = apps.get_model('billing', 'Invoice')
+    CustomerLedgerEntry = apps.get_model('customer', 'CustomerLedgerEntry')
+
+    Customer.objects.update(current_credit_used=0)
+    invoices = (
+        Invoice.objects.filter(customer__isnull=False, payment_status__in=['unpaid', 'partial'])
+        .exclude(status='cancelled')
+        .order_by('customer_id', 'invoice_date', 'id')
+        .values('id', 'customer_id', 'invoice_number', 'invoice_date', 'total_amount', 'paid_amount')
+    )
+    entries, balances = [], {}
+    for invoice in invoices.iterator(chunk_size=2000):
+        remaining = invoice['total_amount'] - invoice['paid_amount']
+        if remaining <= 0:
+            continue
+        balance = balances.get(invoice['customer_id'], Decimal('0')) + remaining
+        balances[invoice['customer_id']] = balance
+        entries.append(CustomerLedgerEntry(
+            customer_id=invoice['customer_id'], entry_type='opening', invoice_id=invoice['id'],
+            description=f"Opening balance for {invoice['invoice_number']}",
+            debit=remaining, balance_after=balance, open_amount=remaining, entry_date=invoice['invoice_date'],
+        ))
+    CustomerLedgerEntry.objects.bulk_create(entries, batch_size=2000)
+    Customer.objects.bulk_update(
+        [Customer(id=pk, current_credit_used=balance) for pk, balance in balances.items()],
+        ['current_credit_used'], batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('billing', '0004_discountrule_owner_alter_discountrule_code_and_more'),
+        ('customer', '0008_customer_customer_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='customer',
+            name='current_credit_used',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+        ),
+        migrations.CreateModel(
+            name='CustomerLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entry_type', models.CharField(choices=[('opening', 'Opening Balance'), ('invoice', 'Invoice'), ('payment', 'Payment'), ('refund', 'Refund'), ('return', 'Return'), ('adjustment', 'Adjustment')], max_length=20)),
+                ('reference_id', models.CharField(blank=True, max_length=100, null=True)),
+                ('description', models.CharField(blank=True, max_length=255)),
+                ('debit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('credit', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('balance_after', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('open_amount', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('entry_date', models.DateTimeField(default=django.utils.timezone.now)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_entries', to='customer.customer')),
+                ('invoice', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='ledger_entries', to='billing.invoice')),
+            ],
+            options={
+                'verbose_name_plural': 'Customer ledger entries',
+                'ordering': ['-entry_date', '-id'],
+                'indexes': [models.Index(fields=['customer', 'entry_date'], name='customer_cu_custome_58d56f_idx'), models.Index(fields=['invoice'], name='customer_cu_invoice_27999d_idx'), models.Index(condition=models.Q(('open_amount__gt', 0)), fields=['customer', 'entry_date'], name='ledger_open_debits_idx')],
+            },
+        ),
+        migrations.RunPython(open_ledger_from_invoices, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-19 11:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customer', '0009_customer_ledger'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CustomerStats',
+            fields=[
+                ('customer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='customer.customer')),
+                ('first_invoice_at', models.DateTimeField()),
+                ('last_invoice_at', models.DateTimeField()),
+                ('invoice_count', models.PositiveIntegerField(default=0)),
+                ('total_spent', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cohort', models.DateField(help_text="First day of the customer's signup month")),
+                ('recency_score', models.PositiveSmallIntegerField(default=1)),
+                ('frequency_score', models.PositiveSmallIntegerField(default=1)),
+                ('monetary_score', models.PositiveSmallIntegerField(default=1)),
+                ('segment', models.CharField(choices=[('champions', 'Champions'), ('loyal', 'Loyal'), ('new', 'New'), ('promising', 'Promising'), ('at_risk', 'At Risk'), ('hibernating', 'Hibernating'), ('regular', 'Regular')], default='regular', max_length=20)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='customer_stats', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name_plural': 'Customer stats',
+                'indexes': [models.Index(fields=['owner', '-total_spent'], name='customer_stats_spent_idx'), models.Index(fields=['owner', 'segment'], name='customer_stats_segment_idx')],
+            },
+        ),
+    ]
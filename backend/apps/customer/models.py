@@ -5,6 +5,8 @@ from django.utils import timezone
 from django.conf import settings
 from decimal import Decimal
 
+from apps.common import sequences
+
 def get_today():
     """Return today's date."""
     return timezone.now().date()
@@ -121,11 +123,11 @@ class Customer(models.Model):
         default=0,
         validators=[MinValueValidator(0)]
     )
+    # Running receivables balance, maintained by CustomerLedgerService (negative = advance)
     current_credit_used = models.DecimalField(
         max_digits=12,
         decimal_places=2,
-        default=0,
-        validators=[MinValueValidator(0)]
+        default=0
     )
     
     notes = models.TextField(blank=True, null=True)
@@ -148,19 +150,30 @@ class Customer(models.Model):
         blank=True
     )
 
+    @classmethod
+    def _first_customer_number(cls):
+        """Seed for the customer-id sequence: one past the highest numeric CUS- suffix."""
+        highest = 1000
+        for customer_id in cls.objects.filter(customer_id__startswith='CUS-').values_list('customer_id', flat=True).iterator():
+            suffix = customer_id[4:]
+            if suffix.isdigit():
+                highest = max(highest, int(suffix))
+        return highest + 1
+
+    @classmethod
+    def next_customer_number(cls, count=1):
+        """
+        Reserve `count` consecutive numeric suffixes for auto-generated CUS- ids
+        from the global `DocumentSequence` counter; returns the first one.
+        """
+        if count == 1:
+            return sequences.next_value('customer', start=cls._first_customer_number)
+        return sequences.reserve('customer', count=count, start=cls._first_customer_number)
+
     def save(self, *args, **kwargs):
         if not self.pk and not self.customer_id:
             # Generate Customer ID
-            last_customer = Customer.objects.filter(customer_id__startswith='CUS-').order_by('-customer_id').first()
-            if last_customer:
-                try:
-                    last_id = int(last_customer.customer_id.split('-')[1])
-                    new_id = last_id + 1
-                except (IndexError, ValueError):
-                    new_id = 1001
-            else:
-                new_id = 1001
-            self.customer_id = f"CUS-{new_id}"
+            self.customer_id = f"CUS-{Customer.next_customer_number()}"
         
         super().save(*args, **kwargs)
 
@@ -186,19 +199,8 @@ class Customer(models.Model):
         return self.credit_limit - self.current_credit_used
 
     def get_pending_amount(self):
-        """Calculate total pending amount from unpaid/partial invoices."""
-        from apps.billing.models import Invoice
-        from django.db.models import F, Sum
-        
-        # Get all unpaid and partial invoices
-        pending_invoices = Invoice.objects.filter(
-            customer=self,
-            payment_status__in=['unpaid', 'partial']
-        ).aggregate(
-            total_pending=Sum(F('total_amount') - F('paid_amount'), output_field=models.DecimalField())
-        )
-        
-        return pending_invoices['total_pending'] or Decimal('0')
+        """Outstanding receivable, read from the ledger-maintained running balance."""
+        return max(self.current_credit_used or Decimal('0'), Decimal('0'))
 
     def add_loyalty_points(self, points):
         """Add loyalty points and update tier."""
@@ -312,3 +314,90 @@ class LoyaltyTransaction(models.Model):
 
     def __str__(self):
         return f"{self.customer.name} - {self.transaction_type} - {self.points}"
+
+class CustomerLedgerEntry(models.Model):
+    """
+    Receivables ledger: debits from invoices, credits from payments and returns.
+    `balance_after` is the customer's running balance once the entry is posted;
+    `open_amount` is the part of a debit not yet settled by credits (FIFO), which
+    lets aging read open debits directly instead of scanning invoices.
+    """
+
+    ENTRY_TYPE_CHOICES = [
+        ('opening', 'Opening Balance'),
+        ('invoice', 'Invoice'),
+        ('payment', 'Payment'),
+        ('refund', 'Refund'),
+        ('return', 'Return'),
+        ('adjustment', 'Adjustment'),
+    ]
+
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='ledger_entries')
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPE_CHOICES)
+    invoice = models.ForeignKey('billing.Invoice', on_delete=models.SET_NULL, null=True, blank=True, related_name='ledger_entries')
+    reference_id = models.CharField(max_length=100, blank=True, null=True)  # Payment ID, return ID, etc.
+    description = models.CharField(max_length=255, blank=True)
+
+    debit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    credit = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    balance_after = models.DecimalField(max_digits=12, decimal_places=2)
+    open_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+    entry_date = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-entry_date', '-id']
+        verbose_name_plural = 'Customer ledger entries'
+        indexes = [
+            Index(fields=['customer', 'entry_date']),
+            Index(fields=['invoice']),
+            Index(fields=['customer', 'entry_date'], condition=Q(open_amount__gt=0), name='ledger_open_debits_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer.name} - {self.entry_type} (Dr {self.debit} / Cr {self.credit})"
+
+class CustomerStats(models.Model):
+    """
+    Precomputed RFM figures per customer, maintained by CustomerStatsService.
+    Raw recency/frequency/monetary values come from completed invoices; the 1-5
+    scores are quantile buckets within the owner's customers and `segment` is
+    derived from them, so dashboards never aggregate invoices per request.
+    """
+
+    SEGMENT_CHOICES = [
+        ('champions', 'Champions'),
+        ('loyal', 'Loyal'),
+        ('new', 'New'),
+        ('promising', 'Promising'),
+        ('at_risk', 'At Risk'),
+        ('hibernating', 'Hibernating'),
+        ('regular', 'Regular'),
+    ]
+
+    customer = models.OneToOneField(Customer, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='customer_stats')
+
+    first_invoice_at = models.DateTimeField()
+    last_invoice_at = models.DateTimeField()
+    invoice_count = models.PositiveIntegerField(default=0)
+    total_spent = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cohort = models.DateField(help_text="First day of the customer's signup month")
+
+    recency_score = models.PositiveSmallIntegerField(default=1)
+    frequency_score = models.PositiveSmallIntegerField(default=1)
+    monetary_score = models.PositiveSmallIntegerField(default=1)
+    segment = models.CharField(max_length=20, choices=SEGMENT_CHOICES, default='regular')
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name_plural = 'Customer stats'
+        indexes = [
+            Index(fields=['owner', '-total_spent'], name='customer_stats_spent_idx'),
+            Index(fields=['owner', 'segment'], name='customer_stats_segment_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.customer_id} - {self.segment}"
@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Customer, CustomerAddress, LoyaltyTransaction, LoyaltySettings
+from .models import Customer, CustomerAddress, CustomerLedgerEntry, LoyaltyTransaction, LoyaltySettings
 
 class LoyaltySettingsSerializer(serializers.ModelSerializer):
     """Serializer for global loyalty configuration."""
@@ -90,3 +90,14 @@ class LoyaltyTransactionSerializer(serializers.ModelSerializer):
         model = LoyaltyTransaction
         fields = ['id', 'customer', 'customer_name', 'transaction_type', 'points', 'reference_id', 'description', 'created_at']
         read_only_fields = ['created_at']
+
+class CustomerLedgerEntrySerializer(serializers.ModelSerializer):
+    invoice_number = serializers.CharField(source='invoice.invoice_number', read_only=True, default=None)
+
+    class Meta:
+        model = CustomerLedgerEntry
+        fields = [
+            'id', 'entry_type', 'invoice', 'invoice_number', 'reference_id', 'description',
+            'debit', 'credit', 'balance_after', 'open_amount', 'entry_date'
+        ]
+        read_only_fields = fields
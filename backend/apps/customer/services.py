@@ -1,7 +1,21 @@
-from rest_framework.exceptions import PermissionDenied
+import os
+from bisect import bisect_left, bisect_right
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Case, Count, DateField, DecimalField, F, Max, Min, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from .models import Customer, CustomerLedgerEntry, CustomerStats
 from .repositories import CustomerRepository, AddressRepository, LoyaltyRepository
 from .serializers import CustomerSerializer, CustomerAddressSerializer, LoyaltySettingsSerializer, LoyaltyTransactionSerializer
+from apps.billing.models import Invoice
 from apps.common.helpers import get_user_owner
+from apps.common.importers import SUPPORTED_EXTENSIONS, chunked, iter_tabular_rows
+from apps.common.jobs import report_progress, run_after_commit, start_background_job
+from apps.common.models import BackgroundJob
+from apps.subscription import quotas
 from apps.users.utils import has_permission
 
 class CustomerService:
@@ -27,7 +41,9 @@ class CustomerService:
         owner = get_user_owner(user)
         serializer = CustomerSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        return serializer.save(owner=owner)
+        with transaction.atomic():
+            quotas.reserve(owner, 'customers')
+            return serializer.save(owner=owner)
 
     @classmethod
     def get_customer(cls, user, pk):
@@ -114,3 +130,474 @@ class LoyaltyService:
         serializer = LoyaltyTransactionSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         return serializer.save(created_by_id=user.id)
+
+
+class CustomerImportService:
+    """
+    Bulk customer import/upsert from CSV or XLSX uploads.
+
+    Rows are validated with `CustomerSerializer` in chunks; each chunk costs one
+    `phone__in` lookup, one quota reservation and one customer-id block for its new
+    customers plus one `bulk_create(update_conflicts=True)` keyed on the
+    `unique_customer_phone_per_owner` constraint.
+    """
+    JOB_TYPE = 'customer_import'
+    CHUNK_SIZE = 1000
+    # Writable columns an import may set; anything else in the file is ignored.
+    IMPORT_FIELDS = [
+        'name', 'email', 'gstin', 'uses_gst', 'customer_type', 'status',
+        'credit_limit', 'notes'
+    ]
+
+    @classmethod
+    def start_import(cls, user, uploaded_file):
+        CustomerService._check_customer_permission(user)
+        owner = get_user_owner(user)
+        if owner is None:
+            raise ValidationError("Customer import must be run from a business account.")
+        if not uploaded_file:
+            raise ValidationError("No file uploaded. Send the CSV/XLSX as 'file'.")
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValidationError(f"Unsupported file type '{extension}'. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+        job = BackgroundJob(
+            job_type=cls.JOB_TYPE,
+            owner=owner,
+            created_by=user,
+            options={'file_name': uploaded_file.name}
+        )
+        job.source_file.save(uploaded_file.name, uploaded_file, save=False)
+        job.save()
+        return start_background_job(job, cls.run_import)
+
+    @classmethod
+    def run_import(cls, job):
+        """Job handler: read the stored upload and import it."""
+        file_name = job.options.get('file_name') or job.source_file.name
+        with job.source_file.open('rb') as fileobj:
+            job.total_rows = sum(1 for _ in iter_tabular_rows(fileobj, file_name))
+            BackgroundJob.objects.filter(pk=job.pk).update(total_rows=job.total_rows)
+            fileobj.seek(0)
+            return cls.import_rows(job, iter_tabular_rows(fileobj, file_name))
+
+    @classmethod
+    def import_rows(cls, job, rows):
+        """Validate and upsert `(row_number, dict)` rows for `job.owner`."""
+        processed = success = failed = created = updated = 0
+        for chunk in chunked(rows, cls.CHUNK_SIZE):
+            valid_rows = {}
+            row_numbers = {}
+            errors = []
+            for row_number, row in chunk:
+                # Empty cells mean "not provided" so model defaults / existing values apply.
+                data = {key: value for key, value in row.items() if value != ''}
+                serializer = CustomerSerializer(data=data)
+                if serializer.is_valid():
+                    # Later rows with the same phone win, matching upsert semantics.
+                    phone = serializer.validated_data['phone']
+                    valid_rows[phone] = serializer.validated_data
+                    row_numbers[phone] = row_number
+                else:
+                    errors.append({'row': row_number, 'errors': serializer.errors})
+
+            existing = cls._existing(job.owner, valid_rows)
+            errors.extend(cls._apply_quota(job.owner, valid_rows, existing, row_numbers))
+            chunk_created, chunk_updated = cls._upsert_chunk(job.owner, valid_rows, existing)
+            created += chunk_created
+            updated += chunk_updated
+            processed += len(chunk)
+            success += len(chunk) - len(errors)
+            failed += len(errors)
+            report_progress(job, processed, success, failed, errors)
+
+        job.total_rows = processed
+        return {'created': created, 'updated': updated, 'failed': failed}
+
+    @classmethod
+    def _existing(cls, owner, valid_rows):
+        if not valid_rows:
+            return {}
+        return {
+            row['phone']: row
+            for row in Customer.objects.filter(owner=owner, phone__in=list(valid_rows)).values(
+                'phone', 'customer_id', *cls.IMPORT_FIELDS
+            )
+        }
+
+    @staticmethod
+    def _apply_quota(owner, valid_rows, existing, row_numbers):
+        """Reserve quota for the chunk's new customers; rows past the plan limit become row errors."""
+        new_phones = [phone for phone in valid_rows if phone not in existing]
+        granted = quotas.reserve_many(owner, 'customers', len(new_phones))
+        errors = []
+        for phone in new_phones[granted:]:
+            del valid_rows[phone]
+            errors.append({'row': row_numbers[phone], 'errors': {
+                'detail': [quotas.limit_message('customers', quotas.entitlements(owner)['customers'])]
+            }})
+        return errors
+
+    @classmethod
+    def _upsert_chunk(cls, owner, valid_rows, existing):
+        if not valid_rows:
+            return 0, 0
+
+        update_fields = {field for data in valid_rows.values() for field in data if field in cls.IMPORT_FIELDS}
+
+        new_count = len(valid_rows) - len(existing)
+        next_number = Customer.next_customer_number(new_count) if new_count else None
+
+        customers = []
+        with transaction.atomic():
+            for phone, data in valid_rows.items():
+                current = existing.get(phone)
+                if current:
+                    # Keep stored values for columns this row left blank.
+                    values = {field: current[field] for field in update_fields}
+                    values.update(data)
+                    customer_id = current['customer_id']
+                else:
+                    values = data
+                    customer_id = f"CUS-{next_number}"
+                    next_number += 1
+                customers.append(Customer(owner=owner, customer_id=customer_id, **values))
+
+            Customer.objects.bulk_create(
+                customers,
+                batch_size=cls.CHUNK_SIZE,
+                update_conflicts=True,
+                unique_fields=['phone', 'owner'],
+                update_fields=sorted(update_fields) + ['updated_at'],
+            )
+        return new_count, len(existing)
+
+
+class CustomerLedgerService:
+    """
+    Posts receivable movements to `CustomerLedgerEntry` and keeps the running balance on
+    `Customer.current_credit_used` in step, in the same transaction as the invoice or
+    payment write that caused them.
+
+    Credits settle open debits of their own invoice first, then the oldest ones (FIFO),
+    so `open_amount` always tells how much of each debit is still owed and aging is a
+    single grouped read of open debits.
+    """
+    AGING_BUCKETS = [('0_30', 0, 30), ('31_60', 31, 60), ('61_90', 61, 90), ('90_plus', 91, None)]
+
+    @staticmethod
+    def _allocate(open_debits, amount, invoice_id, touched):
+        """Settle `amount` against open debits: same invoice first, then oldest first."""
+        preferred = [entry for entry in open_debits if invoice_id and entry.invoice_id == invoice_id]
+        others = [entry for entry in open_debits if not (invoice_id and entry.invoice_id == invoice_id)]
+        for entry in preferred + others:
+            if amount <= 0:
+                break
+            if entry.open_amount <= 0:
+                continue
+            settled = min(entry.open_amount, amount)
+            entry.open_amount -= settled
+            amount -= settled
+            if entry.pk:
+                touched[entry.pk] = entry
+
+    @classmethod
+    def post(cls, postings):
+        """
+        Post ledger entries set-wise. Each posting is a dict with `customer_id`,
+        `entry_type`, `debit` or `credit`, and optionally `invoice_id`, `reference_id`,
+        `description` and `entry_date`. Customers are locked once for the whole batch.
+        """
+        postings = [
+            {**p, 'debit': Decimal(str(p.get('debit') or 0)), 'credit': Decimal(str(p.get('credit') or 0))}
+            for p in postings if p.get('customer_id')
+        ]
+        postings = [p for p in postings if p['debit'] or p['credit']]
+        if not postings:
+            return []
+
+        with transaction.atomic():
+            customer_ids = {p['customer_id'] for p in postings}
+            balances = dict(
+                Customer.objects.select_for_update().filter(id__in=customer_ids)
+                .order_by('id').values_list('id', 'current_credit_used')
+            )
+            open_debits = {}
+            credit_customers = {p['customer_id'] for p in postings if p['credit']}
+            if credit_customers:
+                for entry in CustomerLedgerEntry.objects.filter(
+                    customer_id__in=credit_customers, open_amount__gt=0
+                ).order_by('entry_date', 'id'):
+                    open_debits.setdefault(entry.customer_id, []).append(entry)
+
+            now = timezone.now()
+            entries, touched, deltas = [], {}, {}
+            for posting in postings:
+                customer_id = posting['customer_id']
+                if customer_id not in balances:
+                    continue
+                debit, credit = posting['debit'], posting['credit']
+                balances[customer_id] += debit - credit
+                deltas[customer_id] = deltas.get(customer_id, Decimal('0')) + debit - credit
+                entry = CustomerLedgerEntry(
+                    customer_id=customer_id,
+                    entry_type=posting['entry_type'],
+                    invoice_id=posting.get('invoice_id'),
+                    reference_id=posting.get('reference_id'),
+                    description=posting.get('description', ''),
+                    debit=debit,
+                    credit=credit,
+                    balance_after=balances[customer_id],
+                    open_amount=debit,
+                    entry_date=posting.get('entry_date') or now,
+                )
+                if debit:
+                    open_debits.setdefault(customer_id, []).append(entry)
+                if credit:
+                    cls._allocate(open_debits.get(customer_id, []), credit, posting.get('invoice_id'), touched)
+                entries.append(entry)
+
+            CustomerLedgerEntry.objects.bulk_create(entries)
+            if touched:
+                CustomerLedgerEntry.objects.bulk_update(list(touched.values()), ['open_amount'])
+            Customer.objects.filter(id__in=deltas).update(
+                current_credit_used=Case(
+                    *[When(id=pk, then=F('current_credit_used') + Value(delta)) for pk, delta in deltas.items()],
+                    default=F('current_credit_used'),
+                    output_field=DecimalField(max_digits=12, decimal_places=2),
+                ),
+                updated_at=now,
+            )
+            return entries
+
+    @classmethod
+    def post_invoice(cls, invoice):
+        """Debit a new invoice to its customer, crediting any amount paid at the counter."""
+        if not invoice.customer_id or invoice.status == 'cancelled':
+            return []
+        postings = [{
+            'customer_id': invoice.customer_id, 'entry_type': 'invoice', 'invoice_id': invoice.id,
+            'debit': invoice.total_amount, 'description': f"Invoice {invoice.invoice_number}",
+        }]
+        if invoice.paid_amount:
+            postings.append({
+                'customer_id': invoice.customer_id, 'entry_type': 'payment', 'invoice_id': invoice.id,
+                'credit': invoice.paid_amount, 'description': f"Paid at billing for {invoice.invoice_number}",
+            })
+        return cls.post(postings)
+
+    @staticmethod
+    def outstanding(invoice):
+        """What an invoice adds to its customer's balance once its postings are in."""
+        if not invoice.customer_id or invoice.status == 'cancelled':
+            return Decimal('0')
+        return invoice.total_amount - invoice.paid_amount
+
+    @classmethod
+    def post_invoice_change(cls, before, after=None):
+        """
+        Adjust receivables for an invoice edited outside the billing flows (or deleted,
+        when `after` is None): the difference in what it is owed, per customer.
+        """
+        deltas = {before.customer_id: -cls.outstanding(before)}
+        if after is not None:
+            deltas[after.customer_id] = deltas.get(after.customer_id, Decimal('0')) + cls.outstanding(after)
+        invoice = after or before
+        action = 'edited' if after is not None else 'deleted'
+        return cls.post([
+            {
+                'customer_id': customer_id, 'entry_type': 'adjustment', 'invoice_id': invoice.id,
+                'debit' if delta > 0 else 'credit': abs(delta),
+                'description': f"Invoice {invoice.invoice_number} {action}",
+            }
+            for customer_id, delta in deltas.items() if customer_id and delta
+        ])
+
+    @classmethod
+    def get_statement(cls, user, customer_id):
+        customer = CustomerService.get_customer(user, customer_id)
+        return CustomerLedgerEntry.objects.filter(customer=customer).select_related('invoice')
+
+    @classmethod
+    def aging(cls, user, as_of=None):
+        """Outstanding receivables per customer in 0-30/31-60/61-90/90+ day buckets."""
+        owner = get_user_owner(user)
+        today = as_of or timezone.localdate()
+
+        def start_of(days_ago):
+            return timezone.make_aware(datetime.combine(today - timedelta(days=days_ago), time.min))
+
+        buckets = {}
+        for name, low, high in cls.AGING_BUCKETS:
+            condition = Q(entry_date__lt=start_of(low - 1)) if low else Q()
+            if high is not None:
+                condition &= Q(entry_date__gte=start_of(high))
+            buckets[name] = Sum('open_amount', filter=condition, default=Decimal('0'))
+
+        open_debits = CustomerLedgerEntry.objects.filter(open_amount__gt=0)
+        if owner:
+            open_debits = open_debits.filter(customer__owner=owner)
+        rows = list(
+            open_debits.values('customer_id', 'customer__name', 'customer__current_credit_used')
+            .annotate(**buckets, total=Sum('open_amount'))
+            .order_by('-total')
+        )
+        totals = {name: sum((row[name] for row in rows), Decimal('0')) for name in buckets}
+        totals['total'] = sum((row['total'] for row in rows), Decimal('0'))
+        return {
+            'as_of': today,
+            'customers': [
+                {
+                    'customer_id': row['customer_id'],
+                    'name': row['customer__name'],
+                    'balance': row['customer__current_credit_used'],
+                    **{name: row[name] for name in buckets},
+                    'total': row['total'],
+                }
+                for row in rows
+            ],
+            'totals': totals,
+        }
+
+
+class CustomerStatsService:
+    """
+    Recency, frequency, monetary value and signup cohort per customer.
+
+    `refresh` computes the raw figures for a set of customers (or all of an
+    owner's) with one query grouped by customer over completed invoices and
+    upserts them into `CustomerStats`. New or changed invoices refresh just their
+    customer's row, so the top-customer and segment readers never join invoices.
+    `rescore` buckets the owner's rows into 1-5 quantile scores and segments from
+    that compact table alone; it runs from the nightly `refresh_customer_stats`
+    command, so scores trail raw figures by up to a day.
+    """
+    BUCKETS = 5
+    RAW_FIELDS = ['owner', 'first_invoice_at', 'last_invoice_at', 'invoice_count', 'total_spent', 'cohort', 'updated_at']
+    SCORE_FIELDS = ['recency_score', 'frequency_score', 'monetary_score', 'segment']
+
+    @classmethod
+    def quantile_scores(cls, values):
+        """Score each value 1..BUCKETS by its mid-rank quantile, so ties share a score."""
+        ordered = sorted(values)
+        count = len(ordered)
+        scores = []
+        for value in values:
+            below = bisect_left(ordered, value)
+            rank = below + (bisect_right(ordered, value) - below) / 2
+            scores.append(min(cls.BUCKETS, 1 + int(cls.BUCKETS * rank / count)))
+        return scores
+
+    @staticmethod
+    def segment_for(recency, frequency, monetary):
+        if recency >= 4 and frequency >= 4:
+            return 'champions'
+        if recency <= 2 and (frequency >= 3 or monetary >= 4):
+            return 'at_risk'
+        if frequency >= 4:
+            return 'loyal'
+        if recency >= 4:
+            return 'new' if frequency <= 2 else 'promising'
+        if recency <= 2:
+            return 'hibernating'
+        return 'regular'
+
+    @staticmethod
+    def _grouped(owner_id, customer_ids=None):
+        invoices = Invoice.objects.filter(owner_id=owner_id, status='completed', customer__isnull=False)
+        if customer_ids is not None:
+            invoices = invoices.filter(customer_id__in=customer_ids)
+        return invoices.values(
+            'customer_id', cohort=TruncMonth('customer__created_at', output_field=DateField()),
+        ).annotate(
+            first_invoice_at=Min('invoice_date'), last_invoice_at=Max('invoice_date'),
+            invoice_count=Count('id'), total_spent=Sum('total_amount'),
+        ).order_by()
+
+    @classmethod
+    def rescore(cls, owner_id):
+        """Re-bucket the owner's stats rows; returns how many changed."""
+        rows = list(CustomerStats.objects.filter(owner_id=owner_id).only(
+            'customer_id', 'last_invoice_at', 'invoice_count', 'total_spent', *cls.SCORE_FIELDS
+        ))
+        if not rows:
+            return 0
+        recency = cls.quantile_scores([timezone.localdate(row.last_invoice_at) for row in rows])
+        frequency = cls.quantile_scores([row.invoice_count for row in rows])
+        monetary = cls.quantile_scores([row.total_spent for row in rows])
+        changed = []
+        for row, r, f, m in zip(rows, recency, frequency, monetary):
+            scores = (r, f, m, cls.segment_for(r, f, m))
+            if scores != (row.recency_score, row.frequency_score, row.monetary_score, row.segment):
+                row.recency_score, row.frequency_score, row.monetary_score, row.segment = scores
+                changed.append(row)
+        CustomerStats.objects.bulk_update(changed, cls.SCORE_FIELDS, batch_size=500)
+        return len(changed)
+
+    @classmethod
+    def refresh(cls, owner_id, customer_ids=None):
+        """Recompute the raw figures of the given customers (every customer when None)."""
+        rows = list(cls._grouped(owner_id, customer_ids))
+        with transaction.atomic():
+            # Customers left without completed invoices drop out of the table
+            stale = CustomerStats.objects.filter(owner_id=owner_id)
+            if customer_ids is not None:
+                stale = stale.filter(customer_id__in=customer_ids)
+            stale.exclude(customer_id__in=[row['customer_id'] for row in rows]).delete()
+            CustomerStats.objects.bulk_create(
+                [CustomerStats(owner_id=owner_id, **row) for row in rows],
+                update_conflicts=True, unique_fields=['customer'], update_fields=cls.RAW_FIELDS, batch_size=500,
+            )
+        return len(rows)
+
+    @classmethod
+    def refresh_changed(cls, owner_id):
+        """Refresh customers whose invoices changed since the owner's last refresh."""
+        since = CustomerStats.objects.filter(owner_id=owner_id).aggregate(since=Max('updated_at'))['since']
+        if since is None:
+            return cls.refresh(owner_id)
+        customer_ids = set(Invoice.objects.filter(
+            owner_id=owner_id, updated_at__gt=since, customer__isnull=False,
+        ).values_list('customer_id', flat=True))
+        return cls.refresh(owner_id, customer_ids) if customer_ids else 0
+
+    @classmethod
+    def schedule_refresh(cls, invoice):
+        """Refresh the invoice's customer once the current transaction commits."""
+        if invoice.customer_id:
+            run_after_commit(cls.refresh, invoice.owner_id, [invoice.customer_id])
+
+    @staticmethod
+    def _scoped(owner):
+        rows = CustomerStats.objects.filter(customer__status='active')
+        return rows.filter(owner=owner) if owner else rows
+
+    @classmethod
+    def top_customers(cls, owner, limit=5):
+        """Active customers by lifetime completed spend, with their scores."""
+        rows = cls._scoped(owner).values(
+            'customer_id', 'total_spent', 'invoice_count', 'last_invoice_at',
+            'recency_score', 'frequency_score', 'monetary_score', 'segment', name=F('customer__name'),
+        ).order_by('-total_spent', 'customer_id')[:limit]
+        return list(rows)
+
+    @classmethod
+    def segments(cls, owner):
+        """{segment: {'customers', 'revenue'}} for every segment, zero when empty."""
+        totals = {
+            row['segment']: row
+            for row in cls._scoped(owner).values('segment').annotate(customers=Count('pk'), revenue=Sum('total_spent')).order_by()
+        }
+        return {
+            segment: {
+                'customers': totals[segment]['customers'] if segment in totals else 0,
+                'revenue': totals[segment]['revenue'] if segment in totals else Decimal('0'),
+            }
+            for segment, _label in CustomerStats.SEGMENT_CHOICES
+        }
+
+    @classmethod
+    def get_segments(cls, user):
+        CustomerService._check_customer_permission(user)
+        owner = get_user_owner(user)
+        return {'segments': cls.segments(owner), 'top_customers': cls.top_customers(owner, limit=10)}
@@ -2,6 +2,7 @@ from django.test import TestCase, Client
 from django.contrib.auth import get_user_model
 from .models import Customer, CustomerAddress
 import json
+from decimal import Decimal
 
 User = get_user_model()
 
@@ -91,3 +92,199 @@ class CustomerAddressTests(TestCase):
         addr1.refresh_from_db()
         self.assertFalse(addr1.is_default)
         self.assertTrue(addr2.is_default)
+
+class CustomerImportServiceTests(TestCase):
+    """Test chunked bulk customer import/upsert."""
+
+    def setUp(self):
+        from apps.common.models import BackgroundJob
+        self.owner = User.objects.create_user(phone='9000000001', password='test123')
+        self.existing = Customer.objects.create(
+            phone='9876500001', name='Old Name', email='old@example.com', owner=self.owner
+        )
+        self.job = BackgroundJob.objects.create(job_type='customer_import', owner=self.owner)
+
+    def _rows(self, csv_text):
+        import io
+        from apps.common.importers import iter_tabular_rows
+        return iter_tabular_rows(io.BytesIO(csv_text.encode('utf-8')), 'customers.csv')
+
+    def test_import_creates_and_updates_by_phone(self):
+        """Test rows upsert on (phone, owner) and keep existing customer_id."""
+        from apps.customer.services import CustomerImportService
+        rows = self._rows(
+            "Phone,Name,Email,Customer Type\n"
+            "9876500001,New Name,,wholesale\n"
+            "9876500002,Fresh Customer,fresh@example.com,retail\n"
+        )
+        result = CustomerImportService.import_rows(self.job, rows)
+
+        self.assertEqual(result, {'created': 1, 'updated': 1, 'failed': 0})
+        self.existing.refresh_from_db()
+        self.assertEqual(self.existing.name, 'New Name')
+        self.assertEqual(self.existing.customer_type, 'wholesale')
+        # Blank cell keeps the stored value
+        self.assertEqual(self.existing.email, 'old@example.com')
+        created = Customer.objects.get(phone='9876500002', owner=self.owner)
+        self.assertTrue(created.customer_id.startswith('CUS-'))
+        self.assertNotEqual(created.customer_id, self.existing.customer_id)
+
+    def test_customer_ids_continue_past_the_highest_number(self):
+        """Test numbering seeds numerically (CUS-1000 above CUS-999) and imports take fresh ids."""
+        from apps.common.models import DocumentSequence
+        from apps.customer.services import CustomerImportService
+        Customer.objects.create(phone='9876500010', name='Old', customer_id='CUS-999', owner=self.owner)
+        Customer.objects.create(phone='9876500011', name='Older', customer_id='CUS-1500', owner=self.owner)
+        Customer.objects.filter(pk=self.existing.pk).update(customer_id='CUS-1400')
+        # As on a deployment upgraded from max()-based numbering: ids exist, no counter yet.
+        DocumentSequence.objects.filter(doc_type='customer').delete()
+
+        added = Customer.objects.create(phone='9876500012', name='Added', owner=self.owner)
+        CustomerImportService.import_rows(self.job, self._rows(
+            "Phone,Name\n9876500013,First\n9876500014,Second\n"
+        ))
+
+        self.assertEqual(added.customer_id, 'CUS-1501')
+        self.assertEqual(
+            sorted(Customer.objects.filter(phone__in=['9876500013', '9876500014']).values_list('customer_id', flat=True)),
+            ['CUS-1502', 'CUS-1503'],
+        )
+
+    def test_import_reports_invalid_rows(self):
+        """Test invalid rows are reported and do not block valid ones."""
+        from apps.customer.services import CustomerImportService
+        rows = self._rows(
+            "phone,name\n"
+            "12,Too Short\n"
+            "9876500003,Valid Row\n"
+        )
+        result = CustomerImportService.import_rows(self.job, rows)
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['failed'], 1)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.processed_rows, 2)
+        self.assertEqual(self.job.error_report[0]['row'], 2)
+        self.assertIn('phone', self.job.error_report[0]['errors'])
+
+class CustomerLedgerServiceTests(TestCase):
+    """Test the receivables ledger and aging."""
+
+    def setUp(self):
+        from apps.billing.models import Invoice
+        self.owner = User.objects.create_user(phone='9000000040', password='test123', is_superuser=True)
+        self.customer = Customer.objects.create(phone='9111111111', name='Ledger Customer', owner=self.owner)
+        self.old = Invoice.objects.create(
+            invoice_number='INV-OLD', customer=self.customer, owner=self.owner, total_amount=Decimal('500.00')
+        )
+        self.new = Invoice.objects.create(
+            invoice_number='INV-NEW', customer=self.customer, owner=self.owner, total_amount=Decimal('300.00')
+        )
+
+    def _post_invoices(self):
+        from django.utils import timezone
+        from datetime import timedelta
+        from .services import CustomerLedgerService
+        CustomerLedgerService.post([
+            {'customer_id': self.customer.id, 'entry_type': 'invoice', 'invoice_id': self.old.id,
+             'debit': '500.00', 'entry_date': timezone.now() - timedelta(days=45)},
+            {'customer_id': self.customer.id, 'entry_type': 'invoice', 'invoice_id': self.new.id, 'debit': '300.00'},
+        ])
+
+    def test_credits_settle_own_invoice_first_then_fifo(self):
+        """Test running balance and open amounts after targeted and untargeted credits."""
+        from .models import CustomerLedgerEntry
+        from .services import CustomerLedgerService
+        self._post_invoices()
+        CustomerLedgerService.post([
+            {'customer_id': self.customer.id, 'entry_type': 'payment', 'invoice_id': self.new.id, 'credit': '100.00'},
+            {'customer_id': self.customer.id, 'entry_type': 'payment', 'credit': '200.00'},
+        ])
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.current_credit_used, Decimal('500.00'))
+        self.assertEqual(self.customer.get_pending_amount(), Decimal('500.00'))
+        open_amounts = dict(CustomerLedgerEntry.objects.filter(debit__gt=0).values_list('invoice_id', 'open_amount'))
+        self.assertEqual(open_amounts, {self.old.id: Decimal('300.00'), self.new.id: Decimal('200.00')})
+        last = CustomerLedgerEntry.objects.first()
+        self.assertEqual(last.balance_after, Decimal('500.00'))
+
+    def test_aging_reads_open_debits_into_buckets(self):
+        """Test open debits land in the bucket of their entry date."""
+        from .services import CustomerLedgerService
+        self._post_invoices()
+        with self.assertNumQueries(1):
+            report = CustomerLedgerService.aging(self.owner)
+
+        row = report['customers'][0]
+        self.assertEqual(row['0_30'], Decimal('300.00'))
+        self.assertEqual(row['31_60'], Decimal('500.00'))
+        self.assertEqual(row['90_plus'], Decimal('0'))
+        self.assertEqual(report['totals']['total'], Decimal('800.00'))
+
+class CustomerStatsServiceTests(TestCase):
+    """Test precomputed RFM stats and the readers built on them."""
+
+    def setUp(self):
+        from apps.billing.models import Invoice
+        self.owner = User.objects.create_user(phone='9000000050', password='test123', is_superuser=True)
+        self.regular = Customer.objects.create(phone='9222222221', name='Regular', owner=self.owner)
+        self.occasional = Customer.objects.create(phone='9222222222', name='Occasional', owner=self.owner)
+        self.idle = Customer.objects.create(phone='9222222223', name='Idle', owner=self.owner)
+        for number, customer, total, invoice_status in [
+            ('RFM-1', self.regular, '300.00', 'completed'),
+            ('RFM-2', self.regular, '400.00', 'completed'),
+            ('RFM-3', self.occasional, '100.00', 'completed'),
+            ('RFM-4', self.occasional, '900.00', 'cancelled'),
+        ]:
+            Invoice.objects.create(
+                invoice_number=number, customer=customer, owner=self.owner, total_amount=Decimal(total), status=invoice_status
+            )
+
+    def test_quantile_scores_share_ties(self):
+        from .services import CustomerStatsService
+        self.assertEqual(CustomerStatsService.quantile_scores([10, 20, 30, 40, 50]), [1, 2, 3, 4, 5])
+        self.assertEqual(CustomerStatsService.quantile_scores([7, 7, 7]), [3, 3, 3])
+
+    def test_refresh_builds_stats_from_completed_invoices(self):
+        from .models import CustomerStats
+        from .services import CustomerStatsService
+        self.assertEqual(CustomerStatsService.refresh(self.owner.id), 2)
+        CustomerStatsService.rescore(self.owner.id)
+
+        stats = {row.customer_id: row for row in CustomerStats.objects.all()}
+        self.assertNotIn(self.idle.id, stats)
+        self.assertEqual(stats[self.regular.id].invoice_count, 2)
+        self.assertEqual(stats[self.regular.id].total_spent, Decimal('700.00'))
+        self.assertEqual(stats[self.occasional.id].total_spent, Decimal('100.00'))
+        self.assertEqual(stats[self.regular.id].cohort, self.regular.created_at.date().replace(day=1))
+        self.assertGreater(stats[self.regular.id].monetary_score, stats[self.occasional.id].monetary_score)
+        self.assertGreater(stats[self.regular.id].frequency_score, stats[self.occasional.id].frequency_score)
+
+    def test_incremental_refresh_updates_only_changed_customers(self):
+        from apps.billing.models import Invoice
+        from .models import CustomerStats
+        from .services import CustomerStatsService
+        CustomerStatsService.refresh(self.owner.id)
+        Invoice.objects.filter(invoice_number='RFM-3').update(status='cancelled')
+        Invoice.objects.create(
+            invoice_number='RFM-5', customer=self.idle, owner=self.owner, total_amount=Decimal('50.00'), status='completed'
+        )
+
+        with self.assertNumQueries(5):
+            CustomerStatsService.refresh(self.owner.id, [self.occasional.id, self.idle.id])
+        self.assertEqual(
+            set(CustomerStats.objects.values_list('customer_id', flat=True)), {self.regular.id, self.idle.id}
+        )
+        self.assertEqual(CustomerStats.objects.get(customer=self.idle).total_spent, Decimal('50.00'))
+
+    def test_readers_use_precomputed_stats(self):
+        from .services import CustomerStatsService
+        CustomerStatsService.refresh(self.owner.id)
+        with self.assertNumQueries(2):
+            top = CustomerStatsService.top_customers(self.owner)
+            segments = CustomerStatsService.segments(self.owner)
+
+        self.assertEqual([row['name'] for row in top], ['Regular', 'Occasional'])
+        self.assertEqual(sum(values['customers'] for values in segments.values()), 2)
+        self.assertEqual(sum(values['revenue'] for values in segments.values()), Decimal('800.00'))
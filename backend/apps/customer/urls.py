@@ -2,6 +2,10 @@ from django.urls import path
 from .views import (
     CustomerListCreateView,
     CustomerDetailView,
+    CustomerImportView,
+    CustomerLedgerView,
+    CustomerAgingView,
+    CustomerSegmentsView,
     CustomerAddressListCreateView,
     CustomerAddressDetailView,
     LoyaltyTransactionListView,
@@ -12,6 +16,10 @@ urlpatterns = [
     # Customer endpoints
     path('', CustomerListCreateView.as_view(), name='customer-list'),
     path('<int:pk>/', CustomerDetailView.as_view(), name='customer-detail'),
+    path('import/', CustomerImportView.as_view(), name='customer-import'),
+    path('<int:pk>/ledger/', CustomerLedgerView.as_view(), name='customer-ledger'),
+    path('aging/', CustomerAgingView.as_view(), name='customer-aging'),
+    path('segments/', CustomerSegmentsView.as_view(), name='customer-segments'),
     
     # Address endpoints
     path('<int:customer_id>/addresses/', CustomerAddressListCreateView.as_view(), name='customer-address-list'),
@@ -1,11 +1,15 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.generics import ListCreateAPIView, RetrieveUpdateDestroyAPIView
+from rest_framework.generics import ListAPIView, ListCreateAPIView, RetrieveUpdateDestroyAPIView
 from rest_framework.pagination import PageNumberPagination
-from .serializers import CustomerSerializer, CustomerAddressSerializer, LoyaltyTransactionSerializer, LoyaltySettingsSerializer
+from .serializers import (
+    CustomerSerializer, CustomerAddressSerializer, CustomerLedgerEntrySerializer,
+    LoyaltyTransactionSerializer, LoyaltySettingsSerializer
+)
 from apps.auth_app.permissions import IsAuthenticated
-from .services import CustomerService, LoyaltyService
+from .services import CustomerService, LoyaltyService, CustomerImportService, CustomerLedgerService, CustomerStatsService
+from apps.common.serializers import BackgroundJobSerializer
 
 class StandardPagination(PageNumberPagination):
     page_size = 20
@@ -43,6 +47,46 @@ class CustomerListCreateView(ListCreateAPIView):
         except Exception as e:
             return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
 
+class CustomerImportView(APIView):
+    """Controller for bulk Customer import (CSV/XLSX upload, processed in the background)."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            job = CustomerImportService.start_import(request.user, request.FILES.get('file'))
+            return Response(BackgroundJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
+class CustomerLedgerView(ListAPIView):
+    """Controller for a customer's receivables statement (ledger entries with running balance)."""
+    serializer_class = CustomerLedgerEntrySerializer
+    pagination_class = StandardPagination
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        return CustomerLedgerService.get_statement(self.request.user, self.kwargs['pk'])
+
+class CustomerAgingView(APIView):
+    """Controller for the receivables aging report (0-30/31-60/61-90/90+ days)."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(CustomerLedgerService.aging(request.user))
+        except Exception as e:
+            return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
+class CustomerSegmentsView(APIView):
+    """Controller for RFM segment counts and top customers, read from precomputed stats."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            return Response(CustomerStatsService.get_segments(request.user))
+        except Exception as e:
+            return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
 class CustomerDetailView(RetrieveUpdateDestroyAPIView):
     """Controller for Customer Detail, Update, and Delete."""
     serializer_class = CustomerSerializer
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+
+from django.db.models import BooleanField, Case, Count, Q, Sum, Value, When
+from django.utils import timezone
+
+from apps.billing.models import Invoice
+from apps.common.metrics import Metric, MetricsEngine, Source
+from apps.customer.models import Customer, CustomerStats
+from apps.product.models import LowStockCounter, Product
+
+
+class AnalyticsContext:
+    """Owner and period boundaries shared by every analytics source."""
+
+    def __init__(self, owner, days):
+        self.owner = owner
+        self.days = days
+        tz = timezone.get_current_timezone()
+        start = timezone.now().date() - timedelta(days=days)
+        self.start = datetime.combine(start, datetime.min.time(), tzinfo=tz)
+        self.previous_start = datetime.combine(start - timedelta(days=days), datetime.min.time(), tzinfo=tz)
+
+    def scoped(self, queryset):
+        return queryset.filter(owner=self.owner) if self.owner else queryset
+
+
+def _invoices(context):
+    # Both periods in one scan; `current` tells the period aggregates apart
+    return context.scoped(Invoice.objects.filter(status='completed', invoice_date__gte=context.previous_start)).annotate(
+        current=Case(When(invoice_date__gte=context.start, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    )
+
+
+def _customers(context):
+    return context.scoped(Customer.objects.filter(status='active')).annotate(
+        new=Case(When(created_at__gte=context.start, then=Value(True)), default=Value(False), output_field=BooleanField()),
+    )
+
+
+def _customer_stats(context):
+    # Precomputed per-customer figures; see CustomerStatsService
+    return context.scoped(CustomerStats.objects.filter(customer__status='active'))
+
+
+def _number(value):
+    return float(value or 0)
+
+
+def _percent(part, whole):
+    return float(part / whole * 100) if whole else 0
+
+
+INVOICES = Source('invoices', queryset=_invoices)
+CUSTOMERS = Source('customers', queryset=_customers)
+CUSTOMER_STATS = Source('customer_stats', queryset=_customer_stats)
+PRODUCTS = Source('products', queryset=lambda context: context.scoped(Product.objects.all()))
+LOW_STOCK = Source('low_stock', fetch=lambda context: {'low_stock_count': LowStockCounter.count_for(context.owner)})
+
+CURRENT = Q(current=True)
+PREVIOUS = Q(current=False)
+
+COMPREHENSIVE_METRICS = [
+    Metric('sales_metrics.total_invoices', INVOICES, {'invoice_count': Count('id', filter=CURRENT)}),
+    Metric('sales_metrics.total_sales', INVOICES, {'sales_total': Sum('total_amount', filter=CURRENT)},
+           lambda v: _number(v['sales_total'])),
+    Metric('sales_metrics.average_invoice_value', INVOICES,
+           {'sales_total': Sum('total_amount', filter=CURRENT), 'invoice_count': Count('id', filter=CURRENT)},
+           lambda v: _number(v['sales_total']) / v['invoice_count'] if v['invoice_count'] else 0),
+
+    Metric('payment_metrics.paid', INVOICES, {'paid': Sum('paid_amount', filter=CURRENT & Q(payment_status='paid'))},
+           lambda v: _number(v['paid'])),
+    Metric('payment_metrics.pending', INVOICES,
+           {'pending': Sum('total_amount', filter=CURRENT & Q(payment_status__in=['unpaid', 'partial']))},
+           lambda v: _number(v['pending'])),
+    Metric('payment_metrics.collection_rate', INVOICES, {
+        'paid': Sum('paid_amount', filter=CURRENT & Q(payment_status='paid')),
+        'pending': Sum('total_amount', filter=CURRENT & Q(payment_status__in=['unpaid', 'partial'])),
+    }, lambda v: _percent(_number(v['paid']), _number(v['paid']) + _number(v['pending']))),
+
+    Metric('customer_metrics.total_active', CUSTOMERS, {'active_customers': Count('id')}),
+    Metric('customer_metrics.new_customers', CUSTOMERS, {'new_customers': Count('id', filter=Q(new=True))}),
+    Metric('customer_metrics.repeat_customers', CUSTOMER_STATS, {'repeat_customers': Count('pk', filter=Q(invoice_count__gt=1))}),
+    Metric('customer_metrics.repeat_customer_percentage', CUSTOMER_STATS,
+           {'repeat_customers': Count('pk', filter=Q(invoice_count__gt=1))},
+           lambda v: _percent(v['repeat_customers'], v['active_customers'])),
+
+    Metric('product_metrics.total_products', PRODUCTS, {'product_count': Count('id')}),
+    Metric('product_metrics.active_products', PRODUCTS, {'in_stock': Count('id', filter=Q(stock__gt=0))}),
+    Metric('product_metrics.low_stock_count', LOW_STOCK, compute=lambda v: v['low_stock_count']),
+    Metric('product_metrics.out_of_stock_count', PRODUCTS, {'out_of_stock': Count('id', filter=Q(stock=0))}),
+
+    # Same expression as sales_total: computed once under that alias
+    Metric('growth_metrics.current_period_sales', INVOICES, {'current_sales': Sum('total_amount', filter=CURRENT)},
+           lambda v: _number(v['current_sales'])),
+    Metric('growth_metrics.previous_period_sales', INVOICES, {'previous_sales': Sum('total_amount', filter=PREVIOUS)},
+           lambda v: _number(v['previous_sales'])),
+    Metric('growth_metrics.sales_growth_percentage', INVOICES, {
+        'current_sales': Sum('total_amount', filter=CURRENT), 'previous_sales': Sum('total_amount', filter=PREVIOUS),
+    }, lambda v: _percent(_number(v['current_sales']) - _number(v['previous_sales']), _number(v['previous_sales']))),
+]
+
+
+class ComprehensiveAnalyticsService:
+    """Sales, payment, customer, product and growth metrics: one query per source."""
+    engine = MetricsEngine(COMPREHENSIVE_METRICS)
+
+    @classmethod
+    def get_analytics(cls, owner, days=30):
+        results, timings = cls.engine.run(AnalyticsContext(owner, days))
+        results['sales_metrics']['period_days'] = days
+        return results, timings
@@ -1,15 +1,20 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from django.conf import settings
 from django.db.models import Sum, Count, Q, F, DecimalField
 from django.utils import timezone
 from datetime import timedelta
 from apps.auth_app.permissions import IsAuthenticated
 from apps.billing.models import Invoice
 from apps.payment.models import Payment
-from apps.product.models import Product, InventoryBatch
+from apps.product.models import Product, InventoryBatch, LowStockCounter
 from apps.customer.models import Customer
+from apps.customer.services import CustomerStatsService
 from apps.purchase.models import PurchaseOrder
+from apps.reports.services import ProductSalesService
+from apps.common.metrics import MetricsEngine
+from .services import ComprehensiveAnalyticsService
 
 class DashboardOverviewView(APIView):
     """Dashboard overview with key metrics."""
@@ -83,7 +88,7 @@ class DashboardOverviewView(APIView):
             # Low stock
             low_stock_count = 0
             try:
-                low_stock_count = product_qs.filter(stock__lte=10).count()
+                low_stock_count = LowStockCounter.count_for(owner)
             except Exception as e:
                 pass
             
@@ -217,7 +222,7 @@ class DashboardAnalyticsView(APIView):
                 pass
             
             # Customer analytics
-            customer_analytics = {'total_active': 0, 'new_this_period': 0, 'top_customers': []}
+            customer_analytics = {'total_active': 0, 'new_this_period': 0, 'top_customers': [], 'segments': {}}
             try:
                 customer_analytics['total_active'] = customer_qs.filter(status='active').count()
                 customer_analytics['new_this_period'] = customer_qs.filter(
@@ -226,15 +231,15 @@ class DashboardAnalyticsView(APIView):
                 ).count()
                 
                 try:
-                    top_customers = customer_qs.annotate(
-                        total_spent=Sum('invoices__total_amount', filter=Q(invoices__status='completed'))
-                    ).filter(status='active').order_by('-total_spent')[:5]
-                    
                     customer_analytics['top_customers'] = [{
-                        'id': c.id,
-                        'name': c.name,
-                        'total_spent': float(c.total_spent or 0)
-                    } for c in top_customers]
+                        'id': c['customer_id'],
+                        'name': c['name'],
+                        'total_spent': float(c['total_spent']),
+                        'segment': c['segment'],
+                    } for c in CustomerStatsService.top_customers(owner)]
+                    customer_analytics['segments'] = {
+                        segment: values['customers'] for segment, values in CustomerStatsService.segments(owner).items()
+                    }
                 except Exception as e:
                     print(f"Top customers error: {e}")
             except Exception as e:
@@ -276,7 +281,7 @@ class DashboardAnalyticsView(APIView):
             product_analytics = {}
             try:
                 total_products = product_qs.count()
-                low_stock = product_qs.filter(stock__lte=10).count()
+                low_stock = LowStockCounter.count_for(owner)
                 out_of_stock = product_qs.filter(stock=0).count()
                 
                 product_analytics = {
@@ -301,7 +306,7 @@ class DashboardAnalyticsView(APIView):
                 'period': 'week',
                 'daily_sales': [],
                 'payment_breakdown': [],
-                'customer_analytics': {'total_active': 0, 'new_this_period': 0, 'top_customers': []},
+                'customer_analytics': {'total_active': 0, 'new_this_period': 0, 'top_customers': [], 'segments': {}},
                 'revenue_analytics': {'total': 0, 'paid': 0, 'pending': 0, 'invoices': 0},
                 'product_analytics': {'total': 0, 'low_stock': 0, 'out_of_stock': 0, 'total_inventory_value': 0},
                 'error': str(e)
@@ -323,31 +328,20 @@ class TopProductsView(APIView):
             limit = int(request.query_params.get('limit', 10))
             period = request.query_params.get('period', 'month')
             
-            query = Invoice.objects.filter(status='completed')
-            
-            if period == 'month':
-                start = timezone.now().date().replace(day=1)
-                query = query.filter(invoice_date__date__gte=start)
-            elif period == 'week':
-                start = timezone.now().date() - timedelta(days=7)
-                query = query.filter(invoice_date__date__gte=start)
-            
             # Filter by Owner
             from apps.common.helpers import get_user_owner
             owner = get_user_owner(request.user)
-            if owner:
-                query = query.filter(owner=owner)
             
-            # Get invoice counts
-            top_products = []
-            try:
-                products = Product.objects.all()
-                if owner:
-                    products = products.filter(owner=owner)
-                products = products[:limit]
-                top_products = [{'id': p.id, 'name': p.name, 'stock': p.stock} for p in products]
-            except:
-                pass
+            # Ranked from the daily product sales summary by quantity, revenue or margin
+            start, end = ProductSalesService.period_window(period)
+            ranking = ProductSalesService.ranking(owner, start, end, by=request.query_params.get('by', 'quantity'), limit=limit)
+            top_products = [
+                {
+                    'id': row['product_id'], 'name': row['name'], 'code': row['code'], 'stock': row['stock'],
+                    'quantity': row['quantity'], 'revenue': float(row['revenue']), 'margin': float(row['margin']),
+                }
+                for row in ranking
+            ]
             
             return Response(top_products)
         except Exception as e:
@@ -409,7 +403,7 @@ class LowStockAlertsView(APIView):
                 from apps.common.helpers import get_user_owner
                 owner = get_user_owner(request.user)
                 
-                qs = Product.objects.filter(stock__lte=10)
+                qs = Product.objects.filter(is_active=True, stock__lte=F('reorder_level'))
                 if owner:
                     qs = qs.filter(owner=owner)
 
@@ -439,145 +433,16 @@ class ComprehensiveAnalyticsView(APIView):
         try:
             # Time range
             days = int(request.query_params.get('days', 30))
-            start = timezone.now().date() - timedelta(days=days)
 
             # Resolve Owner
             from apps.common.helpers import get_user_owner
             owner = get_user_owner(request.user)
 
-            # Base qsets
-            invoice_qs = Invoice.objects.all()
-            customer_qs = Customer.objects.all()
-            product_qs = Product.objects.all()
-            
-            if owner:
-                invoice_qs = invoice_qs.filter(owner=owner)
-                customer_qs = customer_qs.filter(owner=owner)
-                product_qs = product_qs.filter(owner=owner)
-            
-            # Sales metrics
-            sales_metrics = {}
-            try:
-                total_invoices = invoice_qs.filter(
-                    status='completed',
-                    invoice_date__date__gte=start
-                ).count()
-                
-                avg_invoice = 0
-                if total_invoices > 0:
-                    total_sales = invoice_qs.filter(
-                        status='completed',
-                        invoice_date__date__gte=start
-                    ).aggregate(total=Sum('total_amount'))['total'] or 0
-                    avg_invoice = float(total_sales) / total_invoices
-                
-                sales_metrics = {
-                    'total_invoices': total_invoices,
-                    'total_sales': float(avg_invoice * total_invoices) if total_invoices > 0 else 0,
-                    'average_invoice_value': float(avg_invoice),
-                    'period_days': days
-                }
-            except Exception as e:
-                sales_metrics = {'total_invoices': 0, 'total_sales': 0, 'average_invoice_value': 0, 'period_days': days}
-            
-            # Payment metrics
-            payment_metrics = {}
-            try:
-                paid_amount = invoice_qs.filter(
-                    status='completed',
-                    payment_status='paid',
-                    invoice_date__date__gte=start
-                ).aggregate(total=Sum('paid_amount'))['total'] or 0
-                
-                pending_amount = invoice_qs.filter(
-                    status='completed',
-                    payment_status__in=['unpaid', 'partial'],
-                    invoice_date__date__gte=start
-                ).aggregate(total=Sum('total_amount'))['total'] or 0
-                
-                payment_metrics = {
-                    'paid': float(paid_amount),
-                    'pending': float(pending_amount),
-                    'collection_rate': float(paid_amount / (paid_amount + pending_amount) * 100) if (paid_amount + pending_amount) > 0 else 0
-                }
-            except:
-                payment_metrics = {'paid': 0, 'pending': 0, 'collection_rate': 0}
-            
-            # Customer metrics
-            customer_metrics = {}
-            try:
-                total_customers = customer_qs.filter(status='active').count()
-                new_customers = customer_qs.filter(
-                    status='active',
-                    created_at__date__gte=start
-                ).count()
-                
-                try:
-                    repeat_customers = customer_qs.filter(status='active').annotate(
-                        invoice_count=Count('invoices', filter=Q(invoices__status='completed'))
-                    ).filter(invoice_count__gt=1).count()
-                except:
-                    repeat_customers = 0
-                
-                customer_metrics = {
-                    'total_active': total_customers,
-                    'new_customers': new_customers,
-                    'repeat_customers': repeat_customers,
-                    'repeat_customer_percentage': float(repeat_customers / total_customers * 100) if total_customers > 0 else 0
-                }
-            except:
-                customer_metrics = {'total_active': 0, 'new_customers': 0, 'repeat_customers': 0, 'repeat_customer_percentage': 0}
-            
-            # Product metrics
-            product_metrics = {}
-            try:
-                total_products = product_qs.count()
-                active_products = product_qs.filter(stock__gt=0).count()
-                
-                product_metrics = {
-                    'total_products': total_products,
-                    'active_products': active_products,
-                    'low_stock_count': product_qs.filter(stock__lte=10).count(),
-                    'out_of_stock_count': product_qs.filter(stock=0).count()
-                }
-            except:
-                product_metrics = {'total_products': 0, 'active_products': 0, 'low_stock_count': 0, 'out_of_stock_count': 0}
-            
-            # Growth metrics
-            growth_metrics = {}
-            try:
-                # Previous period
-                prev_start = start - timedelta(days=days)
-                prev_sales = invoice_qs.filter(
-                    status='completed',
-                    invoice_date__date__gte=prev_start,
-                    invoice_date__date__lt=start
-                ).aggregate(total=Sum('total_amount'))['total'] or 0
-                
-                current_sales = invoice_qs.filter(
-                    status='completed',
-                    invoice_date__date__gte=start
-                ).aggregate(total=Sum('total_amount'))['total'] or 0
-                
-                sales_growth = 0
-                if float(prev_sales) > 0:
-                    sales_growth = float((current_sales - prev_sales) / prev_sales * 100)
-                
-                growth_metrics = {
-                    'sales_growth_percentage': float(sales_growth),
-                    'current_period_sales': float(current_sales),
-                    'previous_period_sales': float(prev_sales)
-                }
-            except:
-                growth_metrics = {'sales_growth_percentage': 0, 'current_period_sales': 0, 'previous_period_sales': 0}
-            
-            return Response({
-                'sales_metrics': sales_metrics,
-                'payment_metrics': payment_metrics,
-                'customer_metrics': customer_metrics,
-                'product_metrics': product_metrics,
-                'growth_metrics': growth_metrics,
-                'analysis_period_days': days
-            })
+            # Declarative spec: one query per source, independent sources run concurrently
+            metrics, timings = ComprehensiveAnalyticsService.get_analytics(owner, days)
+            response = Response({**metrics, 'analysis_period_days': days})
+            if settings.DEBUG:
+                response['Server-Timing'] = MetricsEngine.server_timing(timings)
+            return response
         except Exception as e:
-            return Response({'error': str(e)}, status=status.HTTP_200_OK)
+            return Response({'error': str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
@@ -11,6 +11,7 @@ from django.db import transaction
 from django.utils import timezone
 
 from apps.product.models import Product, InventoryBatch, InventoryMovement
+from apps.product.signals import detect_threshold_crossing
 from apps.inventory.models import InventoryAuditLog, StockSyncLog
 from apps.inventory.serializers import (
     InventoryBatchSerializer, InventoryMovementSerializer,
@@ -164,8 +165,10 @@ class InventoryMovementListCreate(ListCreateAPIView):
         
         # Save movement and update stock
         movement = serializer.save(created_by_id=request.user.id if request.user.id else None)
+        old_stock = product.stock
         product.stock = new_stock
         product.save(update_fields=['stock', 'updated_at'])
+        detect_threshold_crossing(product, old_stock)
         
         # Log audit
         InventoryAuditLog.objects.create(
@@ -221,6 +224,7 @@ class StockAdjustmentView(APIView):
 
         product.stock = new_stock
         product.save(update_fields=['stock', 'updated_at'])
+        detect_threshold_crossing(product, old_stock)
 
         # Record movement
         InventoryMovement.objects.create(
@@ -292,6 +296,7 @@ class StockSyncView(APIView):
                     old_stock = product.stock
                     product.stock = total_stock
                     product.save(update_fields=['stock', 'updated_at'])
+                    detect_threshold_crossing(product, old_stock)
                     
                     if old_stock != total_stock:
                         sync_log.updated_count += 1
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:18
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def mark_applied_payments(apps, schema_editor):
+    # Payments recorded through the list endpoint ('pending') or completed were
+    # already added to invoice.paid_amount; 'processing' ones were not.
+    Payment = apps.get_model('payment', 'Payment')
+    Payment.objects.filter(status__in=['pending', 'completed', 'refunded']).update(applied_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payment', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='payment',
+            name='applied_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(mark_applied_payments, migrations.RunPython.noop),
+    ]
@@ -61,6 +61,9 @@ class Payment(models.Model):
     gateway_ref_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     gateway_response = models.JSONField(null=True, blank=True)
     
+    # Set once the amount has been added to the invoice; makes application idempotent
+    applied_at = models.DateTimeField(blank=True, null=True)
+    
     # Metadata
     notes = models.TextField(blank=True, null=True)
     created_by_id = models.IntegerField(blank=True, null=True)
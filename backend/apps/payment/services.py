@@ -0,0 +1,335 @@
+import logging
+import os
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, CharField, DecimalField, F, Value, When
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from apps.billing.models import Invoice
+from apps.common.helpers import get_user_owner
+from apps.common.importers import SUPPORTED_EXTENSIONS, chunked, iter_tabular_rows
+from apps.common.jobs import report_progress, start_background_job
+from apps.common.models import BackgroundJob
+from apps.customer.services import CustomerLedgerService
+from apps.users.utils import has_permission
+from .models import Payment
+from .serializers import PaymentSerializer
+
+logger = logging.getLogger(__name__)
+
+
+class PaymentApplicationService:
+    """
+    Applies payments to invoices safely under concurrent settlement from several tills.
+
+    The invoice row is locked, paid_amount moves by F() arithmetic and payment_status is
+    derived in the same UPDATE, so no partial payment can be lost. A payment is applied at
+    most once (tracked by `Payment.applied_at`), and the same amount is posted to the
+    customer ledger instead of re-aggregating receivables from invoices.
+    """
+
+    @staticmethod
+    def _payment_status_for(delta):
+        """CASE deriving payment_status from paid_amount + delta (pre-update values)."""
+        new_paid = F('paid_amount') + Value(delta)
+        return Case(
+            When(total_amount__lte=new_paid, then=Value('paid')),
+            When(paid_amount__gt=-delta, then=Value('partial')),
+            default=Value('unpaid'),
+            output_field=CharField(),
+        )
+
+    @classmethod
+    def _shift_invoice(cls, invoice_id, delta, reference_id=None):
+        """Lock the invoice and move paid_amount by `delta`; returns the refreshed invoice."""
+        invoice = Invoice.objects.select_for_update().get(pk=invoice_id)
+        new_paid = invoice.paid_amount + delta
+        if new_paid > invoice.total_amount:
+            raise ValidationError(
+                f"Payment exceeds the balance of invoice {invoice.invoice_number}. "
+                f"Remaining: {invoice.total_amount - invoice.paid_amount}"
+            )
+        if new_paid < 0:
+            raise ValidationError(f"Cannot reverse more than was paid on invoice {invoice.invoice_number}.")
+
+        Invoice.objects.filter(pk=invoice_id).update(
+            paid_amount=F('paid_amount') + Value(delta),
+            payment_status=cls._payment_status_for(delta),
+        )
+        CustomerLedgerService.post([{
+            'customer_id': invoice.customer_id,
+            'entry_type': 'payment' if delta > 0 else 'refund',
+            'invoice_id': invoice_id,
+            'credit' if delta > 0 else 'debit': abs(delta),
+            'reference_id': reference_id,
+            'description': f"{'Payment' if delta > 0 else 'Refund'} {reference_id or ''} on {invoice.invoice_number}".strip(),
+        }])
+        invoice.refresh_from_db(fields=['paid_amount', 'payment_status'])
+        return invoice
+
+    @classmethod
+    @transaction.atomic
+    def apply_payment(cls, payment):
+        """Apply `payment` to its invoice and mark it completed. Repeat calls are no-ops."""
+        payment = Payment.objects.select_for_update().get(pk=payment.pk)
+        if payment.applied_at:
+            return payment
+        if payment.status in ('failed', 'cancelled', 'refunded'):
+            raise ValidationError(f"Cannot apply a {payment.status} payment.")
+
+        cls._shift_invoice(payment.invoice_id, payment.amount, reference_id=payment.payment_id)
+        payment.status = 'completed'
+        payment.applied_at = timezone.now()
+        payment.save(update_fields=['status', 'applied_at', 'updated_at'])
+        logger.info(f"Applied payment {payment.payment_id} ({payment.amount}) to invoice {payment.invoice_id}")
+        return payment
+
+    @classmethod
+    @transaction.atomic
+    def apply_batch(cls, payments):
+        """
+        Set-wise `apply_payment` for already locked, unapplied payments: one locked invoice
+        read, one CASE UPDATE each for invoices and payments, and one ledger batch.
+        Returns (applied, rejected) where rejected is a list of (payment, reason).
+        """
+        by_invoice = {}
+        for payment in payments:
+            by_invoice.setdefault(payment.invoice_id, []).append(payment)
+        if not by_invoice:
+            return [], []
+        invoices = Invoice.objects.select_for_update().in_bulk(list(by_invoice))
+
+        applied, rejected = [], []
+        invoice_deltas, postings = {}, []
+        for invoice_id, group in by_invoice.items():
+            invoice = invoices[invoice_id]
+            remaining = invoice.total_amount - invoice.paid_amount
+            delta = Decimal('0')
+            for payment in group:
+                if delta + payment.amount > remaining:
+                    rejected.append((payment, f"Exceeds the balance of invoice {invoice.invoice_number} ({remaining - delta})."))
+                    continue
+                delta += payment.amount
+                applied.append(payment)
+                postings.append({
+                    'customer_id': invoice.customer_id, 'entry_type': 'payment', 'invoice_id': invoice_id,
+                    'credit': payment.amount, 'reference_id': payment.payment_id,
+                    'description': f"Payment {payment.payment_id} on {invoice.invoice_number}",
+                })
+            if delta:
+                invoice_deltas[invoice_id] = delta
+
+        if not applied:
+            return applied, rejected
+
+        money = DecimalField(max_digits=12, decimal_places=2)
+        Invoice.objects.filter(id__in=invoice_deltas).update(
+            paid_amount=Case(
+                *[When(id=pk, then=F('paid_amount') + Value(delta)) for pk, delta in invoice_deltas.items()],
+                default=F('paid_amount'), output_field=money,
+            ),
+            # Deltas are positive, so an invoice is either settled or partially paid after this.
+            payment_status=Case(
+                *[When(id=pk, total_amount__lte=F('paid_amount') + Value(delta), then=Value('paid'))
+                  for pk, delta in invoice_deltas.items()],
+                default=Value('partial'), output_field=CharField(),
+            ),
+        )
+        CustomerLedgerService.post(postings)
+        now = timezone.now()
+        Payment.objects.filter(id__in=[payment.id for payment in applied]).update(
+            status='completed', applied_at=now, updated_at=now
+        )
+        return applied, rejected
+
+    @classmethod
+    @transaction.atomic
+    def reverse_payment(cls, payment, amount, status='refunded'):
+        """Mark a payment refunded, taking `amount` back off its invoice if it was applied."""
+        payment = Payment.objects.select_for_update().get(pk=payment.pk)
+        if payment.status == 'refunded':
+            raise ValidationError(f"Payment {payment.payment_id} has already been refunded.")
+        if payment.applied_at:
+            # Never take more off the invoice than this payment put on it
+            cls._shift_invoice(payment.invoice_id, -min(amount, payment.amount), reference_id=payment.payment_id)
+        payment.status = status
+        payment.save(update_fields=['status', 'updated_at'])
+        return payment
+
+    @classmethod
+    @transaction.atomic
+    def record_payment(cls, user, data):
+        """
+        Create and apply a payment. A client-supplied `payment_id` acts as an idempotency
+        key: replaying the same request returns the original payment without re-applying,
+        and reusing the key for a different invoice or amount is rejected.
+        Returns (payment, created).
+        """
+        payment_id = data.get('payment_id') or f"PAY-{uuid.uuid4().hex[:12].upper()}"
+        serializer = PaymentSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        existing = Payment.objects.filter(payment_id=payment_id).first()
+        if existing:
+            return cls._replay(existing, serializer.validated_data), False
+
+        try:
+            with transaction.atomic():
+                payment = serializer.save(payment_id=payment_id, created_by_id=user.id if user else None)
+        except IntegrityError:
+            # A concurrent replay of the same request won the insert.
+            return cls._replay(Payment.objects.get(payment_id=payment_id), serializer.validated_data), False
+        return cls.apply_payment(payment), True
+
+    @classmethod
+    def _replay(cls, existing, validated):
+        if existing.invoice_id != validated['invoice'].pk or existing.amount != validated['amount']:
+            raise ValidationError(
+                {"payment_id": f"Payment {existing.payment_id} was already recorded for a different invoice or amount."}
+            )
+        return cls.apply_payment(existing)
+
+
+class SettlementReconciliationService:
+    """
+    Reconciles gateway/bank settlement files (UPI, card) against recorded payments.
+
+    The file is streamed in chunks; each chunk costs one locked `gateway_ref_id__in`
+    lookup, set-wise invoice application via `PaymentApplicationService.apply_batch`
+    and bulk status updates. Anything that does not line up is written to the job's
+    discrepancy report instead of failing the run.
+    """
+    JOB_TYPE = 'settlement_reconciliation'
+    CHUNK_SIZE = 1000
+    REFERENCE_COLUMNS = ('gateway_ref_id', 'reference', 'reference_id', 'utr', 'rrn', 'transaction_id', 'txn_id')
+    AMOUNT_COLUMNS = ('amount', 'settled_amount', 'txn_amount', 'transaction_amount')
+    SUCCESS_STATUSES = {'', 'success', 'successful', 'settled', 'captured', 'completed', 'paid'}
+    FAILED_STATUSES = {'failed', 'failure', 'declined', 'reversed', 'rejected'}
+
+    @staticmethod
+    def _check_permission(user):
+        if not user.is_superuser and not has_permission(user, 'manage_invoices'):
+            raise PermissionDenied("You do not have permission to reconcile payments.")
+
+    @classmethod
+    def start_reconciliation(cls, user, uploaded_file):
+        cls._check_permission(user)
+        owner = get_user_owner(user)
+        if owner is None:
+            raise ValidationError("Reconciliation must be run from a business account.")
+        if not uploaded_file:
+            raise ValidationError("No file uploaded. Send the settlement report as 'file'.")
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValidationError(f"Unsupported file type '{extension}'. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+        job = BackgroundJob(
+            job_type=cls.JOB_TYPE,
+            owner=owner,
+            created_by=user,
+            options={'file_name': uploaded_file.name}
+        )
+        job.source_file.save(uploaded_file.name, uploaded_file, save=False)
+        job.save()
+        return start_background_job(job, cls.run_reconciliation)
+
+    @classmethod
+    def run_reconciliation(cls, job):
+        """Job handler: read the stored settlement file and reconcile it."""
+        file_name = job.options.get('file_name') or job.source_file.name
+        with job.source_file.open('rb') as fileobj:
+            return cls.reconcile_rows(job, iter_tabular_rows(fileobj, file_name))
+
+    @classmethod
+    def _parse_row(cls, row):
+        reference = next((str(row[c]).strip() for c in cls.REFERENCE_COLUMNS if row.get(c) not in (None, '')), '')
+        raw_amount = next((row[c] for c in cls.AMOUNT_COLUMNS if row.get(c) not in (None, '')), None)
+        status = str(row.get('status') or '').strip().lower()
+        if not reference:
+            raise ValueError("Missing gateway reference.")
+        try:
+            amount = Decimal(str(raw_amount).replace(',', '')).quantize(Decimal('0.01'))
+        except (InvalidOperation, TypeError, ValueError):
+            raise ValueError(f"Invalid amount '{raw_amount}'.")
+        if status not in cls.SUCCESS_STATUSES | cls.FAILED_STATUSES:
+            raise ValueError(f"Unknown settlement status '{status}'.")
+        return reference, amount, status in cls.SUCCESS_STATUSES
+
+    @staticmethod
+    def _issue(row_number, reference, issue, detail):
+        return {'row': row_number, 'errors': {'reference': reference, 'issue': issue, 'detail': detail}}
+
+    @classmethod
+    def reconcile_rows(cls, job, rows):
+        """Match `(row_number, dict)` settlement rows against `job.owner`'s payments."""
+        totals = {'matched': 0, 'applied': 0, 'already_settled': 0, 'marked_failed': 0, 'discrepancies': 0}
+        processed = 0
+        seen = set()
+        for chunk in chunked(rows, cls.CHUNK_SIZE):
+            issues = []
+            settled = {}
+            for row_number, row in chunk:
+                try:
+                    reference, amount, success = cls._parse_row(row)
+                except ValueError as e:
+                    issues.append(cls._issue(row_number, row.get('gateway_ref_id', ''), 'invalid_row', str(e)))
+                    continue
+                if reference in seen:
+                    issues.append(cls._issue(row_number, reference, 'duplicate', "Reference appears more than once in the file."))
+                    continue
+                seen.add(reference)
+                settled[reference] = (row_number, amount, success)
+
+            with transaction.atomic():
+                payments = {
+                    payment.gateway_ref_id: payment
+                    for payment in Payment.objects.select_for_update(of=('self',))
+                    .filter(gateway_ref_id__in=list(settled), invoice__owner=job.owner)
+                }
+                to_apply, to_fail = [], []
+                for reference, (row_number, amount, success) in settled.items():
+                    payment = payments.get(reference)
+                    if payment is None:
+                        issues.append(cls._issue(row_number, reference, 'unmatched', "No payment with this reference."))
+                        continue
+                    totals['matched'] += 1
+                    if amount != payment.amount:
+                        issues.append(cls._issue(
+                            row_number, reference, 'amount_mismatch',
+                            f"Recorded {payment.amount}, settled {amount}."
+                        ))
+                        continue
+                    if not success:
+                        if payment.applied_at:
+                            issues.append(cls._issue(
+                                row_number, reference, 'failed_after_apply',
+                                "Settlement failed for a payment already applied to its invoice."
+                            ))
+                        elif payment.status != 'failed':
+                            to_fail.append(payment.id)
+                        continue
+                    if payment.applied_at:
+                        totals['already_settled'] += 1
+                    elif payment.status in ('failed', 'cancelled', 'refunded'):
+                        issues.append(cls._issue(
+                            row_number, reference, 'status_conflict', f"Payment is {payment.status} but was settled."
+                        ))
+                    else:
+                        to_apply.append(payment)
+
+                applied, rejected = PaymentApplicationService.apply_batch(to_apply)
+                for payment, reason in rejected:
+                    issues.append(cls._issue(settled[payment.gateway_ref_id][0], payment.gateway_ref_id, 'exceeds_balance', reason))
+                if to_fail:
+                    Payment.objects.filter(id__in=to_fail).update(status='failed', updated_at=timezone.now())
+
+            totals['applied'] += len(applied)
+            totals['marked_failed'] += len(to_fail)
+            totals['discrepancies'] += len(issues)
+            processed += len(chunk)
+            report_progress(job, processed, processed - totals['discrepancies'], totals['discrepancies'], issues)
+
+        job.total_rows = processed
+        return totals
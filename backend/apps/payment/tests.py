@@ -48,3 +48,146 @@ class PaymentModelTests(TestCase):
             reason='Partial refund'
         )
         self.assertEqual(refund.amount, Decimal('500.00'))
+
+class PaymentApplicationServiceTests(TestCase):
+    """Test locked, idempotent payment application."""
+
+    def setUp(self):
+        self.customer = Customer.objects.create(
+            phone='9876543211', name='Credit Customer', current_credit_used=Decimal('1000.00')
+        )
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-APPLY-1', customer=self.customer, total_amount=Decimal('1000.00')
+        )
+        self.cash = PaymentMethod.objects.create(name='cash')
+
+    def test_partial_payments_accumulate_and_derive_status(self):
+        """Test two partial payments settle the invoice and reduce receivables."""
+        from apps.payment.services import PaymentApplicationService
+        for amount in ('400.00', '600.00'):
+            payment = Payment.objects.create(
+                payment_id=f"PAY-{amount}", invoice=self.invoice, amount=Decimal(amount), payment_method=self.cash
+            )
+            PaymentApplicationService.apply_payment(payment)
+            if amount == '400.00':
+                self.invoice.refresh_from_db()
+                self.assertEqual(self.invoice.payment_status, 'partial')
+
+        self.invoice.refresh_from_db()
+        self.customer.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('1000.00'))
+        self.assertEqual(self.invoice.payment_status, 'paid')
+        self.assertEqual(self.customer.current_credit_used, Decimal('0.00'))
+
+    def test_apply_and_record_are_idempotent(self):
+        """Test re-completing or replaying a payment never double-counts it."""
+        from apps.payment.services import PaymentApplicationService
+        data = {'payment_id': 'PAY-TILL-7', 'invoice': self.invoice.id, 'amount': '250.00', 'payment_method': 'cash'}
+        payment, created = PaymentApplicationService.record_payment(None, dict(data))
+        self.assertTrue(created)
+        PaymentApplicationService.apply_payment(payment)
+        replayed, created = PaymentApplicationService.record_payment(None, dict(data))
+
+        self.assertFalse(created)
+        self.assertEqual(replayed.pk, payment.pk)
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('250.00'))
+
+    def test_replay_with_different_amount_is_rejected(self):
+        """Test an idempotency key cannot be reused for another amount."""
+        from rest_framework.exceptions import ValidationError
+        from apps.payment.services import PaymentApplicationService
+        data = {'payment_id': 'PAY-TILL-8', 'invoice': self.invoice.id, 'amount': '250.00', 'payment_method': 'cash'}
+        PaymentApplicationService.record_payment(None, dict(data))
+        with self.assertRaises(ValidationError):
+            PaymentApplicationService.record_payment(None, dict(data, amount='900.00'))
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('250.00'))
+
+    def test_refund_reverses_a_payment_once(self):
+        """Test a refund takes at most the payment back, and only once."""
+        from rest_framework.exceptions import ValidationError
+        from apps.payment.services import PaymentApplicationService
+        PaymentApplicationService.apply_payment(Payment.objects.create(
+            payment_id='PAY-KEEP', invoice=self.invoice, amount=Decimal('600.00'), payment_method=self.cash
+        ))
+        payment = PaymentApplicationService.apply_payment(Payment.objects.create(
+            payment_id='PAY-REFUND', invoice=self.invoice, amount=Decimal('300.00'), payment_method=self.cash
+        ))
+        PaymentApplicationService.reverse_payment(payment, Decimal('500.00'))
+        with self.assertRaises(ValidationError):
+            PaymentApplicationService.reverse_payment(payment, Decimal('300.00'))
+
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('600.00'))
+
+    def test_unapplied_payment_is_marked_refunded(self):
+        """Test refunding a payment never applied to its invoice still closes it to further refunds."""
+        from rest_framework.exceptions import ValidationError
+        from apps.payment.services import PaymentApplicationService
+        payment = Payment.objects.create(
+            payment_id='PAY-PENDING', invoice=self.invoice, amount=Decimal('300.00'), payment_method=self.cash
+        )
+        PaymentApplicationService.reverse_payment(payment, Decimal('300.00'))
+
+        payment.refresh_from_db()
+        self.assertEqual(payment.status, 'refunded')
+        with self.assertRaises(ValidationError):
+            PaymentApplicationService.reverse_payment(payment, Decimal('300.00'))
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('0.00'))
+
+    def test_overpayment_is_rejected(self):
+        """Test a payment larger than the remaining balance is refused."""
+        from rest_framework.exceptions import ValidationError
+        from apps.payment.services import PaymentApplicationService
+        payment = Payment.objects.create(
+            payment_id='PAY-BIG', invoice=self.invoice, amount=Decimal('1500.00'), payment_method=self.cash
+        )
+        with self.assertRaises(ValidationError):
+            PaymentApplicationService.apply_payment(payment)
+        payment.refresh_from_db()
+        self.assertIsNone(payment.applied_at)
+
+class SettlementReconciliationServiceTests(TestCase):
+    """Test bulk settlement reconciliation."""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from apps.common.models import BackgroundJob
+        self.owner = get_user_model().objects.create_user(phone='9000000030', password='test123')
+        self.invoice = Invoice.objects.create(
+            invoice_number='INV-SETTLE-1', owner=self.owner, total_amount=Decimal('900.00')
+        )
+        upi = PaymentMethod.objects.create(name='upi')
+        self.payments = [
+            Payment.objects.create(
+                payment_id=f"PAY-UPI-{i}", invoice=self.invoice, amount=Decimal('300.00'),
+                payment_method=upi, status='processing', gateway_ref_id=f"UTR{i}"
+            )
+            for i in range(3)
+        ]
+        self.job = BackgroundJob.objects.create(job_type='settlement_reconciliation', owner=self.owner)
+
+    def test_reconcile_applies_matches_and_reports_discrepancies(self):
+        """Test matched rows settle the invoice set-wise and the rest are reported."""
+        from apps.payment.services import SettlementReconciliationService
+        rows = enumerate([
+            {'utr': 'UTR0', 'amount': '300.00', 'status': 'SUCCESS'},
+            {'utr': 'UTR1', 'amount': '300', 'status': 'success'},
+            {'utr': 'UTR2', 'amount': '250.00', 'status': 'success'},
+            {'utr': 'UTR9', 'amount': '10.00', 'status': 'success'},
+            {'utr': 'UTR0', 'amount': '300.00', 'status': 'success'},
+        ], start=2)
+        with self.assertNumQueries(9):
+            result = SettlementReconciliationService.reconcile_rows(self.job, rows)
+
+        self.assertEqual(result['applied'], 2)
+        self.assertEqual(result['discrepancies'], 3)
+        issues = sorted(entry['errors']['issue'] for entry in self.job.error_report)
+        self.assertEqual(issues, ['amount_mismatch', 'duplicate', 'unmatched'])
+        self.invoice.refresh_from_db()
+        self.assertEqual(self.invoice.paid_amount, Decimal('600.00'))
+        self.assertEqual(self.invoice.payment_status, 'partial')
+        self.assertEqual(Payment.objects.filter(status='completed', applied_at__isnull=False).count(), 2)
@@ -5,7 +5,8 @@ from .views import (
     PaymentDetailView,
     PaymentRefundListCreateView,
     PaymentProcessView,
-    PaymentCompleteView
+    PaymentCompleteView,
+    SettlementReconciliationView
 )
 
 urlpatterns = [
@@ -17,6 +18,7 @@ urlpatterns = [
     path('<int:pk>/', PaymentDetailView.as_view(), name='payment-detail'),
     path('process/', PaymentProcessView.as_view(), name='payment-process'),
     path('<int:payment_id>/complete/', PaymentCompleteView.as_view(), name='payment-complete'),
+    path('reconcile/', SettlementReconciliationView.as_view(), name='payment-reconcile'),
     
     # Refunds
     path('refunds/', PaymentRefundListCreateView.as_view(), name='payment-refund-list'),
@@ -6,6 +6,8 @@ from rest_framework.pagination import PageNumberPagination
 from django.db import transaction
 from .models import Payment, PaymentRefund, PaymentMethod
 from .serializers import PaymentSerializer, PaymentRefundSerializer, PaymentMethodSerializer
+from .services import PaymentApplicationService, SettlementReconciliationService
+from apps.common.serializers import BackgroundJobSerializer
 from apps.auth_app.permissions import IsAuthenticated
 import uuid
 from decimal import Decimal
@@ -48,29 +50,13 @@ class PaymentListCreateView(ListCreateAPIView):
         
         return queryset.order_by('-created_at')
 
-    @transaction.atomic
-    def perform_create(self, serializer):
-        payment_id = f"PAY-{uuid.uuid4().hex[:12].upper()}"
-        payment = serializer.save(
-            payment_id=payment_id,
-            created_by_id=self.request.user.id if hasattr(self.request, 'user') else None
-        )
-        
-        # Update invoice payment status
-        invoice = payment.invoice
-        invoice.paid_amount += payment.amount
-        
-        if invoice.paid_amount >= invoice.total_amount:
-            invoice.payment_status = 'paid'
-        elif invoice.paid_amount > 0:
-            invoice.payment_status = 'partial'
-        
-        invoice.save()
-        
-        # Log the updated pending amount for the customer
-        customer = invoice.customer
-        if customer:
-            pending_amount = customer.get_pending_amount()
+    def create(self, request, *args, **kwargs):
+        try:
+            payment, created = PaymentApplicationService.record_payment(request.user, request.data)
+            code = status.HTTP_201_CREATED if created else status.HTTP_200_OK
+            return Response(PaymentSerializer(payment).data, status=code)
+        except Exception as e:
+            return Response({'detail': getattr(e, 'detail', str(e))}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
 
 class PaymentDetailView(RetrieveUpdateDestroyAPIView):
     """Retrieve, update, or delete a payment."""
@@ -93,30 +79,20 @@ class PaymentRefundListCreateView(ListCreateAPIView):
             created_by_id=self.request.user.id if hasattr(self.request, 'user') else None
         )
         
-        # Update payment status if refunded
+        # Take a full refund back off the invoice
         if refund.amount >= refund.payment.amount:
-            refund.payment.status = 'refunded'
-            refund.payment.save()
-            
-            # Update invoice paid_amount
-            invoice = refund.payment.invoice
-            invoice.paid_amount -= refund.amount
-            
-            # Recalculate payment status
-            if invoice.paid_amount <= 0:
-                invoice.payment_status = 'unpaid'
-                invoice.paid_amount = Decimal('0')
-            elif invoice.paid_amount >= invoice.total_amount:
-                invoice.payment_status = 'paid'
-            else:
-                invoice.payment_status = 'partial'
-            
-            invoice.save()
-            
-            # Log the updated pending amount for the customer
-            customer = invoice.customer
-            if customer:
-                pending_amount = customer.get_pending_amount()
+            PaymentApplicationService.reverse_payment(refund.payment, refund.amount)
+
+class SettlementReconciliationView(APIView):
+    """Upload a UPI/card settlement report; it is reconciled in the background."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            job = SettlementReconciliationService.start_reconciliation(request.user, request.FILES.get('file'))
+            return Response(BackgroundJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({'detail': str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
 
 class PaymentProcessView(APIView):
     """Process payment (initialize transaction)."""
@@ -168,17 +144,10 @@ class PaymentCompleteView(APIView):
         except Payment.DoesNotExist:
             return Response({'detail': 'Payment not found'}, status=status.HTTP_404_NOT_FOUND)
         
-        payment.status = 'completed'
-        payment.save()
-        
-        # Update invoice
-        invoice = payment.invoice
-        invoice.paid_amount += payment.amount
-        if invoice.paid_amount >= invoice.total_amount:
-            invoice.payment_status = 'paid'
-        else:
-            invoice.payment_status = 'partial'
-        invoice.save()
+        try:
+            payment = PaymentApplicationService.apply_payment(payment)
+        except Exception as e:
+            return Response({'detail': getattr(e, 'detail', str(e))}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
         
         serializer = PaymentSerializer(payment)
         return Response(serializer.data)
@@ -0,0 +1,46 @@
+"""
+Raise low-stock alerts for every business (or one owner) in a single pass.
+Run periodically via cron / scheduled task instead of waiting for a user to POST check-alerts.
+
+Usage:
+    python manage.py generate_stock_alerts
+    python manage.py generate_stock_alerts --owner-id 12
+
+Cron (every 15 minutes):
+    */15 * * * * python manage.py generate_stock_alerts >> logs/stock_alerts.log 2>&1
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.product.models import LowStockCounter
+from apps.product.services import StockAlertService
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Generate deduplicated low-stock alerts and supplier notifications"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner-id', type=int, help='Only process products of this owner')
+
+    def handle(self, *args, **options):
+        owner = None
+        if options.get('owner_id'):
+            try:
+                owner = User.objects.get(pk=options['owner_id'])
+            except User.DoesNotExist:
+                raise CommandError(f"Owner {options['owner_id']} not found")
+
+        result = StockAlertService.generate_alerts(owner=owner)
+        # Re-sync maintained counters in case products changed outside the stock paths.
+        if owner:
+            LowStockCounter.recount(owner.id)
+        else:
+            LowStockCounter.recount_all()
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"✓ {result['alerts_generated']} alerts raised, "
+                f"{result['supplier_notifications']} supplier notifications logged "
+                f"({len(result['products'])} products below reorder level)"
+            )
+        )
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:35
+
+from django.db import migrations, models
+from django.db.models import DecimalField, ExpressionWrapper, F, OuterRef, Subquery
+
+
+def cost_existing_sales(apps, schema_editor):
+    # Batch movements take their batch's cost, loose ones the product cost price;
+    # invoice sales take the net per-unit price from the matching invoice line.
+    InventoryMovement = apps.get_model('product', 'InventoryMovement')
+    InventoryBatch = apps.get_model('product', 'InventoryBatch')
+    Product = apps.get_model('product', 'Product')
+    InvoiceItem = apps.get_model('billing', 'InvoiceItem')
+
+    InventoryMovement.objects.filter(batch__isnull=False).update(
+        unit_cost=Subquery(InventoryBatch.objects.filter(pk=OuterRef('batch_id')).values('unit_cost')[:1])
+    )
+    InventoryMovement.objects.filter(batch__isnull=True, change_type='sale').update(
+        unit_cost=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1])
+    )
+    net_unit_price = ExpressionWrapper(
+        (F('line_total') - F('tax_amount')) / F('quantity'), output_field=DecimalField(max_digits=12, decimal_places=4)
+    )
+    InventoryMovement.objects.filter(change_type='sale', reference_type='invoice').update(
+        unit_price=Subquery(
+            InvoiceItem.objects.filter(invoice_id=OuterRef('reference_id'), product_id=OuterRef('product_id'))
+            .annotate(net=net_unit_price).values('net')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('product', '0017_low_stock_counter'),
+        ('billing', '0004_discountrule_owner_alter_discountrule_code_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorymovement',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, help_text='Batch cost of the units moved', max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='inventorymovement',
+            name='unit_price',
+            field=models.DecimalField(blank=True, decimal_places=4, help_text='Net selling price per unit, excluding tax', max_digits=12, null=True),
+        ),
+        migrations.RunPython(cost_existing_sales, migrations.RunPython.noop),
+    ]
@@ -116,16 +116,30 @@ class Product(models.Model):
         """Get total inventory value (stock * unit_price)."""
         return self.stock * self.unit_price
 
-    def deduct_stock(self, quantity, reference_id=None, reference_type='sale', user=None):
+    def deduct_stock(self, quantity, reference_id=None, reference_type='sale', user=None, unit_price=None):
         """
         Deduct stock from product, prioritizing batches if they exist.
+
+        Each sale movement records the cost of the batch it consumed (FIFO by
+        expiry and receipt; loose stock is costed at `cost_price`) and, when
+        given, the net selling `unit_price`, so margins can be read straight
+        off the movement ledger.
         """
         from .models import InventoryMovement  # Avoid circular dependency
         
+        from .signals import detect_threshold_crossing
+
         if quantity <= 0:
             return
 
+        if self.stock < quantity:
+            # Prevent negative stock if strict
+            raise ValidationError(f"Insufficient stock for {self.name}. Available: {self.stock}, Requested: {quantity}. Please update stock or enable negative inventory.")
+
+        old_stock = self.stock
         remaining_to_deduct = quantity
+        user_id = user.id if user else None
+        movements = []
         
         # 1. Try batches first (FIFO by expiry and receipt)
         # Filter active batches with stock
@@ -138,43 +152,44 @@ class Product(models.Model):
             deduct_amount = min(batch.remaining_quantity, remaining_to_deduct)
             
             batch.remaining_quantity -= deduct_amount
-            batch.save()
+            batch.save(update_fields=['remaining_quantity', 'updated_at'])
             
-            # Log movement for batch
-            InventoryMovement.objects.create(
+            # Log movement for batch at the cost it was bought for
+            movements.append(InventoryMovement(
                 batch=batch,
                 product=self,
                 change_type='sale',
                 quantity=-deduct_amount,
+                unit_cost=batch.unit_cost,
+                unit_price=unit_price,
                 reference_id=reference_id,
                 reference_type=reference_type,
-                created_by_id=user.id if user else None
-            )
+                created_by_id=user_id
+            ))
             
             remaining_to_deduct -= deduct_amount
             
         # 2. Update total stock
         # We decrement the global stock counter regardless of batches
         # This assumes total stock is always the sum of batches + loose stock
-        if self.stock >= quantity:
-             self.stock -= quantity
-        else:
-             # Prevent negative stock if strict
-             raise ValidationError(f"Insufficient stock for {self.name}. Available: {self.stock}, Requested: {quantity}. Please update stock or enable negative inventory.")
-             
+        self.stock -= quantity
         self.save()
+        detect_threshold_crossing(self, old_stock)
         
         # 3. Log General Movement for any remainder (loose stock deduction)
         if remaining_to_deduct > 0:
-             InventoryMovement.objects.create(
+            movements.append(InventoryMovement(
                 batch=None,
                 product=self,
                 change_type='sale',
                 quantity=-remaining_to_deduct, 
+                unit_cost=self.cost_price or 0,
+                unit_price=unit_price,
                 reference_id=reference_id,
                 reference_type=reference_type,
-                created_by_id=user.id if user else None
-            )
+                created_by_id=user_id
+            ))
+        InventoryMovement.objects.bulk_create(movements)
 
 class InventoryBatch(models.Model):
     """Track inventory batches with supplier reference and expiry tracking."""
@@ -236,6 +251,8 @@ class InventoryMovement(models.Model):
     
     change_type = models.CharField(max_length=20, choices=MOVEMENT_TYPES)
     quantity = models.IntegerField()  # positive for in, negative for out
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True, help_text="Batch cost of the units moved")
+    unit_price = models.DecimalField(max_digits=12, decimal_places=4, blank=True, null=True, help_text="Net selling price per unit, excluding tax")
     
     reference_id = models.IntegerField(blank=True, null=True)  # Invoice ID, PurchaseOrder ID, etc.
     reference_type = models.CharField(max_length=50, blank=True)  # 'invoice', 'purchase', 'adjustment'
@@ -255,3 +272,99 @@ class InventoryMovement(models.Model):
 
     def __str__(self):
         return f"{self.get_change_type_display()} - {self.product.product_code} ({self.quantity})"
+
+class StockAlert(models.Model):
+    """
+    One raised low-stock alert. The (product, alert_type, alert_date) key dedupes
+    alert runs so a product is notified at most once per type per day.
+    """
+    ALERT_TYPES = [
+        ('low_stock', 'Low Stock'),
+        ('out_of_stock', 'Out of Stock'),
+    ]
+
+    owner = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="stock_alerts")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="stock_alerts")
+    alert_type = models.CharField(max_length=20, choices=ALERT_TYPES)
+    alert_date = models.DateField(default=timezone.localdate)
+
+    stock_level = models.IntegerField()
+    reorder_level = models.IntegerField()
+    supplier_notified = models.BooleanField(default=False)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            Index(fields=["owner", "alert_date"]),
+        ]
+        constraints = [
+            UniqueConstraint(fields=["product", "alert_type", "alert_date"], name="unique_stock_alert_per_day"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_alert_type_display()} - {self.product_id} ({self.alert_date})"
+
+class LowStockCounter(models.Model):
+    """
+    Maintained per-owner count of active products at or below their reorder level.
+    Adjusted incrementally by threshold-crossing events so dashboards avoid scanning products.
+    """
+    owner = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="low_stock_counter")
+    low_stock_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Low stock: {self.low_stock_count} (owner {self.owner_id})"
+
+    @staticmethod
+    def _low_stock_queryset(owner_id=None):
+        queryset = Product.objects.filter(is_active=True, stock__lte=models.F('reorder_level'))
+        if owner_id:
+            queryset = queryset.filter(owner_id=owner_id)
+        return queryset
+
+    @classmethod
+    def recount(cls, owner_id):
+        """Recompute the counter from the products table (self-healing)."""
+        count = cls._low_stock_queryset(owner_id).count()
+        cls.objects.update_or_create(owner_id=owner_id, defaults={'low_stock_count': count})
+        return count
+
+    @classmethod
+    def recount_all(cls):
+        """Rebuild every owner's counter with one grouped query."""
+        counts = dict(
+            cls._low_stock_queryset().filter(owner__isnull=False)
+            .values('owner_id').annotate(total=models.Count('id')).values_list('owner_id', 'total')
+        )
+        counters = list(cls.objects.all())
+        for counter in counters:
+            counter.low_stock_count = counts.pop(counter.owner_id, 0)
+        cls.objects.bulk_update(counters, ['low_stock_count'])
+        cls.objects.bulk_create(
+            [cls(owner_id=owner_id, low_stock_count=total) for owner_id, total in counts.items()],
+            ignore_conflicts=True
+        )
+
+    @classmethod
+    def adjust(cls, owner_id, delta):
+        if not owner_id:
+            return
+        updated = cls.objects.filter(owner_id=owner_id).update(
+            low_stock_count=models.F('low_stock_count') + delta,
+            updated_at=timezone.now()
+        )
+        if not updated:
+            cls.recount(owner_id)
+
+    @classmethod
+    def count_for(cls, owner=None):
+        """Current low-stock count for an owner; platform-wide counts fall back to a query."""
+        if owner is None:
+            return cls._low_stock_queryset().count()
+        count = cls.objects.filter(owner=owner).values_list('low_stock_count', flat=True).first()
+        if count is None:
+            count = cls.recount(owner.id)
+        return max(count, 0)
@@ -31,6 +31,20 @@ class ProductRepository:
             )
         return queryset
 
+    @staticmethod
+    def get_products_by_selector(owner, category_ids=None, hsn_codes=None, supplier_ids=None, product_ids=None):
+        """Products matching every given selector (AND-ed); empty selectors are ignored."""
+        queryset = Product.objects.filter(owner=owner)
+        if category_ids:
+            queryset = queryset.filter(category_id__in=category_ids)
+        if hsn_codes:
+            queryset = queryset.filter(hsn_code__in=hsn_codes)
+        if supplier_ids:
+            queryset = queryset.filter(preferred_supplier_id__in=supplier_ids)
+        if product_ids:
+            queryset = queryset.filter(id__in=product_ids)
+        return queryset
+
 class CategoryRepository:
     @staticmethod
     def get_category_by_id(pk, owner=None):
@@ -99,3 +99,32 @@ class ProductSerializer(serializers.ModelSerializer):
         if value < 0:
             raise serializers.ValidationError("Reorder level cannot be negative")
         return value
+
+class ProductImportRowSerializer(ProductSerializer):
+    """
+    Validates one catalogue import row without per-row database lookups.
+    Category and supplier arrive by name and are resolved per chunk by the import service.
+    """
+    category = serializers.CharField(required=False, allow_blank=True, max_length=100)
+    supplier = serializers.CharField(required=False, allow_blank=True, max_length=200)
+    image_path = serializers.CharField(required=False, allow_blank=True, max_length=500)
+
+    class Meta(ProductSerializer.Meta):
+        fields = [
+            "product_code",
+            "barcode",
+            "name",
+            "description",
+            "hsn_code",
+            "unit",
+            "category",
+            "supplier",
+            "image_path",
+            "cost_price",
+            "unit_price",
+            "tax_rate",
+            "reorder_level",
+            "reorder_quantity",
+            "stock",
+            "is_active",
+        ]
@@ -1,9 +1,24 @@
+import ast
 import logging
+import operator
+import os
+from decimal import Decimal, InvalidOperation
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.files import File
 from django.db import transaction
+from django.db.models import DecimalField, ExpressionWrapper, F, Q, Value
+from django.db.models.functions import NullIf, Round
+from django.utils import timezone
 from rest_framework.exceptions import PermissionDenied, ValidationError
+from .models import Category, Product, LowStockCounter, validate_tax_rate
 from .repositories import ProductRepository, CategoryRepository, InventoryRepository
-from .serializers import ProductSerializer, CategorySerializer
+from .serializers import ProductSerializer, CategorySerializer, ProductImportRowSerializer
 from apps.common.helpers import get_user_owner
+from apps.common.importers import SUPPORTED_EXTENSIONS, chunked, iter_tabular_rows
+from apps.common.jobs import MAX_ERROR_REPORT_ROWS, report_progress, start_background_job
+from apps.common.models import AuditTrail, BackgroundJob
+from apps.subscription import quotas
 from apps.users.utils import has_permission
 
 logger = logging.getLogger(__name__)
@@ -42,7 +57,11 @@ class ProductService:
         owner = get_user_owner(user)
         serializer = ProductSerializer(data=data)
         serializer.is_valid(raise_exception=True)
-        return serializer.save(owner=owner)
+        with transaction.atomic():
+            quotas.reserve(owner, 'products')
+            product = serializer.save(owner=owner)
+        LowStockCounter.recount(product.owner_id)
+        return product
 
     @classmethod
     def get_product(cls, user, pk):
@@ -55,13 +74,16 @@ class ProductService:
         product = cls.get_product(user, pk)
         serializer = ProductSerializer(product, data=data, partial=partial)
         serializer.is_valid(raise_exception=True)
-        return serializer.save()
+        product = serializer.save()
+        LowStockCounter.recount(product.owner_id)
+        return product
 
     @classmethod
     def delete_product(cls, user, pk):
         cls._check_inventory_permission(user)
         product = cls.get_product(user, pk)
         product.delete()
+        LowStockCounter.recount(product.owner_id)
         return True
 
     # Category methods
@@ -98,88 +120,519 @@ class ProductService:
         category.delete()
         return True
 
-class StockAlertService:
+class ProductImportService:
+    """
+    Catalogue import/update from CSV, XLSX, JSON or JSON Lines uploads.
+
+    Per chunk: one lookup each for categories, suppliers and existing products,
+    one bulk insert for missing categories and one upsert on
+    `unique_product_code_per_owner`. Dry-run mode computes the create/update diff
+    without writing anything.
+    """
+    JOB_TYPE = 'product_import'
+    IMAGE_JOB_TYPE = 'product_image_import'
+    CHUNK_SIZE = 1000
+    # Columns that overwrite existing products. Stock is only set on creation;
+    # later changes must go through inventory movements.
+    UPDATE_FIELDS = [
+        'barcode', 'name', 'description', 'hsn_code', 'unit', 'category', 'preferred_supplier',
+        'cost_price', 'unit_price', 'tax_rate', 'reorder_level', 'reorder_quantity', 'is_active'
+    ]
+
     @classmethod
-    def check_low_stock(cls, user):
-        from apps.common.models import AppNotification, CompanyProfile
-        from apps.purchase.models import SupplierNotificationLog
-        from django.utils import timezone
-        
+    def start_import(cls, user, uploaded_file, dry_run=False, fetch_images=False):
+        ProductService._check_inventory_permission(user)
         owner = get_user_owner(user)
-        low_stock_products = InventoryRepository.get_low_stock_products(owner=owner)
-        
+        if owner is None:
+            raise ValidationError("Product import must be run from a business account.")
+        if not uploaded_file:
+            raise ValidationError("No file uploaded. Send the catalogue as 'file'.")
+        extension = os.path.splitext(uploaded_file.name)[1].lower()
+        if extension not in SUPPORTED_EXTENSIONS:
+            raise ValidationError(f"Unsupported file type '{extension}'. Allowed: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+        job = BackgroundJob(
+            job_type=cls.JOB_TYPE,
+            owner=owner,
+            created_by=user,
+            options={'file_name': uploaded_file.name, 'dry_run': dry_run, 'fetch_images': fetch_images}
+        )
+        job.source_file.save(uploaded_file.name, uploaded_file, save=False)
+        job.save()
+        return start_background_job(job, cls.run_import)
+
+    @classmethod
+    def run_import(cls, job):
+        """Job handler: read the stored upload and import it."""
+        file_name = job.options.get('file_name') or job.source_file.name
+        with job.source_file.open('rb') as fileobj:
+            return cls.import_rows(job, iter_tabular_rows(fileobj, file_name))
+
+    @classmethod
+    def import_rows(cls, job, rows):
+        """Validate and upsert `(row_number, dict)` catalogue rows for `job.owner`."""
+        dry_run = job.options.get('dry_run', False)
+        processed = success = failed = 0
+        summary = {'created': 0, 'updated': 0, 'unchanged': 0, 'categories_created': 0}
+        diff = []
+        images = {}
+
+        for chunk in chunked(rows, cls.CHUNK_SIZE):
+            valid_rows, errors = cls._validate_chunk(chunk)
+            errors.extend(cls._resolve_relations(job.owner, valid_rows, dry_run, summary))
+
+            existing = {
+                product['product_code']: product
+                for product in Product.objects.filter(
+                    owner=job.owner, product_code__in=list(valid_rows)
+                ).values('product_code', *cls._value_keys())
+            }
+            if not dry_run:
+                errors.extend(cls._apply_quota(job.owner, valid_rows, existing))
+            chunk_diff = cls._diff_chunk(valid_rows, existing, summary)
+            if dry_run:
+                room = MAX_ERROR_REPORT_ROWS - len(diff)
+                diff.extend(chunk_diff[:max(room, 0)])
+            else:
+                cls._upsert_chunk(job.owner, valid_rows, existing)
+                images.update({
+                    code: data['image_path'] for code, data in valid_rows.items() if data.get('image_path')
+                })
+
+            processed += len(chunk)
+            failed += len(errors)
+            success += len(chunk) - len(errors)
+            report_progress(job, processed, success, failed, errors)
+
+        job.total_rows = processed
+        summary.update({'dry_run': dry_run, 'failed': failed})
+        if dry_run:
+            summary['diff'] = diff
+        elif images and job.options.get('fetch_images'):
+            image_job = BackgroundJob.objects.create(
+                job_type=cls.IMAGE_JOB_TYPE,
+                owner=job.owner,
+                created_by=job.created_by,
+                options={'images': images, 'parent_job': job.pk}
+            )
+            start_background_job(image_job, cls.run_image_import)
+            summary['image_job'] = image_job.pk
+        return summary
+
+    @classmethod
+    def _value_keys(cls):
+        return [f + '_id' if f in ('category', 'preferred_supplier') else f for f in cls.UPDATE_FIELDS]
+
+    @classmethod
+    def _validate_chunk(cls, chunk):
+        valid_rows = {}
+        errors = []
+        for row_number, row in chunk:
+            data = {key: value for key, value in row.items() if value != ''}
+            serializer = ProductImportRowSerializer(data=data)
+            if serializer.is_valid():
+                values = dict(serializer.validated_data)
+                values['_row'] = row_number
+                valid_rows[values['product_code']] = values
+            else:
+                errors.append({'row': row_number, 'errors': serializer.errors})
+        return valid_rows, errors
+
+    @classmethod
+    def _resolve_relations(cls, owner, valid_rows, dry_run, summary):
+        """Swap category/supplier names for ids in place; returns row errors."""
+        from apps.purchase.models import Supplier
+
+        category_names = {data['category'].strip() for data in valid_rows.values() if data.get('category')}
+        categories = dict(Category.objects.filter(owner=owner, name__in=category_names).values_list('name', 'id'))
+        missing = category_names - set(categories)
+        if missing:
+            summary['categories_created'] += len(missing)
+            if not dry_run:
+                Category.objects.bulk_create(
+                    [Category(name=name, owner=owner) for name in missing], ignore_conflicts=True
+                )
+                categories.update(Category.objects.filter(owner=owner, name__in=missing).values_list('name', 'id'))
+
+        supplier_names = {data['supplier'].strip() for data in valid_rows.values() if data.get('supplier')}
+        suppliers = {}
+        for supplier_id, name in Supplier.objects.filter(owner=owner, name__in=supplier_names).values_list('id', 'name').order_by('-id'):
+            suppliers[name] = supplier_id
+
+        errors = []
+        for code, data in list(valid_rows.items()):
+            # Only columns present in the row are applied; absent ones keep stored values.
+            if 'category' in data:
+                category_name = (data.pop('category') or '').strip()
+                data['category_id'] = categories.get(category_name) if category_name else None
+            if 'supplier' in data:
+                supplier_name = (data.pop('supplier') or '').strip()
+                if supplier_name and supplier_name not in suppliers:
+                    errors.append({'row': data['_row'], 'errors': {'supplier': [f"Unknown supplier '{supplier_name}'"]}})
+                    del valid_rows[code]
+                    continue
+                data['preferred_supplier_id'] = suppliers.get(supplier_name)
+        return errors
+
+    @staticmethod
+    def _apply_quota(owner, valid_rows, existing):
+        """Reserve quota for the chunk's new products; rows past the plan limit become row errors."""
+        new_codes = [code for code in valid_rows if code not in existing]
+        granted = quotas.reserve_many(owner, 'products', len(new_codes))
+        errors = []
+        for code in new_codes[granted:]:
+            errors.append({'row': valid_rows.pop(code)['_row'], 'errors': {
+                'detail': [quotas.limit_message('products', quotas.entitlements(owner)['products'])]
+            }})
+        return errors
+
+    @classmethod
+    def _diff_chunk(cls, valid_rows, existing, summary):
+        diff = []
+        for code, data in valid_rows.items():
+            current = existing.get(code)
+            if current is None:
+                summary['created'] += 1
+                diff.append({'row': data['_row'], 'product_code': code, 'action': 'create'})
+                continue
+            changes = {}
+            for key in cls._value_keys():
+                if key not in data:
+                    continue
+                old, new = current[key], data[key]
+                if isinstance(old, Decimal) or isinstance(new, Decimal):
+                    old = None if old is None else str(old)
+                    new = None if new is None else str(new)
+                if old != new:
+                    changes[key] = [old, new]
+            summary['updated' if changes else 'unchanged'] += 1
+            diff.append({'row': data['_row'], 'product_code': code, 'action': 'update' if changes else 'none', 'changes': changes})
+        return diff
+
+    @classmethod
+    def _upsert_chunk(cls, owner, valid_rows, existing):
+        if not valid_rows:
+            return
+        model_fields = {f.attname for f in Product._meta.concrete_fields}
+        update_fields = {
+            field for data in valid_rows.values() for field in cls.UPDATE_FIELDS
+            if field in data or field + '_id' in data
+        }
+        update_keys = [key for field, key in zip(cls.UPDATE_FIELDS, cls._value_keys()) if field in update_fields]
+
+        products = []
+        for code, data in valid_rows.items():
+            current = existing.get(code)
+            # Keep stored values for columns this row left out; the update covers the whole chunk's columns.
+            values = {key: current[key] for key in update_keys} if current else {}
+            values.update((key, value) for key, value in data.items() if key in model_fields)
+            products.append(Product(owner=owner, **values))
+        with transaction.atomic():
+            Product.objects.bulk_create(
+                products,
+                batch_size=cls.CHUNK_SIZE,
+                update_conflicts=True,
+                unique_fields=['product_code', 'owner'],
+                update_fields=sorted(update_fields) + ['updated_at'],
+            )
+        LowStockCounter.recount(owner.id)
+
+    @classmethod
+    def run_image_import(cls, job):
+        """Job handler: attach local image files to imported products."""
+        image_root = os.path.realpath(settings.PRODUCT_IMPORT_IMAGE_ROOT)
+        images = job.options.get('images', {})
+        job.total_rows = len(images)
+        processed = success = failed = 0
+
+        for chunk in chunked(images.items(), 200):
+            paths = dict(chunk)
+            products = list(Product.objects.filter(owner=job.owner, product_code__in=list(paths)))
+            errors = []
+            updated = []
+            for product in products:
+                path = os.path.realpath(os.path.join(image_root, paths[product.product_code]))
+                if not path.startswith(image_root + os.sep) or not os.path.isfile(path):
+                    errors.append({'row': product.product_code, 'errors': {'image_path': ['File not found in import directory']}})
+                    continue
+                with open(path, 'rb') as fh:
+                    product.image.save(os.path.basename(path), File(fh), save=False)
+                updated.append(product)
+            if updated:
+                Product.objects.bulk_update(updated, ['image'])
+
+            processed += len(paths)
+            success += len(updated)
+            failed += len(paths) - len(updated)
+            report_progress(job, processed, success, failed, errors)
+        return {'images_attached': success, 'failed': failed}
+
+class ProductPricingService:
+    """
+    Bulk price/tax revisions applied with a single set-based UPDATE.
+
+    Payload:
+        selector: {category_ids, hsn_codes, supplier_ids, product_ids} (AND-ed) or {"all": true}
+        changes:  {field: {"mode": "set" | "percent" | "delta" | "expression", "value": ...}}
+    Expressions may reference unit_price, cost_price and tax_rate, e.g. "cost_price * 1.25".
+    """
+    PRICE_FIELDS = ('unit_price', 'cost_price', 'tax_rate')
+    MODES = ('set', 'percent', 'delta', 'expression')
+    PREVIEW_LIMIT = 20
+    # unit_price and cost_price are DecimalField(max_digits=10, decimal_places=2)
+    PRICE_LIMIT = Decimal('100000000')
+    _OPERATORS = {
+        ast.Add: operator.add,
+        ast.Sub: operator.sub,
+        ast.Mult: operator.mul,
+        ast.Div: operator.truediv,
+    }
+
+    @staticmethod
+    def _to_decimal(value, field):
         try:
-            profile = CompanyProfile.objects.get(owner=owner)
-            company_name = profile.company_name
-        except CompanyProfile.DoesNotExist:
-            company_name = "Our Company"
+            return Decimal(str(value))
+        except (InvalidOperation, TypeError):
+            raise ValidationError({field: f"'{value}' is not a valid number."})
 
-        alerts_generated = 0
-        notifications_sent = 0
-        alert_items = []
+    @classmethod
+    def _compile_expression(cls, source, field):
+        """Translate a restricted arithmetic expression into a database expression."""
+        def build(node):
+            if isinstance(node, ast.BinOp) and type(node.op) in cls._OPERATORS:
+                right = build(node.right)
+                if isinstance(node.op, ast.Div):
+                    # A zero divisor gives NULL, reported as a missing price instead of a database error
+                    right = NullIf(right, Value(Decimal('0')))
+                return cls._OPERATORS[type(node.op)](build(node.left), right)
+            if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+                return Value(Decimal('0')) - build(node.operand)
+            if isinstance(node, ast.Constant) and type(node.value) in (int, float):
+                return Value(Decimal(str(node.value)))
+            if isinstance(node, ast.Name) and node.id in cls.PRICE_FIELDS:
+                return F(node.id)
+            raise ValidationError({field: f"Unsupported expression '{source}'. Use numbers, + - * / and {', '.join(cls.PRICE_FIELDS)}."})
 
-        for product in low_stock_products:
-            notified = False
-            
-            # In-app notification
-            existing_notif = AppNotification.objects.filter(
+        try:
+            tree = ast.parse(str(source), mode='eval')
+        except SyntaxError:
+            raise ValidationError({field: f"Invalid expression '{source}'."})
+        return build(tree.body)
+
+    @classmethod
+    def _build_updates(cls, changes):
+        if not isinstance(changes, dict) or not changes:
+            raise ValidationError({"changes": "Specify at least one of unit_price, cost_price or tax_rate."})
+
+        updates = {}
+        for field, change in changes.items():
+            if field not in cls.PRICE_FIELDS:
+                raise ValidationError({"changes": f"'{field}' cannot be bulk updated."})
+            if not isinstance(change, dict) or change.get('mode') not in cls.MODES:
+                raise ValidationError({field: f"mode must be one of {', '.join(cls.MODES)}."})
+            mode, value = change['mode'], change.get('value')
+
+            if mode == 'set':
+                amount = cls._to_decimal(value, field)
+                if field == 'tax_rate':
+                    try:
+                        validate_tax_rate(amount)
+                    except DjangoValidationError as e:
+                        raise ValidationError({field: e.messages})
+                elif amount < 0:
+                    raise ValidationError({field: "Price cannot be negative."})
+                elif amount >= cls.PRICE_LIMIT:
+                    raise ValidationError({field: f"Price must be below {cls.PRICE_LIMIT}."})
+                updates[field] = Value(amount.quantize(Decimal('0.01')))
+                continue
+
+            if mode == 'percent':
+                expression = F(field) * Value(1 + cls._to_decimal(value, field) / 100)
+            elif mode == 'delta':
+                expression = F(field) + Value(cls._to_decimal(value, field))
+            else:
+                expression = cls._compile_expression(value, field)
+            updates[field] = Round(
+                ExpressionWrapper(expression, output_field=DecimalField(max_digits=14, decimal_places=4)),
+                2,
+            )
+        return updates
+
+    @classmethod
+    def bulk_update_prices(cls, user, data):
+        ProductService._check_inventory_permission(user)
+        owner = get_user_owner(user)
+        if owner is None:
+            raise ValidationError("Bulk price updates must be run from a business account.")
+
+        selector = data.get('selector') or {}
+        if not selector.get('all') and not any(
+            selector.get(key) for key in ('category_ids', 'hsn_codes', 'supplier_ids', 'product_ids')
+        ):
+            raise ValidationError({"selector": "Choose categories, HSN codes, suppliers, products or set 'all': true."})
+        updates = cls._build_updates(data.get('changes'))
+
+        queryset = ProductRepository.get_products_by_selector(
+            owner,
+            category_ids=selector.get('category_ids'),
+            hsn_codes=selector.get('hsn_codes'),
+            supplier_ids=selector.get('supplier_ids'),
+            product_ids=selector.get('product_ids'),
+        )
+
+        # Row-dependent results are checked against validate_tax_rate / the price column range in SQL.
+        annotated = queryset.annotate(**{f'new_{field}': expr for field, expr in updates.items()})
+        violations = Q()
+        for field in updates:
+            # NULL inputs (e.g. a product without a cost price) give NULL, which the column rejects
+            violations |= Q(**{f'new_{field}__lt': 0}) | Q(**{f'new_{field}__isnull': True})
+            if field != 'tax_rate':
+                violations |= Q(**{f'new_{field}__gte': cls.PRICE_LIMIT})
+        if 'tax_rate' in updates:
+            violations |= Q(new_tax_rate__gt=100)
+
+        if data.get('dry_run'):
+            preview = list(annotated.values(
+                'id', 'product_code', 'name', *cls.PRICE_FIELDS, *[f'new_{field}' for field in updates]
+            )[:cls.PREVIEW_LIMIT])
+            return {
+                'dry_run': True,
+                'matched': queryset.count(),
+                'invalid': annotated.filter(violations).count(),
+                'preview': preview,
+            }
+
+        with transaction.atomic():
+            invalid = list(annotated.filter(violations).values_list('product_code', flat=True)[:10])
+            if invalid:
+                raise ValidationError({
+                    "changes": f"Update would produce a missing, negative or out-of-range price or a tax rate outside 0-100 for: {', '.join(invalid)}"
+                })
+            updated = queryset.update(updated_at=timezone.now(), **updates)
+            AuditTrail.objects.create(
+                action_type='update',
+                entity_type='Product',
+                entity_id='bulk',
                 user=user,
-                title="Low Stock Alert",
-                message__contains=product.name,
-                is_read=False
-            ).exists()
-            
-            if not existing_notif:
-                AppNotification.objects.create(
-                    user=user,
-                    title="Low Stock Alert",
+                new_values={'selector': selector, 'changes': data.get('changes'), 'updated': updated},
+                description=f"Bulk price/tax update applied to {updated} products",
+            )
+        logger.info(f"Bulk price update by user {user.id}: {updated} products, fields={sorted(updates)}")
+        return {'dry_run': False, 'updated': updated}
+
+class StockAlertService:
+    """
+    Set-based low-stock alerting.
+
+    One query computes the low-stock set; with those products locked, one keyed
+    lookup on (product_id, alert_type, alert_date) finds alerts already raised
+    today, and notifications, supplier logs and alert rows are written with
+    bulk_create in the same transaction, so overlapping runs never notify twice.
+    """
+    NOTIFICATION_TITLE = "Low Stock Alert"
+
+    @staticmethod
+    def _alert_type(product):
+        return 'out_of_stock' if product.stock <= 0 else 'low_stock'
+
+    @classmethod
+    def generate_alerts(cls, owner=None, product_ids=None):
+        """Raise today's alerts for `owner` (or every tenant when None), optionally limited to `product_ids`."""
+        from apps.common.models import AppNotification, CompanyProfile
+        from apps.purchase.models import SupplierNotificationLog
+        from .models import StockAlert
+
+        today = timezone.localdate()
+        queryset = InventoryRepository.get_low_stock_products(owner=owner).filter(owner__isnull=False)
+        if product_ids is not None:
+            queryset = queryset.filter(id__in=product_ids)
+        low_stock_products = list(queryset)
+        if not low_stock_products:
+            return {'alerts_generated': 0, 'supplier_notifications': 0, 'products': [], 'notified_ids': set()}
+
+        with transaction.atomic():
+            # Lock the candidates first so overlapping runs (cron and POST) queue up and the
+            # later one sees the alerts the earlier one raised instead of notifying again.
+            candidate_ids = list(Product.objects.select_for_update().filter(
+                id__in=[p.id for p in low_stock_products]
+            ).order_by('id').values_list('id', flat=True))
+            existing = set(StockAlert.objects.filter(
+                product_id__in=candidate_ids,
+                alert_date=today
+            ).values_list('product_id', 'alert_type'))
+            alerted_today = {product_id for product_id, _ in existing}
+
+            new_products = [p for p in low_stock_products if (p.id, cls._alert_type(p)) not in existing]
+            company_names = dict(CompanyProfile.objects.filter(
+                owner_id__in={p.owner_id for p in new_products}
+            ).values_list('owner_id', 'company_name'))
+
+            notifications = []
+            supplier_logs = []
+            alerts = []
+            for product in new_products:
+                notifications.append(AppNotification(
+                    user_id=product.owner_id,
+                    title=cls.NOTIFICATION_TITLE,
                     message=f"Product '{product.name}' is low on stock (Current: {product.stock}, Reorder Level: {product.reorder_level}).",
-                    related_link=f"/inventory?status=Low%20Stock"
-                )
-                alerts_generated += 1
-            
-            # Supplier notification
-            if product.preferred_supplier:
-                today = timezone.now().date()
-                already_sent = SupplierNotificationLog.objects.filter(
-                    supplier=product.preferred_supplier,
-                    product=product,
-                    created_at__date=today
-                ).exists()
-                
-                if not already_sent:
+                    related_link="/inventory?status=Low%20Stock"
+                ))
+                # Suppliers get one request per product per day, even if the alert type escalates.
+                notify_supplier = product.preferred_supplier_id is not None and product.id not in alerted_today
+                if notify_supplier:
                     supplier = product.preferred_supplier
-                    message = f"Hello {supplier.name}, We need {product.reorder_quantity} units of {product.name}. Current stock is low ({product.stock}). – {company_name}"
-                    
-                    SupplierNotificationLog.objects.create(
+                    company_name = company_names.get(product.owner_id) or "Our Company"
+                    supplier_logs.append(SupplierNotificationLog(
                         supplier=supplier,
                         product=product,
                         notification_type='low_stock_auto',
                         sent_via='simulated',
                         status='success',
-                        message_content=message
-                    )
-                    notifications_sent += 1
-                    notified = True
-                else:
-                    notified = True
-
-            stock_status = "🔴 Out of Stock" if product.stock == 0 else "🟡 Low Stock"
-            supplier_name = product.preferred_supplier.name if product.preferred_supplier else "⚠️ No Supplier Assigned"
-            
+                        message_content=f"Hello {supplier.name}, We need {product.reorder_quantity} units of {product.name}. Current stock is low ({product.stock}). – {company_name}"
+                    ))
+                alerts.append(StockAlert(
+                    owner_id=product.owner_id,
+                    product=product,
+                    alert_type=cls._alert_type(product),
+                    alert_date=today,
+                    stock_level=product.stock,
+                    reorder_level=product.reorder_level,
+                    supplier_notified=notify_supplier,
+                ))
+
+            StockAlert.objects.bulk_create(alerts)
+            AppNotification.objects.bulk_create(notifications)
+            SupplierNotificationLog.objects.bulk_create(supplier_logs)
+
+        logger.info(f"Stock alerts: {len(alerts)} raised, {len(supplier_logs)} supplier notifications")
+        return {
+            'alerts_generated': len(notifications),
+            'supplier_notifications': len(supplier_logs),
+            'products': low_stock_products,
+            'notified_ids': alerted_today | {log.product_id for log in supplier_logs},
+        }
+
+    @classmethod
+    def check_low_stock(cls, user):
+        owner = get_user_owner(user)
+        result = cls.generate_alerts(owner=owner)
+
+        alert_items = []
+        for product in result['products']:
+            supplier = product.preferred_supplier
             alert_items.append({
                 'id': product.id,
                 'name': product.name,
                 'stock': product.stock,
                 'reorder_level': product.reorder_level,
-                'stock_status': stock_status,
-                'supplier_id': product.preferred_supplier.id if product.preferred_supplier else None,
-                'preferred_supplier': supplier_name,
-                'notified': notified
+                'stock_status': "🔴 Out of Stock" if product.stock == 0 else "🟡 Low Stock",
+                'supplier_id': supplier.id if supplier else None,
+                'preferred_supplier': supplier.name if supplier else "⚠️ No Supplier Assigned",
+                'notified': bool(supplier) and product.id in result['notified_ids']
             })
-                    
+
         return {
-            'alerts_generated': alerts_generated,
-            'supplier_notifications': notifications_sent,
+            'alerts_generated': result['alerts_generated'],
+            'supplier_notifications': result['supplier_notifications'],
             'alert_items': alert_items
         }
@@ -0,0 +1,45 @@
+"""
+In-process stock events.
+
+`stock_threshold_crossed` fires only when a product's stock moves across its
+reorder level, not on every stock change:
+    direction='below' - stock fell to or under reorder_level
+    direction='above' - stock recovered above reorder_level
+"""
+from django.dispatch import Signal, receiver
+from apps.common.jobs import run_after_commit
+
+stock_threshold_crossed = Signal()  # sender=Product, product, old_stock, new_stock, direction
+
+
+def detect_threshold_crossing(product, old_stock):
+    """Compare the previous stock with the product's current stock and emit on crossing."""
+    if not product.is_active or old_stock == product.stock:
+        return None
+    was_low = old_stock <= product.reorder_level
+    is_low = product.stock <= product.reorder_level
+    if was_low == is_low:
+        return None
+    direction = 'below' if is_low else 'above'
+    stock_threshold_crossed.send(
+        sender=product.__class__,
+        product=product,
+        old_stock=old_stock,
+        new_stock=product.stock,
+        direction=direction,
+    )
+    return direction
+
+
+@receiver(stock_threshold_crossed)
+def update_low_stock_counter(sender, product, direction, **kwargs):
+    from .models import LowStockCounter
+    LowStockCounter.adjust(product.owner_id, 1 if direction == 'below' else -1)
+
+
+@receiver(stock_threshold_crossed)
+def queue_low_stock_notification(sender, product, direction, **kwargs):
+    if direction != 'below' or not product.owner_id:
+        return
+    from .services import StockAlertService
+    run_after_commit(StockAlertService.generate_alerts, product_ids=[product.id])
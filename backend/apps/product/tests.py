@@ -293,3 +293,266 @@ class ProductSerializerTests(TestCase):
         self.assertFalse(serializer.is_valid())
         self.assertIn('unit_price', serializer.errors)
 
+
+class ProductImportServiceTests(TestCase):
+    """Test bulk catalogue import with category/supplier resolution."""
+
+    def setUp(self):
+        from apps.common.models import BackgroundJob
+        from apps.purchase.models import Supplier
+        self.owner = User.objects.create_user(phone='9000000002', password='test123')
+        self.supplier = Supplier.objects.create(owner=self.owner, name='Acme Traders', code='ACME')
+        self.product = Product.objects.create(
+            product_code="SKU-1", name="Old Name", unit_price=Decimal("10.00"),
+            tax_rate=Decimal("5.00"), stock=7, owner=self.owner
+        )
+        self.job = BackgroundJob.objects.create(job_type='product_import', owner=self.owner)
+
+    def _rows(self, payload):
+        import io
+        from apps.common.importers import iter_tabular_rows
+        return iter_tabular_rows(io.BytesIO(json.dumps(payload).encode('utf-8')), 'catalogue.json')
+
+    def _payload(self):
+        return [
+            {"product_code": "SKU-1", "name": "New Name", "unit_price": "12.50", "tax_rate": "5", "stock": 99, "category": "Snacks"},
+            {"product_code": "SKU-2", "name": "Chips", "unit_price": "20", "tax_rate": "12", "stock": 40,
+             "category": "Snacks", "supplier": "Acme Traders"},
+            {"product_code": "SKU-3", "name": "Bad", "unit_price": "5", "tax_rate": "150"},
+        ]
+
+    def test_import_upserts_and_creates_categories(self):
+        """Test products upsert on code, missing categories are created, stock kept on update."""
+        from apps.product.services import ProductImportService
+        result = ProductImportService.import_rows(self.job, self._rows(self._payload()))
+
+        self.assertEqual(result['created'], 1)
+        self.assertEqual(result['updated'], 1)
+        self.assertEqual(result['failed'], 1)
+        self.assertEqual(Category.objects.filter(owner=self.owner, name="Snacks").count(), 1)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "New Name")
+        self.assertEqual(self.product.unit_price, Decimal("12.50"))
+        self.assertEqual(self.product.stock, 7)
+        chips = Product.objects.get(owner=self.owner, product_code="SKU-2")
+        self.assertEqual(chips.stock, 40)
+        self.assertEqual(chips.preferred_supplier, self.supplier)
+        self.assertEqual(chips.category.name, "Snacks")
+
+    def test_update_keeps_columns_its_row_leaves_out(self):
+        """Test a row without a column keeps the stored value even when another row in the chunk sets it."""
+        from apps.product.services import ProductImportService
+        drinks = Category.objects.create(name="Drinks", owner=self.owner)
+        Product.objects.filter(pk=self.product.pk).update(
+            description="fizzy", category=drinks, hsn_code="2202", is_active=False, reorder_level=5
+        )
+        result = ProductImportService.import_rows(self.job, self._rows([
+            {"product_code": "SKU-1", "name": "Renamed", "unit_price": "10", "tax_rate": "5"},
+            {"product_code": "SKU-4", "name": "Juice", "unit_price": "30", "tax_rate": "12", "description": "fresh",
+             "category": "Snacks", "hsn_code": "2009", "is_active": True, "reorder_level": 3},
+        ]))
+
+        self.assertEqual((result['created'], result['updated'], result['failed']), (1, 1, 0))
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.name, "Renamed")
+        self.assertEqual(
+            (self.product.description, self.product.category_id, self.product.hsn_code,
+             self.product.is_active, self.product.reorder_level),
+            ("fizzy", drinks.id, "2202", False, 5),
+        )
+        juice = Product.objects.get(owner=self.owner, product_code="SKU-4")
+        self.assertEqual((juice.description, juice.hsn_code, juice.reorder_level), ("fresh", "2009", 3))
+
+    def test_dry_run_reports_diff_without_writing(self):
+        """Test dry-run mode returns a diff and leaves the catalogue untouched."""
+        from apps.product.services import ProductImportService
+        self.job.options = {'dry_run': True}
+        result = ProductImportService.import_rows(self.job, self._rows(self._payload()))
+
+        self.assertTrue(result['dry_run'])
+        update = next(d for d in result['diff'] if d['product_code'] == 'SKU-1')
+        self.assertEqual(update['action'], 'update')
+        self.assertEqual(update['changes']['name'], ['Old Name', 'New Name'])
+        self.assertFalse(Product.objects.filter(product_code="SKU-2").exists())
+        self.assertFalse(Category.objects.filter(name="Snacks").exists())
+
+class ProductPricingServiceTests(TestCase):
+    """Test set-based bulk price and tax updates."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000003', password='test123', is_superuser=True)
+        self.category = Category.objects.create(name="Dairy", owner=self.owner)
+        self.milk = Product.objects.create(
+            product_code="MILK", name="Milk", category=self.category, unit_price=Decimal("50.00"),
+            cost_price=Decimal("40.00"), tax_rate=Decimal("5.00"), owner=self.owner
+        )
+        self.soap = Product.objects.create(
+            product_code="SOAP", name="Soap", unit_price=Decimal("30.00"),
+            cost_price=Decimal("20.00"), tax_rate=Decimal("18.00"), hsn_code="3401", owner=self.owner
+        )
+
+    def test_percent_update_by_category(self):
+        """Test percentage change only touches the selected category."""
+        from apps.product.services import ProductPricingService
+        result = ProductPricingService.bulk_update_prices(self.owner, {
+            'selector': {'category_ids': [self.category.id]},
+            'changes': {'unit_price': {'mode': 'percent', 'value': '10'}},
+        })
+        self.assertEqual(result['updated'], 1)
+        self.milk.refresh_from_db()
+        self.soap.refresh_from_db()
+        self.assertEqual(self.milk.unit_price, Decimal("55.00"))
+        self.assertEqual(self.soap.unit_price, Decimal("30.00"))
+
+    def test_expression_and_tax_set_with_audit(self):
+        """Test expression-based price and storewide tax change write one audit entry."""
+        from apps.common.models import AuditTrail
+        from apps.product.services import ProductPricingService
+        ProductPricingService.bulk_update_prices(self.owner, {
+            'selector': {'all': True},
+            'changes': {
+                'unit_price': {'mode': 'expression', 'value': 'cost_price * 1.5'},
+                'tax_rate': {'mode': 'set', 'value': '12'},
+            },
+        })
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.unit_price, Decimal("30.00"))
+        self.assertEqual(self.soap.tax_rate, Decimal("12.00"))
+        self.assertEqual(AuditTrail.objects.filter(entity_type='Product', entity_id='bulk').count(), 1)
+
+    def test_rejects_out_of_range_tax(self):
+        """Test tax results outside 0-100 are rejected without changes."""
+        from rest_framework.exceptions import ValidationError
+        from apps.product.services import ProductPricingService
+        with self.assertRaises(ValidationError):
+            ProductPricingService.bulk_update_prices(self.owner, {
+                'selector': {'hsn_codes': ['3401']},
+                'changes': {'tax_rate': {'mode': 'delta', 'value': '90'}},
+            })
+        with self.assertRaises(ValidationError):
+            ProductPricingService.bulk_update_prices(self.owner, {
+                'selector': {'all': True},
+                'changes': {'unit_price': {'mode': 'expression', 'value': '__import__("os")'}},
+            })
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.tax_rate, Decimal("18.00"))
+
+    def test_rejects_expression_over_missing_cost(self):
+        """Test a product without a cost price is reported instead of failing the UPDATE."""
+        from rest_framework.exceptions import ValidationError
+        from apps.product.services import ProductPricingService
+        Product.objects.filter(pk=self.soap.pk).update(cost_price=None)
+        with self.assertRaises(ValidationError) as raised:
+            ProductPricingService.bulk_update_prices(self.owner, {
+                'selector': {'all': True},
+                'changes': {'unit_price': {'mode': 'expression', 'value': 'cost_price * 1.5'}},
+            })
+        self.assertIn('SOAP', str(raised.exception.detail))
+        self.milk.refresh_from_db()
+        self.assertEqual(self.milk.unit_price, Decimal("50.00"))
+
+    def test_rejects_zero_divisor_and_column_overflow(self):
+        """Test division by a zero column and results too large for the price column are reported, not raised by the DB."""
+        from rest_framework.exceptions import ValidationError
+        from apps.product.services import ProductPricingService
+        Product.objects.filter(pk=self.soap.pk).update(cost_price=0)
+        for expression in ('unit_price / cost_price', 'unit_price * 10000000'):
+            with self.assertRaises(ValidationError) as raised:
+                ProductPricingService.bulk_update_prices(self.owner, {
+                    'selector': {'all': True},
+                    'changes': {'unit_price': {'mode': 'expression', 'value': expression}},
+                })
+            self.assertIn('SOAP', str(raised.exception.detail))
+        self.soap.refresh_from_db()
+        self.assertEqual(self.soap.unit_price, Decimal("30.00"))
+
+class StockAlertServiceTests(TestCase):
+    """Test set-based low-stock alert generation and daily dedup."""
+
+    def setUp(self):
+        from apps.purchase.models import Supplier
+        self.owner = User.objects.create_user(phone='9000000004', password='test123')
+        self.supplier = Supplier.objects.create(owner=self.owner, name='Fresh Farms', code='FF')
+        self.low = Product.objects.create(
+            product_code="LOW", name="Butter", unit_price=Decimal("10.00"), tax_rate=Decimal("5.00"),
+            stock=2, reorder_level=5, preferred_supplier=self.supplier, owner=self.owner
+        )
+        self.out = Product.objects.create(
+            product_code="OUT", name="Cheese", unit_price=Decimal("10.00"), tax_rate=Decimal("5.00"),
+            stock=0, reorder_level=5, owner=self.owner
+        )
+        Product.objects.create(
+            product_code="OK", name="Bread", unit_price=Decimal("10.00"), tax_rate=Decimal("5.00"),
+            stock=50, reorder_level=5, owner=self.owner
+        )
+
+    def test_generate_alerts_is_deduplicated_per_day(self):
+        """Test a second run on the same day raises nothing new."""
+        from apps.common.models import AppNotification
+        from apps.purchase.models import SupplierNotificationLog
+        from apps.product.models import StockAlert
+        from apps.product.services import StockAlertService
+
+        first = StockAlertService.generate_alerts(owner=self.owner)
+        self.assertEqual(first['alerts_generated'], 2)
+        self.assertEqual(first['supplier_notifications'], 1)
+        self.assertEqual(StockAlert.objects.get(product=self.out).alert_type, 'out_of_stock')
+
+        second = StockAlertService.generate_alerts(owner=self.owner)
+        self.assertEqual(second['alerts_generated'], 0)
+        self.assertEqual(second['supplier_notifications'], 0)
+        self.assertEqual(AppNotification.objects.filter(user=self.owner).count(), 2)
+        self.assertEqual(SupplierNotificationLog.objects.count(), 1)
+
+    def test_check_low_stock_response_shape(self):
+        """Test the on-demand check keeps its alert item payload."""
+        from apps.product.services import StockAlertService
+        result = StockAlertService.check_low_stock(self.owner)
+        items = {item['id']: item for item in result['alert_items']}
+        self.assertEqual(set(items), {self.low.id, self.out.id})
+        self.assertTrue(items[self.low.id]['notified'])
+        self.assertFalse(items[self.out.id]['notified'])
+
+class StockThresholdCrossingTests(TestCase):
+    """Test threshold-crossing events and the maintained low-stock counter."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000005', password='test123')
+        self.product = Product.objects.create(
+            product_code="EGG", name="Eggs", unit_price=Decimal("6.00"), tax_rate=Decimal("0.00"),
+            stock=12, reorder_level=10, owner=self.owner
+        )
+        self.events = []
+        from apps.product.signals import stock_threshold_crossed
+        stock_threshold_crossed.connect(self._record, dispatch_uid='test-threshold')
+        self.addCleanup(stock_threshold_crossed.disconnect, dispatch_uid='test-threshold')
+
+    def _record(self, sender, product, direction, **kwargs):
+        self.events.append((product.id, direction))
+
+    def test_event_fires_only_on_crossing(self):
+        """Test deduct_stock emits once when stock falls under reorder level."""
+        from apps.product.models import LowStockCounter
+        self.assertEqual(LowStockCounter.count_for(self.owner), 0)
+
+        self.product.deduct_stock(1)   # 12 -> 11, still above
+        self.assertEqual(self.events, [])
+        self.product.deduct_stock(2)   # 11 -> 9, crosses
+        self.product.deduct_stock(1)   # 9 -> 8, already low
+        self.assertEqual(self.events, [(self.product.id, 'below')])
+        self.assertEqual(LowStockCounter.count_for(self.owner), 1)
+
+    def test_recovery_decrements_counter(self):
+        """Test stock recovering above reorder level emits 'above' and decrements."""
+        from apps.product.models import LowStockCounter
+        from apps.product.signals import detect_threshold_crossing
+        self.product.deduct_stock(5)
+        self.assertEqual(LowStockCounter.count_for(self.owner), 1)
+
+        old_stock = self.product.stock
+        self.product.stock = 30
+        self.product.save()
+        detect_threshold_crossing(self.product, old_stock)
+        self.assertEqual(self.events[-1], (self.product.id, 'above'))
+        self.assertEqual(LowStockCounter.count_for(self.owner), 0)
@@ -1,8 +1,10 @@
 from django.urls import path
-from .views import ProductListCreate, ProductRetrieveUpdateDelete, CategoryListCreate, CategoryRetrieveUpdateDelete, CheckStockAlertsView
+from .views import ProductListCreate, ProductRetrieveUpdateDelete, CategoryListCreate, CategoryRetrieveUpdateDelete, CheckStockAlertsView, ProductImportView, ProductBulkPriceUpdateView
 
 urlpatterns = [
     path("products/", ProductListCreate.as_view(), name="product-list-create"),
+    path("products/import/", ProductImportView.as_view(), name="product-import"),
+    path("products/bulk-price-update/", ProductBulkPriceUpdateView.as_view(), name="product-bulk-price-update"),
     path("products/<int:pk>/", ProductRetrieveUpdateDelete.as_view(), name="product-detail"),
     path("categories/", CategoryListCreate.as_view(), name="category-list-create"),
     path("categories/<int:pk>/", CategoryRetrieveUpdateDelete.as_view(), name="category-detail"),
@@ -5,7 +5,8 @@ from rest_framework.pagination import PageNumberPagination
 from rest_framework.parsers import MultiPartParser, FormParser, JSONParser
 from .serializers import ProductSerializer, CategorySerializer
 from apps.auth_app.permissions import IsAuthenticated
-from .services import ProductService, StockAlertService
+from .services import ProductService, StockAlertService, ProductImportService, ProductPricingService
+from apps.common.serializers import BackgroundJobSerializer
 
 class StandardResultsSetPagination(PageNumberPagination):
     page_size = 20
@@ -65,6 +66,35 @@ class ProductRetrieveUpdateDelete(APIView):
         except Exception as e:
             return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
 
+class ProductImportView(APIView):
+    """Controller for catalogue import (CSV/XLSX/JSON upload, processed in the background)."""
+    permission_classes = [IsAuthenticated]
+    parser_classes = [MultiPartParser, FormParser]
+
+    def post(self, request):
+        truthy = ("true", "True", "1")
+        try:
+            job = ProductImportService.start_import(
+                request.user,
+                request.FILES.get("file"),
+                dry_run=request.data.get("dry_run") in truthy,
+                fetch_images=request.data.get("fetch_images") in truthy,
+            )
+            return Response(BackgroundJobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        except Exception as e:
+            return Response({"detail": str(e)}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
+class ProductBulkPriceUpdateView(APIView):
+    """Controller for bulk price/tax revisions."""
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        try:
+            result = ProductPricingService.bulk_update_prices(request.user, request.data)
+            return Response(result, status=status.HTTP_200_OK)
+        except Exception as e:
+            return Response({"detail": getattr(e, 'detail', str(e))}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
 class CategoryListCreate(APIView):
     """Controller for Category List and Create."""
     permission_classes = [IsAuthenticated]
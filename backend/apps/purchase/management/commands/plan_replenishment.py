@@ -0,0 +1,51 @@
+"""
+Propose draft purchase orders from recent sales velocity for every business (or one owner).
+
+Usage:
+    python manage.py plan_replenishment --dry-run
+    python manage.py plan_replenishment --owner-id 12 --lead-time-days 5
+
+Cron (nightly):
+    30 2 * * * python manage.py plan_replenishment >> logs/replenishment.log 2>&1
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.purchase.services import ReplenishmentService
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Generate draft purchase orders for products running low on cover"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner-id', type=int, help='Only plan products of this owner')
+        parser.add_argument('--dry-run', action='store_true', help='Print suggestions without creating POs')
+        for option, default in ReplenishmentService.DEFAULTS.items():
+            parser.add_argument(f"--{option.replace('_', '-')}", type=int, default=default)
+
+    def handle(self, *args, **options):
+        owner = None
+        if options.get('owner_id'):
+            try:
+                owner = User.objects.get(pk=options['owner_id'])
+            except User.DoesNotExist:
+                raise CommandError(f"Owner {options['owner_id']} not found")
+
+        suggestions = ReplenishmentService.plan(
+            owner=owner, options={key: options[key] for key in ReplenishmentService.DEFAULTS}
+        )
+        if options['dry_run']:
+            for suggestion in suggestions:
+                self.stdout.write(
+                    f"{suggestion['product_code']}: order {suggestion['suggested_quantity']} "
+                    f"(stock {suggestion['stock']}, on order {suggestion['on_order']}, "
+                    f"demand {suggestion['daily_demand']}/day)"
+                )
+            self.stdout.write(self.style.SUCCESS(f"✓ {len(suggestions)} products need reordering (dry run)"))
+            return
+
+        orders = ReplenishmentService.create_draft_orders(suggestions)
+        self.stdout.write(
+            self.style.SUCCESS(f"✓ {len(orders)} draft purchase orders created for {len(suggestions)} products")
+        )
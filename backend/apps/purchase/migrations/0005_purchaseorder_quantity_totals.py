@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:09
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_quantity_totals(apps, schema_editor):
+    PurchaseOrder = apps.get_model('purchase', 'PurchaseOrder')
+    PurchaseOrderItem = apps.get_model('purchase', 'PurchaseOrderItem')
+
+    totals = PurchaseOrderItem.objects.values('purchase_order_id').annotate(
+        ordered=Sum('quantity'), received=Sum('received_quantity'),
+    )
+    orders = []
+    for row in totals:
+        ordered = row['ordered'] or 0
+        received = row['received'] or 0
+        completion = round(received * 100 / ordered, 2) if ordered else 0
+        orders.append(PurchaseOrder(
+            id=row['purchase_order_id'],
+            ordered_quantity=ordered,
+            received_quantity=received,
+            completion_percentage=min(completion, 999.99),
+        ))
+    PurchaseOrder.objects.bulk_update(
+        orders, ['ordered_quantity', 'received_quantity', 'completion_percentage'], batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('purchase', '0004_alter_purchaseorder_po_number'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='completion_percentage',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=5),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='ordered_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='purchaseorder',
+            name='received_quantity',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_quantity_totals, migrations.RunPython.noop),
+    ]
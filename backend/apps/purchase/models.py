@@ -84,6 +84,11 @@ class PurchaseOrder(models.Model):
     
     paid_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)])
     
+    # Maintained incrementally from item inserts/updates/deletes and receipts
+    ordered_quantity = models.IntegerField(default=0)
+    received_quantity = models.IntegerField(default=0)
+    completion_percentage = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', db_index=True)
     payment_status = models.CharField(max_length=20, choices=PAYMENT_STATUS_CHOICES, default='pending', db_index=True)
     
@@ -117,19 +122,8 @@ class PurchaseOrder(models.Model):
         return self.total_amount - self.paid_amount
 
     def get_completion_percentage(self):
-        """Calculate order completion (by received quantity)."""
-        if not hasattr(self, '_completion_percentage'):
-            from apps.product.models import InventoryBatch
-            total_ordered = self.items.aggregate(total=models.Sum('quantity'))['total'] or 0
-            total_received = InventoryBatch.objects.filter(
-                reference_purchase_id=self.id
-            ).aggregate(total=models.Sum('received_quantity'))['total'] or 0
-            
-            if total_ordered == 0:
-                self._completion_percentage = 0
-            else:
-                self._completion_percentage = (total_received / total_ordered) * 100
-        return self._completion_percentage
+        """Order completion (by received quantity), read from the stored column."""
+        return float(self.completion_percentage or 0)
 
     def is_overdue(self):
         """Check if order is overdue."""
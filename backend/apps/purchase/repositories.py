@@ -1,5 +1,8 @@
+from decimal import Decimal
 from django.shortcuts import get_object_or_404
-from django.db.models import Prefetch
+from django.db.models import Case, CharField, DecimalField, ExpressionWrapper, F, Prefetch, Q, Value, When
+from django.db.models.functions import Round
+from django.utils import timezone
 from .models import Supplier, PurchaseOrder, PurchaseOrderItem, PurchaseReceiptLog, PaymentRecord
 
 class SupplierRepository:
@@ -54,6 +57,57 @@ class PurchaseOrderRepository:
     def get_po_item_by_id(pk):
         return get_object_or_404(PurchaseOrderItem, pk=pk)
 
+    TOTAL_FIELDS = ['subtotal', 'total_amount', 'ordered_quantity', 'received_quantity', 'completion_percentage']
+
+    @staticmethod
+    def apply_totals_delta(po, subtotal=0, ordered=0, received=0, derive_status=False):
+        """
+        Shift the stored PO totals by the given deltas in one UPDATE built from F()
+        expressions, so concurrent item edits never overwrite each other; the total
+        is recomputed as subtotal + tax + shipping. Completion is
+        recomputed from the shifted quantities in the same statement; with
+        `derive_status` the receipt status is too. Refreshes the changed fields on `po`.
+        """
+        new_ordered = F('ordered_quantity') + Value(ordered)
+        new_received = F('received_quantity') + Value(received)
+        has_ordered = Q(ordered_quantity__gt=-ordered)
+        updates = {
+            'ordered_quantity': new_ordered,
+            'received_quantity': new_received,
+            'completion_percentage': Case(
+                When(
+                    has_ordered,
+                    then=Round(new_received * Value(Decimal('100.00')) / new_ordered, 2),
+                ),
+                default=Value(Decimal('0')),
+                output_field=DecimalField(max_digits=5, decimal_places=2),
+            ),
+            'updated_at': timezone.now(),
+        }
+        fields = list(PurchaseOrderRepository.TOTAL_FIELDS)
+        new_subtotal = F('subtotal') + Value(subtotal)
+        if subtotal:
+            updates['subtotal'] = new_subtotal
+        # Rebuilt from its parts (pre-update values on the right) so tax/shipping edits are never lost
+        updates['total_amount'] = ExpressionWrapper(
+            new_subtotal + F('tax_amount') + F('shipping_cost'), output_field=DecimalField(max_digits=12, decimal_places=2)
+        )
+        if derive_status:
+            # Per-line received <= ordered, so equal totals means every line is complete.
+            updates['status'] = Case(
+                When(
+                    has_ordered & Q(received_quantity__gte=F('ordered_quantity') - Value(received) + Value(ordered)),
+                    then=Value('received'),
+                ),
+                When(Q(received_quantity__gt=-received), then=Value('partially_received')),
+                default=F('status'),
+                output_field=CharField(),
+            )
+            fields.append('status')
+        PurchaseOrder.objects.filter(pk=po.pk).update(**updates)
+        po.refresh_from_db(fields=fields)
+        return po
+
 
 class PurchaseReceiptRepository:
     @staticmethod
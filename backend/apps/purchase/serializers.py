@@ -131,11 +131,13 @@ class PurchaseOrderSerializer(serializers.ModelSerializer):
             'expected_delivery_date', 'subtotal', 'tax_amount', 'shipping_cost',
             'total_amount', 'paid_amount', 'remaining_amount', 'status',
             'payment_status', 'created_by_id', 'approved_by_id', 'approved_at',
-            'notes', 'items', 'completion_percentage', 'created_at', 'updated_at'
+            'notes', 'items', 'ordered_quantity', 'received_quantity', 'completion_percentage',
+            'created_at', 'updated_at'
         ]
         read_only_fields = [
             'id', 'po_number', 'order_date', 'supplier_name', 'items',
-            'remaining_amount', 'completion_percentage', 'created_at', 'updated_at'
+            'remaining_amount', 'ordered_quantity', 'received_quantity', 'completion_percentage',
+            'created_at', 'updated_at'
         ]
 
     def validate_supplier(self, value):
@@ -207,17 +209,41 @@ class PurchaseReceiptLogSerializer(serializers.ModelSerializer):
         return value
 
     def validate_items_json(self, value):
-        """Validate items JSON structure."""
-        if not isinstance(value, dict):
-            raise serializers.ValidationError("Items must be a JSON object.")
+        """Validate items JSON structure (one line object or a list of lines)."""
+        if not isinstance(value, (dict, list)):
+            raise serializers.ValidationError("Items must be a JSON object or a list of objects.")
         
-        # Expected format: {"item_id": X, "received_qty": Y, "batch_number": Z}
+        # Expected line format: {"item_id": X, "received_qty": Y, "batch_number": Z}
         required_fields = ['item_id', 'received_qty', 'batch_number']
-        if value and not all(field in value for field in required_fields):
-            raise serializers.ValidationError(f"Items must contain fields: {required_fields}.")
+        lines = [value] if isinstance(value, dict) else value
+        for line in lines:
+            if not isinstance(line, dict):
+                raise serializers.ValidationError("Each received line must be a JSON object.")
+            if line and not all(field in line for field in required_fields):
+                raise serializers.ValidationError(f"Items must contain fields: {required_fields}.")
         
         return value
 
+class DirectInwardLineSerializer(serializers.Serializer):
+    """One line of a walk-in supplier bill booked through direct stock inward."""
+    product = serializers.IntegerField()
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=Decimal('0'))
+    discount_percent = serializers.DecimalField(max_digits=5, decimal_places=2, min_value=Decimal('0'), max_value=Decimal('100'), default=Decimal('0'))
+    batch_number = serializers.CharField(max_length=100, required=False, allow_blank=True, allow_null=True)
+    manufacture_date = serializers.DateField(required=False, allow_null=True)
+    expiry_date = serializers.DateField(required=False, allow_null=True)
+
+class DirectInwardSerializer(serializers.Serializer):
+    """Header and lines for a single-request stock inward (PO + GRN in one go)."""
+    supplier = serializers.IntegerField()
+    invoice_number = serializers.CharField(max_length=50, required=False, allow_blank=True, allow_null=True)
+    tax_amount = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'), default=Decimal('0'))
+    shipping_cost = serializers.DecimalField(max_digits=12, decimal_places=2, min_value=Decimal('0'), default=Decimal('0'))
+    update_cost_price = serializers.BooleanField(default=True)
+    notes = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    items = DirectInwardLineSerializer(many=True, allow_empty=False)
+
 class PaymentRecordSerializer(serializers.ModelSerializer):
     """Serializer for payment records."""
     po_number = serializers.CharField(source='purchase_order.po_number', read_only=True)
@@ -270,7 +296,7 @@ class PurchaseOrderListSerializer(serializers.ModelSerializer):
         fields = [
             'id', 'po_number', 'supplier', 'supplier_name', 'order_date',
             'total_amount', 'paid_amount', 'status', 'payment_status',
-            'item_count', 'invoice_number'
+            'completion_percentage', 'item_count', 'invoice_number'
         ]
 
     def get_item_count(self, obj):
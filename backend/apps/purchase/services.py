@@ -1,12 +1,18 @@
 import logging
+import math
+from datetime import timedelta
 from decimal import Decimal
-from django.db import transaction, models
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, IntegerField, Sum, Value, When
+from django.db.models.functions import TruncDate
 from django.utils import timezone
 from rest_framework.exceptions import PermissionDenied, ValidationError
 from django.shortcuts import get_object_or_404
 
 from .repositories import SupplierRepository, PurchaseOrderRepository, PurchaseReceiptRepository, PaymentRecordRepository
-from apps.product.models import InventoryBatch, Product
+from apps.common import sequences
+from apps.product.models import InventoryBatch, InventoryMovement, Product
+from apps.product.signals import detect_threshold_crossing
 from apps.purchase.serializers import SupplierSerializer, PurchaseOrderSerializer
 from apps.users.utils import has_permission
 
@@ -79,12 +85,8 @@ class PurchaseService:
         serializer = PurchaseOrderSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         
-        # Generate PO Number
-        po_count = PurchaseOrderRepository.get_po_queryset(owner=owner).count()
-        po_number = f"DIR-{timezone.now().strftime('%Y%m')}{str(po_count + 1).zfill(6)}"
-        
         return serializer.save(
-            po_number=po_number,
+            po_number=sequences.next_number('po', owner=owner),
             created_by_id=user.id,
             status='draft'
         )
@@ -118,7 +120,37 @@ class PurchaseService:
         serializer.is_valid(raise_exception=True)
         item = serializer.save(purchase_order=po)
         
-        cls._recalculate_po_totals(po)
+        PurchaseOrderRepository.apply_totals_delta(
+            po, subtotal=item.line_total, ordered=item.quantity, received=item.received_quantity
+        )
+        return item
+
+    @classmethod
+    @transaction.atomic
+    def update_order_item(cls, user, item_id, data, partial=False):
+        cls._check_permission(user, 'manage_purchase')
+        item = PurchaseOrderRepository.get_po_item_by_id(item_id)
+        po = item.purchase_order
+
+        owner = cls._get_owner(user)
+        if owner and po.supplier.owner != owner:
+            raise PermissionDenied("Not found.")
+
+        if po.status not in ['draft', 'submitted']:
+            raise ValidationError("Cannot update items in current PO status.")
+
+        old_line_total, old_quantity, old_received = item.line_total, item.quantity, item.received_quantity
+        from apps.purchase.serializers import PurchaseOrderItemSerializer
+        serializer = PurchaseOrderItemSerializer(item, data=data, partial=partial)
+        serializer.is_valid(raise_exception=True)
+        item = serializer.save()
+
+        PurchaseOrderRepository.apply_totals_delta(
+            po,
+            subtotal=item.line_total - old_line_total,
+            ordered=item.quantity - old_quantity,
+            received=item.received_quantity - old_received,
+        )
         return item
 
     @classmethod
@@ -138,15 +170,9 @@ class PurchaseService:
             raise ValidationError(f"Cannot delete items from PO in {po.status} status.")
             
         item.delete()
-        cls._recalculate_po_totals(po)
-
-    @staticmethod
-    def _recalculate_po_totals(po):
-        items = po.items.all()
-        subtotal = items.aggregate(total=models.Sum('line_total'))['total'] or 0
-        po.subtotal = subtotal
-        po.total_amount = subtotal + po.tax_amount + po.shipping_cost
-        po.save()
+        PurchaseOrderRepository.apply_totals_delta(
+            po, subtotal=-item.line_total, ordered=-item.quantity, received=-item.received_quantity
+        )
 
     @classmethod
     @transaction.atomic
@@ -180,69 +206,449 @@ class PurchaseService:
         serializer = PurchaseReceiptLogSerializer(data=data)
         serializer.is_valid(raise_exception=True)
         
-        # Generate GRN Number
-        grn_count = PurchaseReceiptLogRepository.get_receipts_queryset(owner=owner).count() if hasattr(PurchaseReceiptRepository, 'get_receipts_queryset') else PurchaseReceiptLog.objects.count()
-        grn_number = f"{timezone.now().strftime('%Y%m')}{str(grn_count + 1).zfill(6)}"
-        
+        # grn_number is globally unique, so GRNs draw from the global sequence
         receipt = serializer.save(
-            grn_number=grn_number,
+            grn_number=sequences.next_number('grn'),
             received_by_id=user.id
         )
         
         # Process Items & Batches
-        items_data = data.get('items_json', {})
-        if items_data:
-             cls._process_receipt_items(po, items_data, data)
+        lines = serializer.validated_data.get('items_json')
+        if lines:
+            GoodsReceiptService.receive_lines(po, lines, user=user, defaults=data)
 
         return receipt
 
+
+    @classmethod
+    @transaction.atomic
+    def direct_stock_inward(cls, user, data):
+        """
+        Book a walk-in supplier bill in one transaction: a PO created directly in
+        'received' state, bulk-inserted items, batches and movements, and set-wise
+        stock / cost price updates.
+        """
+        cls._check_permission(user, 'receive_stock')
+        owner = cls._get_owner(user)
+
+        from apps.purchase.models import PurchaseOrder, PurchaseOrderItem, PurchaseReceiptLog
+        from apps.purchase.serializers import DirectInwardSerializer
+        serializer = DirectInwardSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        payload = serializer.validated_data
+
+        supplier = SupplierRepository.get_supplier_by_id(payload['supplier'], owner=owner)
+        if supplier.status != 'active':
+            raise ValidationError("Supplier is not active.")
+
+        lines = payload['items']
+        product_ids = {line['product'] for line in lines}
+        products = Product.objects.filter(id__in=product_ids, is_active=True)
+        if owner:
+            products = products.filter(owner=owner)
+        products = {product.id: product for product in products}
+        missing = product_ids - set(products)
+        if missing:
+            raise ValidationError(f"Products not found or inactive: {sorted(missing)}")
+
+        items = []
+        for line in lines:
+            item = PurchaseOrderItem(
+                product=products[line['product']],
+                quantity=line['quantity'],
+                unit_price=line['unit_price'],
+                discount_percent=line['discount_percent'],
+                received_quantity=line['quantity'],
+            )
+            item.line_total = item.calculate_line_total().quantize(Decimal('0.01'))
+            items.append(item)
+
+        subtotal = sum((item.line_total for item in items), Decimal('0'))
+        quantity = sum(item.quantity for item in items)
+        now = timezone.now()
+        po = PurchaseOrder.objects.create(
+            po_number=sequences.next_number('po', owner=owner),
+            supplier=supplier,
+            subtotal=subtotal,
+            tax_amount=payload['tax_amount'],
+            shipping_cost=payload['shipping_cost'],
+            total_amount=subtotal + payload['tax_amount'] + payload['shipping_cost'],
+            ordered_quantity=quantity,
+            received_quantity=quantity,
+            completion_percentage=100,
+            status='received',
+            created_by_id=user.id,
+            approved_by_id=user.id,
+            approved_at=now,
+            notes=payload.get('notes'),
+        )
+        for item in items:
+            item.purchase_order = po
+        PurchaseOrderItem.objects.bulk_create(items)
+
+        # Effective unit cost after line discount feeds both batches and cost_price.
+        entries = []
+        cost_prices = {}
+        for line, item in zip(lines, items):
+            unit_cost = (item.line_total / item.quantity).quantize(Decimal('0.01'))
+            cost_prices[item.product_id] = unit_cost
+            entries.append({
+                'product': item.product,
+                'quantity': item.quantity,
+                'unit_cost': unit_cost,
+                'batch_number': line.get('batch_number'),
+                'manufacture_date': line.get('manufacture_date'),
+                'expiry_date': line.get('expiry_date'),
+            })
+        GoodsReceiptService.book_stock(
+            po, entries, user=user, cost_prices=cost_prices if payload['update_cost_price'] else None
+        )
+
+        PurchaseReceiptLog.objects.create(
+            grn_number=sequences.next_number('grn'),
+            purchase_order=po,
+            received_by_id=user.id,
+            invoice_number=payload.get('invoice_number'),
+            items_json=[
+                {
+                    'item_id': item.id,
+                    'received_qty': item.quantity,
+                    'batch_number': line.get('batch_number') or '',
+                }
+                for line, item in zip(lines, items)
+            ],
+            notes=payload.get('notes'),
+        )
+        logger.info(f"Direct stock inward {po.po_number}: {len(items)} lines booked by user {user.id}")
+        return po
+
+
+class GoodsReceiptService:
+    """
+    Receives every line of a delivery in a fixed number of queries, however many lines it has:
+    lock PO items, bulk-create batches and movements, increment product stock and
+    received quantities with CASE updates, then shift the stored PO totals and status.
+    """
+    RECEIVABLE_STATUSES = ('submitted', 'approved', 'partially_received')
+
     @staticmethod
-    def _process_receipt_items(po, items_data, request_data):
-        # items_data expected to be list or dict. The original view implementation suggested request.data.get('items_json') 
-        # but also treated it as a single item dict in try block. 
-        # Refactoring to handle safely based on previous implementation logic.
-        
-        # Logic from original view:
-        # items_data = request.data.get('items_json', {}) 
-        # item = PurchaseOrderItem.objects.get(id=items_data.get('item_id')) ...
-        
-        try:
-            from apps.purchase.models import PurchaseOrderItem
-            item_id = items_data.get('item_id')
-            if not item_id: return
+    def _normalise_lines(lines):
+        if isinstance(lines, dict):
+            lines = [lines]
+        normalised = []
+        for index, line in enumerate(lines, start=1):
+            try:
+                item_id = int(line.get('item_id'))
+                quantity = int(line.get('received_qty'))
+            except (TypeError, ValueError):
+                raise ValidationError(f"Line {index}: item_id and received_qty must be whole numbers.")
+            if quantity <= 0:
+                raise ValidationError(f"Line {index}: received_qty must be greater than 0.")
+            normalised.append({**line, 'item_id': item_id, 'received_qty': quantity})
+        return normalised
 
-            item = PurchaseOrderItem.objects.get(id=item_id)
-            
-            Batch = InventoryBatch
-            Batch.objects.create(
-                product=item.product,
-                batch_number=items_data.get('batch_number'),
+    @staticmethod
+    def _case_increment(field, increments):
+        """CASE id WHEN x THEN field + n ... END for a set-wise increment."""
+        return Case(
+            *[When(id=pk, then=F(field) + Value(amount)) for pk, amount in increments.items()],
+            default=F(field),
+            output_field=IntegerField(),
+        )
+
+    @classmethod
+    def receive_lines(cls, po, lines, user=None, defaults=None):
+        from apps.purchase.models import PurchaseOrderItem
+
+        defaults = defaults or {}
+        if po.status not in cls.RECEIVABLE_STATUSES:
+            raise ValidationError(f"Cannot receive stock against PO in {po.status} status.")
+        lines = cls._normalise_lines(lines)
+        if not lines:
+            return po
+
+        item_ids = {line['item_id'] for line in lines}
+        items = {
+            item.id: item
+            for item in PurchaseOrderItem.objects.select_for_update(of=('self',))
+            .select_related('product').filter(purchase_order=po, id__in=item_ids)
+        }
+        missing = item_ids - set(items)
+        if missing:
+            raise ValidationError(f"Items {sorted(missing, key=str)} do not belong to PO {po.po_number}.")
+
+        received_by_item = {}
+        for line in lines:
+            received_by_item[line['item_id']] = received_by_item.get(line['item_id'], 0) + line['received_qty']
+        for item_id, quantity in received_by_item.items():
+            item = items[item_id]
+            if item.received_quantity + quantity > item.quantity:
+                raise ValidationError(
+                    f"Cannot receive {quantity} of {item.product.name if item.product else item_id}: "
+                    f"only {item.get_pending_quantity()} pending."
+                )
+
+        entries = []
+        for line in lines:
+            item = items[line['item_id']]
+            entries.append({
+                'product': item.product,
+                'quantity': line['received_qty'],
+                'unit_cost': item.unit_price,
+                'batch_number': line.get('batch_number'),
+                'manufacture_date': line.get('manufacture_date') or defaults.get('manufacture_date') or None,
+                'expiry_date': line.get('expiry_date') or defaults.get('expiry_date') or None,
+            })
+        cls.book_stock(po, entries, user=user)
+
+        PurchaseOrderItem.objects.filter(id__in=received_by_item).update(
+            received_quantity=cls._case_increment('received_quantity', received_by_item),
+            updated_at=timezone.now(),
+        )
+
+        PurchaseOrderRepository.apply_totals_delta(
+            po, received=sum(received_by_item.values()), derive_status=True
+        )
+        return po
+
+    @classmethod
+    def book_stock(cls, po, entries, user=None, cost_prices=None):
+        """
+        Bulk-create batches and purchase movements for `entries` and increment product
+        stock set-wise. Each entry: product, quantity, unit_cost, batch_number,
+        manufacture_date, expiry_date. `cost_prices` optionally maps product_id -> new cost.
+        """
+        batches = [
+            InventoryBatch(
+                product=entry['product'],
+                batch_number=entry.get('batch_number'),
                 supplier_id=po.supplier_id,
                 reference_purchase_id=po.id,
-                received_quantity=items_data.get('received_qty'),
-                remaining_quantity=items_data.get('received_qty'),
-                unit_cost=item.unit_price,
-                manufacture_date=request_data.get('manufacture_date'),
-                expiry_date=request_data.get('expiry_date')
+                received_quantity=entry['quantity'],
+                remaining_quantity=entry['quantity'],
+                unit_cost=entry['unit_cost'],
+                manufacture_date=entry.get('manufacture_date'),
+                expiry_date=entry.get('expiry_date'),
             )
-            
-            # Update PO Item
-            item.received_quantity = items_data.get('received_qty')
-            item.save()
-            
-            # Update PO Status
-            if po.status == 'approved':
-                po.status = 'partially_received'
-                po.save()
-            
-            # Check if fully received
-            total_ordered = po.items.aggregate(total=models.Sum('quantity'))['total'] or 0
-            total_received = po.items.aggregate(total=models.Sum('received_quantity'))['total'] or 0
-            
-            if total_received >= total_ordered:
-                po.status = 'received'
-                po.save()
+            for entry in entries if entry['product'] is not None
+        ]
+        InventoryBatch.objects.bulk_create(batches)
+
+        user_id = user.id if user else None
+        InventoryMovement.objects.bulk_create([
+            InventoryMovement(
+                batch=batch,
+                product_id=batch.product_id,
+                change_type='purchase',
+                quantity=batch.received_quantity,
+                unit_cost=batch.unit_cost,
+                reference_id=po.id,
+                reference_type='purchase',
+                created_by_id=user_id,
+            )
+            for batch in batches
+        ])
+
+        products = {}
+        stock_by_product = {}
+        for batch in batches:
+            products[batch.product_id] = batch.product
+            stock_by_product[batch.product_id] = stock_by_product.get(batch.product_id, 0) + batch.received_quantity
+        if not stock_by_product:
+            return batches
+
+        updates = {
+            'stock': cls._case_increment('stock', stock_by_product),
+            'updated_at': timezone.now(),
+        }
+        if cost_prices:
+            updates['cost_price'] = Case(
+                *[When(id=pk, then=Value(cost)) for pk, cost in cost_prices.items()],
+                default=F('cost_price'),
+                output_field=DecimalField(max_digits=10, decimal_places=2),
+            )
+        Product.objects.filter(id__in=stock_by_product).update(**updates)
+
+        # Emit threshold events from the in-memory products (no extra reads).
+        for product_id, product in products.items():
+            old_stock = product.stock
+            product.stock = old_stock + stock_by_product[product_id]
+            if cost_prices and product_id in cost_prices:
+                product.cost_price = cost_prices[product_id]
+            detect_threshold_crossing(product, old_stock)
+        return batches
+
 
-        except Exception as e:
-            logger.error(f"Error processing receipt items: {e}")
-            raise ValidationError(str(e))
+class ReplenishmentService:
+    """
+    Proposes draft purchase orders from recent sales velocity.
+
+    Daily sales for every candidate SKU come from one grouped InventoryMovement query;
+    demand is an EWMA over that history, folded only over days that actually had sales
+    (zero days are a closed-form decay), so the plan stays linear in sales rows rather
+    than SKUs x days. Suggestions are grouped by preferred supplier and written as
+    draft POs with two bulk inserts.
+    """
+    OPEN_PO_STATUSES = ('draft', 'submitted', 'approved', 'partially_received')
+    DEFAULTS = {
+        'history_days': 56,    # sales window considered
+        'span_days': 14,       # EWMA span; alpha = 2 / (span + 1)
+        'lead_time_days': 7,   # supplier lead time to cover
+        'cover_days': 14,      # stock to hold after the order arrives
+    }
+
+    @staticmethod
+    def _ewma(sales, window, alpha):
+        """EWMA of a daily series given only its non-zero (day_index, qty) points, sorted."""
+        decay = 1 - alpha
+        value, last = 0.0, -1
+        for day, quantity in sales:
+            value = value * decay ** (day - last) + alpha * quantity
+            last = day
+        return value * decay ** (window - 1 - last)
+
+    @classmethod
+    def _options(cls, options):
+        merged = dict(cls.DEFAULTS)
+        for key, value in (options or {}).items():
+            if key in merged and value not in (None, ''):
+                try:
+                    merged[key] = int(value)
+                except (TypeError, ValueError):
+                    raise ValidationError(f"{key} must be a whole number.")
+                if merged[key] < (1 if key in ('history_days', 'span_days') else 0):
+                    raise ValidationError(f"{key} is out of range.")
+        return merged
+
+    @classmethod
+    def plan(cls, owner=None, options=None):
+        """Return reorder suggestions for active products with an active preferred supplier."""
+        from apps.purchase.models import PurchaseOrderItem
+
+        options = cls._options(options)
+        window = options['history_days']
+        alpha = 2 / (options['span_days'] + 1)
+        today = timezone.localdate()
+        start = today - timedelta(days=window - 1)
+
+        products = Product.objects.filter(
+            is_active=True, preferred_supplier__isnull=False, preferred_supplier__status='active'
+        )
+        if owner:
+            products = products.filter(owner=owner)
+
+        sales = {}
+        daily = (
+            InventoryMovement.objects
+            .filter(change_type='sale', created_at__date__gte=start, product__in=products)
+            .annotate(day=TruncDate('created_at'))
+            .values('product_id', 'day')
+            .annotate(quantity=Sum('quantity'))
+            .order_by('product_id', 'day')
+        )
+        for row in daily.iterator(chunk_size=5000):
+            quantity = -row['quantity']
+            if quantity > 0:
+                sales.setdefault(row['product_id'], []).append(((row['day'] - start).days, quantity))
+
+        on_order = dict(
+            PurchaseOrderItem.objects
+            .filter(purchase_order__status__in=cls.OPEN_PO_STATUSES, product__in=products)
+            .values('product_id')
+            .annotate(pending=Sum(F('quantity') - F('received_quantity')))
+            .values_list('product_id', 'pending')
+        )
+
+        suggestions = []
+        fields = ('id', 'product_code', 'name', 'stock', 'reorder_level', 'reorder_quantity',
+                  'cost_price', 'preferred_supplier_id', 'owner_id')
+        for product in products.values(*fields).iterator(chunk_size=5000):
+            demand = cls._ewma(sales.get(product['id'], ()), window, alpha)
+            pending = on_order.get(product['id']) or 0
+            available = product['stock'] + pending
+            reorder_point = max(product['reorder_level'], math.ceil(demand * options['lead_time_days']))
+            if available > reorder_point:
+                continue
+            target = product['reorder_level'] + math.ceil(
+                demand * (options['lead_time_days'] + options['cover_days'])
+            )
+            quantity = max(product['reorder_quantity'], target - available)
+            suggestions.append({
+                'product_id': product['id'],
+                'product_code': product['product_code'],
+                'name': product['name'],
+                'supplier_id': product['preferred_supplier_id'],
+                'owner_id': product['owner_id'],
+                'stock': product['stock'],
+                'on_order': pending,
+                'daily_demand': round(demand, 2),
+                'days_of_cover': round(product['stock'] / demand, 1) if demand else None,
+                'suggested_quantity': quantity,
+                'unit_cost': product['cost_price'] or Decimal('0'),
+            })
+        return suggestions
+
+    @classmethod
+    @transaction.atomic
+    def create_draft_orders(cls, suggestions, user=None):
+        """Write one draft PO per supplier for `suggestions` using bulk inserts."""
+        from apps.purchase.models import PurchaseOrder, PurchaseOrderItem, Supplier
+
+        by_supplier = {}
+        for suggestion in suggestions:
+            by_supplier.setdefault(suggestion['supplier_id'], []).append(suggestion)
+        if not by_supplier:
+            return []
+
+        suppliers = Supplier.objects.select_related('owner').in_bulk(list(by_supplier))
+        by_owner = {}
+        for supplier_id in by_supplier:
+            by_owner.setdefault(suppliers[supplier_id].owner_id, []).append(supplier_id)
+
+        system_settings = sequences.get_system_settings()
+        orders, lines = [], []
+        for owner_id, supplier_ids in by_owner.items():
+            owner = suppliers[supplier_ids[0]].owner
+            first = sequences.reserve('po', owner=owner, count=len(supplier_ids))
+            for offset, supplier_id in enumerate(supplier_ids):
+                items = []
+                for suggestion in by_supplier[supplier_id]:
+                    item = PurchaseOrderItem(
+                        product_id=suggestion['product_id'],
+                        quantity=suggestion['suggested_quantity'],
+                        unit_price=suggestion['unit_cost'],
+                    )
+                    item.line_total = item.calculate_line_total()
+                    items.append(item)
+                subtotal = sum((item.line_total for item in items), Decimal('0'))
+                orders.append(PurchaseOrder(
+                    po_number=sequences.format_number('po', first + offset, system_settings=system_settings),
+                    supplier_id=supplier_id,
+                    subtotal=subtotal,
+                    total_amount=subtotal,
+                    ordered_quantity=sum(item.quantity for item in items),
+                    status='draft',
+                    created_by_id=user.id if user else None,
+                    notes='Generated by replenishment planner',
+                ))
+                lines.append(items)
+
+        PurchaseOrder.objects.bulk_create(orders)
+        for order, items in zip(orders, lines):
+            for item in items:
+                item.purchase_order = order
+        PurchaseOrderItem.objects.bulk_create([item for items in lines for item in items], batch_size=1000)
+        logger.info(f"Replenishment planner created {len(orders)} draft POs for {len(suggestions)} products")
+        return orders
+
+    @classmethod
+    def run(cls, user, data):
+        """API entry point: preview suggestions, or create draft POs when `create` is set."""
+        PurchaseService._check_permission(user, 'manage_purchase')
+        owner = PurchaseService._get_owner(user)
+        suggestions = cls.plan(owner=owner, options=data)
+        result = {'suggestions': suggestions, 'orders': []}
+        if str(data.get('create', '')).lower() in ('1', 'true', 'yes'):
+            orders = cls.create_draft_orders(suggestions, user=user)
+            result['orders'] = [{'id': order.id, 'po_number': order.po_number} for order in orders]
+        return result
@@ -1,3 +1,211 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.db.models import F
 from django.test import TestCase
+from django.utils import timezone
+from django.contrib.auth import get_user_model
+from apps.product.models import Product, InventoryBatch, InventoryMovement
+from .models import Supplier, PurchaseOrder, PurchaseOrderItem
 
-# Create your tests here.
+User = get_user_model()
+
+class GoodsReceiptServiceTests(TestCase):
+    """Test multi-line GRN processing."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000010', password='test123', is_superuser=True)
+        self.supplier = Supplier.objects.create(owner=self.owner, name='Metro Wholesale', code='MW')
+        self.po = PurchaseOrder.objects.create(
+            po_number='PO-1', supplier=self.supplier, status='approved', ordered_quantity=60
+        )
+        self.products = [
+            Product.objects.create(
+                product_code=f"P{i}", name=f"Item {i}", unit_price=Decimal("10.00"),
+                tax_rate=Decimal("5.00"), stock=50, owner=self.owner
+            )
+            for i in range(6)
+        ]
+        self.items = [
+            PurchaseOrderItem.objects.create(
+                purchase_order=self.po, product=product, quantity=10, unit_price=Decimal("8.00"), line_total=Decimal("80.00")
+            )
+            for product in self.products
+        ]
+
+    def _lines(self, items, qty):
+        return [{'item_id': item.id, 'received_qty': qty, 'batch_number': f"B{item.id}"} for item in items]
+
+    def test_receive_all_lines_updates_stock_and_status(self):
+        """Test every line creates a batch and movement and the PO becomes received."""
+        from .services import GoodsReceiptService
+        GoodsReceiptService.receive_lines(self.po, self._lines(self.items, 10), user=self.owner)
+
+        self.assertEqual(InventoryBatch.objects.filter(reference_purchase_id=self.po.id).count(), 6)
+        self.assertEqual(InventoryMovement.objects.filter(change_type='purchase', reference_id=self.po.id).count(), 6)
+        self.assertEqual(Product.objects.get(pk=self.products[0].pk).stock, 60)
+        self.assertEqual(PurchaseOrderItem.objects.get(pk=self.items[0].pk).received_quantity, 10)
+        self.po.refresh_from_db()
+        self.assertEqual(self.po.status, 'received')
+        self.assertEqual(self.po.completion_percentage, Decimal("100.00"))
+
+    def test_query_count_independent_of_line_count(self):
+        """Test receiving 2 or 6 lines costs the same number of queries."""
+        from .services import GoodsReceiptService
+        with self.assertNumQueries(7):
+            GoodsReceiptService.receive_lines(self.po, self._lines(self.items[:2], 3))
+        self.po.refresh_from_db()
+        self.assertEqual(self.po.status, 'partially_received')
+        self.assertEqual(self.po.completion_percentage, Decimal("10.00"))
+        with self.assertNumQueries(7):
+            GoodsReceiptService.receive_lines(self.po, self._lines(self.items, 3))
+
+    def test_over_receipt_is_rejected(self):
+        """Test receiving more than pending raises and writes nothing."""
+        from rest_framework.exceptions import ValidationError
+        from .services import GoodsReceiptService
+        with self.assertRaises(ValidationError):
+            GoodsReceiptService.receive_lines(self.po, self._lines(self.items[:1], 11))
+        self.assertFalse(InventoryBatch.objects.exists())
+
+class PurchaseOrderTotalsTests(TestCase):
+    """Test incrementally maintained PO totals."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000013', password='test123', is_superuser=True)
+        self.supplier = Supplier.objects.create(owner=self.owner, name='City Traders', code='CT')
+        self.po = PurchaseOrder.objects.create(po_number='PO-2', supplier=self.supplier, shipping_cost=Decimal("20.00"),
+                                               total_amount=Decimal("20.00"))
+        self.product = Product.objects.create(
+            product_code="SUGAR", name="Sugar", unit_price=Decimal("45.00"), tax_rate=Decimal("5.00"), owner=self.owner
+        )
+
+    def test_item_insert_update_delete_shift_totals(self):
+        """Test subtotal, quantities and completion follow item changes."""
+        from .services import PurchaseService
+        item = PurchaseService.add_order_item(self.owner, self.po.id, {
+            'purchase_order': self.po.id, 'product': self.product.id, 'quantity': 10, 'unit_price': '40.00',
+            'received_quantity': 4,
+        })
+        self.po.refresh_from_db()
+        self.assertEqual(self.po.subtotal, Decimal("400.00"))
+        self.assertEqual(self.po.total_amount, Decimal("420.00"))
+        self.assertEqual((self.po.ordered_quantity, self.po.received_quantity), (10, 4))
+        self.assertEqual(self.po.completion_percentage, Decimal("40.00"))
+
+        # A tax edit on the header is picked up by the next item change
+        PurchaseOrder.objects.filter(pk=self.po.pk).update(tax_amount=Decimal("16.00"))
+        PurchaseService.update_order_item(self.owner, item.id, {'quantity': 8}, partial=True)
+        self.po.refresh_from_db()
+        self.assertEqual(self.po.subtotal, Decimal("320.00"))
+        self.assertEqual(self.po.total_amount, Decimal("356.00"))
+        self.assertEqual(self.po.ordered_quantity, 8)
+        self.assertEqual(self.po.completion_percentage, Decimal("50.00"))
+
+        PurchaseService.delete_order_item(self.owner, item.id)
+        self.po.refresh_from_db()
+        self.assertEqual(self.po.subtotal, Decimal("0.00"))
+        self.assertEqual(self.po.total_amount, Decimal("36.00"))
+        self.assertEqual((self.po.ordered_quantity, self.po.received_quantity), (0, 0))
+        self.assertEqual(self.po.completion_percentage, Decimal("0.00"))
+
+class DirectStockInwardTests(TestCase):
+    """Test single-request direct stock inward."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000011', password='test123', is_superuser=True)
+        self.supplier = Supplier.objects.create(owner=self.owner, name='Local Mandi', code='LM')
+        self.rice = Product.objects.create(
+            product_code="RICE", name="Rice", unit_price=Decimal("60.00"), cost_price=Decimal("40.00"),
+            tax_rate=Decimal("5.00"), stock=5, owner=self.owner
+        )
+        self.dal = Product.objects.create(
+            product_code="DAL", name="Dal", unit_price=Decimal("90.00"), tax_rate=Decimal("5.00"),
+            stock=0, owner=self.owner
+        )
+
+    def test_direct_inward_books_po_grn_and_stock(self):
+        """Test the bill becomes a received PO with GRN, batches and updated stock/cost."""
+        from .models import PurchaseReceiptLog
+        from .services import PurchaseService
+        po = PurchaseService.direct_stock_inward(self.owner, {
+            'supplier': self.supplier.id,
+            'invoice_number': 'BILL-77',
+            'shipping_cost': '50.00',
+            'items': [
+                {'product': self.rice.id, 'quantity': 20, 'unit_price': '45.00', 'batch_number': 'R1'},
+                {'product': self.dal.id, 'quantity': 10, 'unit_price': '80.00', 'discount_percent': '10'},
+            ],
+        })
+
+        self.assertEqual(po.status, 'received')
+        self.assertEqual(po.subtotal, Decimal("1620.00"))
+        self.assertEqual(po.total_amount, Decimal("1670.00"))
+        self.assertEqual(po.get_completion_percentage(), 100)
+        self.assertEqual(po.items.filter(received_quantity=F('quantity')).count(), 2)
+        self.assertEqual(PurchaseReceiptLog.objects.get(purchase_order=po).invoice_number, 'BILL-77')
+
+        self.rice.refresh_from_db()
+        self.dal.refresh_from_db()
+        self.assertEqual(self.rice.stock, 25)
+        self.assertEqual(self.rice.cost_price, Decimal("45.00"))
+        self.assertEqual(self.dal.stock, 10)
+        self.assertEqual(self.dal.cost_price, Decimal("72.00"))
+        self.assertEqual(InventoryBatch.objects.filter(reference_purchase_id=po.id).count(), 2)
+
+    def test_direct_inward_rejects_foreign_product(self):
+        """Test products of another owner are rejected and nothing is written."""
+        from rest_framework.exceptions import ValidationError
+        from .services import PurchaseService
+        other = User.objects.create_user(phone='9000000012', password='test123')
+        foreign = Product.objects.create(
+            product_code="X", name="X", unit_price=Decimal("1.00"), tax_rate=Decimal("0.00"), owner=other
+        )
+        with self.assertRaises(ValidationError):
+            PurchaseService.direct_stock_inward(self.owner, {
+                'supplier': self.supplier.id,
+                'items': [{'product': foreign.id, 'quantity': 1, 'unit_price': '1.00'}],
+            })
+        self.assertFalse(PurchaseOrder.objects.exists())
+
+class ReplenishmentServiceTests(TestCase):
+    """Test the replenishment planner."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000014', password='test123', is_superuser=True)
+        self.supplier = Supplier.objects.create(owner=self.owner, name='Agro Foods', code='AF')
+        self.fast = Product.objects.create(
+            product_code="OIL", name="Oil", unit_price=Decimal("150.00"), cost_price=Decimal("120.00"),
+            tax_rate=Decimal("5.00"), stock=20, reorder_level=5, reorder_quantity=10,
+            preferred_supplier=self.supplier, owner=self.owner
+        )
+        self.slow = Product.objects.create(
+            product_code="SALT", name="Salt", unit_price=Decimal("20.00"), tax_rate=Decimal("0.00"),
+            stock=40, reorder_level=5, preferred_supplier=self.supplier, owner=self.owner
+        )
+        now = timezone.now()
+        for days_ago in range(28):
+            movement = InventoryMovement.objects.create(product=self.fast, change_type='sale', quantity=-6)
+            InventoryMovement.objects.filter(pk=movement.pk).update(created_at=now - timedelta(days=days_ago))
+
+    def test_plan_flags_products_short_of_cover(self):
+        """Test only the fast mover is suggested, sized to lead time plus cover."""
+        from .services import ReplenishmentService
+        suggestions = ReplenishmentService.plan(owner=self.owner)
+
+        self.assertEqual([s['product_id'] for s in suggestions], [self.fast.id])
+        suggestion = suggestions[0]
+        self.assertAlmostEqual(suggestion['daily_demand'], 6, delta=0.5)
+        self.assertGreaterEqual(suggestion['suggested_quantity'], 6 * 21 + 5 - 20 - 10)
+
+    def test_create_draft_orders_groups_by_supplier_and_counts_on_order(self):
+        """Test suggestions become one draft PO and open PO quantity suppresses a re-plan."""
+        from .services import ReplenishmentService
+        suggestions = ReplenishmentService.plan(owner=self.owner)
+        orders = ReplenishmentService.create_draft_orders(suggestions, user=self.owner)
+
+        self.assertEqual(len(orders), 1)
+        po = PurchaseOrder.objects.get(pk=orders[0].pk)
+        self.assertEqual(po.status, 'draft')
+        self.assertEqual(po.items.get().quantity, suggestions[0]['suggested_quantity'])
+        self.assertEqual(po.ordered_quantity, suggestions[0]['suggested_quantity'])
+        self.assertEqual(ReplenishmentService.plan(owner=self.owner), [])
@@ -4,7 +4,8 @@ from apps.purchase.views import (
     PurchaseOrderListCreate, PurchaseOrderRetrieveUpdate,
     PurchaseOrderItemListCreate, PurchaseOrderItemRetrieveUpdateDestroy,
     PurchaseOrderApproveView, PurchaseReceiptCreateView,
-    PaymentRecordListCreate, DirectStockInwardView, NotifySupplierView
+    PaymentRecordListCreate, DirectStockInwardView, NotifySupplierView,
+    ReplenishmentPlanView
 )
 
 app_name = 'purchase'
@@ -14,6 +15,7 @@ urlpatterns = [
     path('suppliers/<int:pk>/', SupplierRetrieveUpdateDestroy.as_view(), name='supplier-detail'),
 
     path('orders/', PurchaseOrderListCreate.as_view(), name='order-list-create'),
+    path('orders/replenishment/', ReplenishmentPlanView.as_view(), name='order-replenishment'),
     path('orders/<int:pk>/', PurchaseOrderRetrieveUpdate.as_view(), name='order-detail'),
     path('orders/<int:pk>/approve/', PurchaseOrderApproveView.as_view(), name='order-approve'),
     
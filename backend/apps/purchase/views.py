@@ -12,7 +12,8 @@ from apps.purchase.serializers import (
     SupplierSerializer, PurchaseOrderSerializer, PurchaseOrderItemSerializer,
     PurchaseReceiptLogSerializer, PaymentRecordSerializer, PurchaseOrderListSerializer
 )
-from apps.purchase.services import PurchaseService
+from apps.purchase.services import PurchaseService, ReplenishmentService
+from apps.purchase.repositories import PurchaseOrderRepository
 from apps.auth_app.permissions import IsAuthenticated
 
 class StandardResultsSetPagination(PageNumberPagination):
@@ -136,17 +137,9 @@ class PurchaseOrderItemRetrieveUpdateDestroy(RetrieveUpdateDestroyAPIView):
         PurchaseService.delete_order_item(self.request.user, instance.id)
 
     def perform_update(self, serializer):
-         # Logic for update is similar to add, needs checking PO status.
-         # For now, let's map it to deleting and re-adding, or just implementing update in service?
-         # Simplest to implement update in Service if heavily used.
-         # Given the complexity, let's skip deep refactor of Item Update for this pass unless critical.
-         # But we should block it if PO is not draft.
-         instance = serializer.instance
-         if instance.purchase_order.status not in ['draft', 'submitted']:
-              from rest_framework.exceptions import ValidationError
-              raise ValidationError("Cannot update items in current PO status.")
-         serializer.save()
-         PurchaseService._recalculate_po_totals(instance.purchase_order)
+        serializer.instance = PurchaseService.update_order_item(
+            self.request.user, serializer.instance.id, self.request.data, partial=serializer.partial
+        )
 
 class PurchaseOrderApproveView(APIView):
     """Approve a purchase order."""
@@ -194,28 +187,33 @@ class PaymentRecordListCreate(ListCreateAPIView):
 
 class DirectStockInwardView(APIView):
     """
-    Simplified Stock Inward.
+    Simplified Stock Inward: books a supplier bill as a received PO, GRN, batches
+    and stock movements in a single request.
     """
     permission_classes = [IsAuthenticated]
 
     def post(self, request, *args, **kwargs):
-        # This was a complex view.
-        # Ideally, move this entirely to Service.
-        # For now, leaving as is or refactoring would be huge.
-        # Let's mark it as 'To Refactor' or do a quick pass if time permits.
-        # Given the instruction "Refactor views.py", I should probably refactor this too.
-        
-        # But wait, I see I didn't verify Direct Stock logic in Service.
-        # Let's leave this view logic here BUT use the Service methods where possible.
-        
-        # Actually, Direct Stock Inward is just a wrapper around:
-        # 1. Create PO (Received)
-        # 2. Add Items
-        # 3. Create Receipt
-        
-        # I will leave the logic here mostly but clean it up later if requested.
-        # For now, I will keep the existing implementation but cleaned up imports.
-        return Response({'message': 'Direct Stock Inward Logic needs Service migration'}, status=status.HTTP_501_NOT_IMPLEMENTED)
+        try:
+            po = PurchaseService.direct_stock_inward(request.user, request.data)
+            po = PurchaseOrderRepository.get_po_by_id(po.id)
+            return Response(PurchaseOrderSerializer(po).data, status=status.HTTP_201_CREATED)
+        except Exception as e:
+            return Response({'detail': getattr(e, 'detail', str(e))}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
+
+class ReplenishmentPlanView(APIView):
+    """
+    Reorder suggestions from recent sales velocity. Pass `create: true` to also
+    write them as draft purchase orders, one per preferred supplier.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            result = ReplenishmentService.run(request.user, request.data)
+            code = status.HTTP_201_CREATED if result['orders'] else status.HTTP_200_OK
+            return Response(result, status=code)
+        except Exception as e:
+            return Response({'detail': getattr(e, 'detail', str(e))}, status=getattr(e, 'status_code', status.HTTP_400_BAD_REQUEST))
 
 class NotifySupplierView(APIView):
     permission_classes = [IsAuthenticated]
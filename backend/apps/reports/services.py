@@ -0,0 +1,474 @@
+import csv
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import BooleanField, Case, Count, DecimalField, Exists, ExpressionWrapper, F, Func, IntegerField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from rest_framework.exceptions import PermissionDenied, ValidationError
+
+from apps.billing import tax
+from apps.billing.models import Invoice, InvoiceItem, ProductSalesDaily
+from apps.billing.tax import money
+from apps.common.helpers import get_user_owner
+from apps.common.jobs import run_after_commit
+from apps.product.models import InventoryMovement
+from apps.users.utils import has_permission
+
+ZERO = Decimal('0')
+
+
+class LineQuantity(Func):
+    """An invoice line's quantity as a divisor; SQLite would divide whole amounts as integers."""
+    template = '%(expressions)s'
+    output_field = IntegerField()
+
+    def __init__(self):
+        super().__init__(F('quantity'))
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, template='CAST(%(expressions)s AS REAL)', **extra_context)
+
+
+def net_share(amount):
+    """`amount` of an invoice line scaled to the units not returned."""
+    return ExpressionWrapper(
+        amount * (F('quantity') - F('returned_quantity')) / LineQuantity(),
+        output_field=DecimalField(max_digits=16, decimal_places=4),
+    )
+
+
+class GSTReturnCache:
+    """
+    Per-owner version namespacing cached GST returns; bumped whenever a billed
+    invoice changes so closed periods are rebuilt on next request.
+    """
+    VERSION_KEY = "gst_returns_version:{owner_id}"
+
+    @classmethod
+    def version(cls, owner_id):
+        return cache.get_or_set(cls.VERSION_KEY.format(owner_id=owner_id), 1, None)
+
+    @classmethod
+    def invalidate(cls, owner_id):
+        key = cls.VERSION_KEY.format(owner_id=owner_id)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, 2, None)
+
+
+class GSTReturnService:
+    """
+    GSTR-1 style B2B, B2C and HSN-wise summaries built from invoice lines.
+
+    All grouping happens in the database over `InvoiceItem` joined to the product
+    HSN code and customer GSTIN; only the grouped rows come back to Python, where
+    the shared tax engine splits each group's tax into CGST/SGST or IGST. Reports
+    for months that have ended are cached until the owner's invoices change.
+    """
+    SECTIONS = ('b2b', 'b2c', 'hsn')
+    CACHE_KEY = "gstr1:{owner_id}:{version}:{period}"
+    CSV_HEADER = [
+        'section', 'invoice_number', 'invoice_date', 'gstin', 'customer', 'hsn_code',
+        'tax_rate', 'interstate', 'invoices', 'quantity', 'taxable_value',
+        'cgst_amount', 'sgst_amount', 'igst_amount', 'tax_amount',
+    ]
+
+    @staticmethod
+    def _check_report_permission(user):
+        if not user.is_superuser and not has_permission(user, 'view_reports'):
+            raise PermissionDenied("You do not have permission to view reports.")
+
+    @staticmethod
+    def parse_period(period):
+        """'YYYY-MM' -> (first day, first day of next month); defaults to the current month."""
+        if not period:
+            today = timezone.localdate()
+            return today.replace(day=1), GSTReturnService._next_month(today.replace(day=1))
+        try:
+            start = datetime.strptime(period, '%Y-%m').date()
+        except ValueError:
+            raise ValidationError({'period': "Use the YYYY-MM format."})
+        return start, GSTReturnService._next_month(start)
+
+    @staticmethod
+    def _next_month(day):
+        return date(day.year + day.month // 12, day.month % 12 + 1, 1)
+
+    @staticmethod
+    def line_queryset(owner, start, end):
+        """Completed invoice lines billed in [start, end), annotated for grouping."""
+        tz = timezone.get_current_timezone()
+        items = InvoiceItem.objects.filter(
+            invoice__status='completed',
+            invoice__invoice_date__gte=datetime.combine(start, datetime.min.time(), tzinfo=tz),
+            invoice__invoice_date__lt=datetime.combine(end, datetime.min.time(), tzinfo=tz),
+        )
+        if owner:
+            items = items.filter(invoice__owner=owner)
+        return GSTReturnService.annotate_lines(items)
+
+    @staticmethod
+    def annotate_lines(items):
+        """Lines net of returned units: returns keep the invoice `completed` but lower what was supplied."""
+        net = F('quantity') - F('returned_quantity')
+        return items.annotate(
+            net_quantity=ExpressionWrapper(net, output_field=IntegerField()),
+            taxable=net_share(F('line_total') - F('tax_amount')),
+            net_tax=net_share(F('tax_amount')),
+            interstate=Case(When(invoice__igst_amount__gt=0, then=Value(True)), default=Value(False), output_field=BooleanField()),
+            has_gstin=Case(
+                When(Q(invoice__customer__gstin__isnull=False) & ~Q(invoice__customer__gstin=''), then=Value(True)),
+                default=Value(False), output_field=BooleanField(),
+            ),
+        )
+
+    @staticmethod
+    def _split(row):
+        """Turn one grouped row's tax total into CGST/SGST/IGST with the billing tax engine."""
+        tax_amount = row.pop('tax_total') or ZERO
+        cgst, sgst, igst = tax.split_tax(tax_amount, row['interstate'])
+        row.update(
+            taxable_value=money(row.pop('taxable_total')),
+            cgst_amount=cgst, sgst_amount=sgst, igst_amount=igst, tax_amount=cgst + sgst + igst,
+        )
+        return row
+
+    @classmethod
+    def b2b(cls, lines):
+        """One row per invoice and rate for customers registered under GST."""
+        rows = lines.filter(has_gstin=True).values(
+            'tax_rate', 'interstate',
+            invoice_number=F('invoice__invoice_number'),
+            invoice_date=F('invoice__invoice_date'),
+            gstin=F('invoice__customer__gstin'),
+            customer=F('invoice__customer__name'),
+        ).annotate(
+            taxable_total=Sum('taxable'), tax_total=Sum('net_tax'),
+        ).order_by('invoice_date', 'invoice_number', 'tax_rate')
+        return [cls._split(row) for row in rows.iterator()]
+
+    @classmethod
+    def b2c(cls, lines):
+        """Unregistered sales grouped by rate and intra/inter-state supply."""
+        rows = lines.filter(has_gstin=False).values('tax_rate', 'interstate').annotate(
+            invoices=Count('invoice', distinct=True),
+            taxable_total=Sum('taxable'), tax_total=Sum('net_tax'),
+        ).order_by('interstate', 'tax_rate')
+        return [cls._split(row) for row in rows.iterator()]
+
+    @classmethod
+    def hsn(cls, lines):
+        """HSN-wise summary; intra- and inter-state groups of the same HSN/rate are merged."""
+        rows = lines.values('tax_rate', 'interstate', hsn_code=F('product__hsn_code')).annotate(
+            quantity=Sum('net_quantity'), taxable_total=Sum('taxable'), tax_total=Sum('net_tax'),
+        ).order_by('hsn_code', 'tax_rate', 'interstate')
+        merged = {}
+        for row in rows.iterator():
+            row = cls._split(row)
+            key = (row['hsn_code'] or '', row['tax_rate'])
+            if key not in merged:
+                merged[key] = {
+                    'hsn_code': key[0], 'tax_rate': key[1], 'quantity': 0, 'taxable_value': ZERO,
+                    'cgst_amount': ZERO, 'sgst_amount': ZERO, 'igst_amount': ZERO, 'tax_amount': ZERO,
+                }
+            group = merged[key]
+            for field in ('quantity', 'taxable_value', 'cgst_amount', 'sgst_amount', 'igst_amount', 'tax_amount'):
+                group[field] += row[field]
+        return [merged[key] for key in sorted(merged)]
+
+    @classmethod
+    def build(cls, owner, start, end):
+        lines = cls.line_queryset(owner, start, end)
+        return {
+            'period': start.strftime('%Y-%m'),
+            'b2b': cls.b2b(lines),
+            'b2c': cls.b2c(lines),
+            'hsn': cls.hsn(lines),
+        }
+
+    @classmethod
+    def get_gstr1(cls, user, period=None):
+        cls._check_report_permission(user)
+        owner = get_user_owner(user)
+        start, end = cls.parse_period(period)
+        if end > timezone.localdate():
+            # The month is still open; invoices keep arriving, so never cache it
+            return cls.build(owner, start, end)
+
+        owner_id = owner.id if owner else 0
+        key = cls.CACHE_KEY.format(owner_id=owner_id, version=GSTReturnCache.version(owner_id), period=start.strftime('%Y-%m'))
+        report = cache.get(key)
+        if report is None:
+            report = cls.build(owner, start, end)
+            cache.set(key, report, getattr(settings, 'GST_RETURN_CACHE_TIMEOUT', 60 * 60 * 24))
+        return report
+
+    @classmethod
+    def iter_json(cls, report):
+        """Yield the report as JSON one row at a time."""
+        encoder = DjangoJSONEncoder()
+        yield '{"period": %s' % encoder.encode(report['period'])
+        for section in cls.SECTIONS:
+            yield ', "%s": [' % section
+            for index, row in enumerate(report[section]):
+                yield (', ' if index else '') + encoder.encode(row)
+            yield ']'
+        yield '}'
+
+    @classmethod
+    def iter_csv(cls, report):
+        """Yield the report as CSV lines, one section after another."""
+        class Echo:
+            def write(self, value):
+                return value
+
+        writer = csv.writer(Echo())
+        yield writer.writerow(cls.CSV_HEADER)
+        for section in cls.SECTIONS:
+            for row in report[section]:
+                yield writer.writerow([section] + [row.get(column, '') for column in cls.CSV_HEADER[1:]])
+
+
+class ProfitLossService:
+    """
+    Gross margin read off the inventory movement ledger.
+
+    Sale movements carry the FIFO batch cost they consumed and the net selling
+    price, and customer returns carry the same figures with the opposite sign,
+    so revenue, COGS and margin for any period (overall, per product or per
+    category) come from one grouped scan of `InventoryMovement`. Only movements
+    of completed invoices count, matching the invoice totals on the same report:
+    drafts deduct stock and cancelling posts no reversing movement.
+    """
+    GROUPINGS = {
+        'product': {'product_id': F('product_id'), 'name': F('product__name'), 'code': F('product__product_code')},
+        'category': {'category_id': F('product__category_id'), 'name': F('product__category__name')},
+    }
+    @classmethod
+    def ledger_queryset(cls, owner, start=None):
+        movements = InventoryMovement.objects.filter(
+            Exists(Invoice.objects.filter(pk=OuterRef('reference_id'), status='completed')),
+            change_type__in=['sale', 'return'],
+            reference_type__in=['invoice', 'invoice_return'],
+        )
+        if owner:
+            movements = movements.filter(product__owner=owner)
+        if start:
+            movements = movements.filter(created_at__date__gte=start)
+        return movements
+
+    @staticmethod
+    def _margin_aggregates():
+        def amount(field):
+            return Sum(ExpressionWrapper(
+                -F('quantity') * Coalesce(field, Value(ZERO)), output_field=DecimalField(max_digits=16, decimal_places=4)
+            ))
+        return {'units': Sum(-F('quantity')), 'revenue': amount('unit_price'), 'cost': amount('unit_cost')}
+
+    @staticmethod
+    def _with_margin(row):
+        revenue = money(row['revenue'])
+        cost = money(row['cost'])
+        row.update(
+            quantity=row.pop('units') or 0, revenue=revenue, cost=cost, gross_profit=revenue - cost,
+            margin_percent=money((revenue - cost) / revenue * 100) if revenue else ZERO,
+        )
+        return row
+
+    @classmethod
+    def margins(cls, owner, start=None, group_by=None):
+        """Totals, or one row per product/category, ordered by gross profit."""
+        movements = cls.ledger_queryset(owner, start)
+        if group_by is None:
+            return cls._with_margin(movements.aggregate(**cls._margin_aggregates()))
+        if group_by not in cls.GROUPINGS:
+            raise ValidationError({'group_by': f"Choose one of: {', '.join(cls.GROUPINGS)}."})
+        rows = movements.values(**cls.GROUPINGS[group_by]).annotate(**cls._margin_aggregates())
+        return sorted((cls._with_margin(row) for row in rows), key=lambda row: row['gross_profit'], reverse=True)
+
+    @classmethod
+    def get_profit_loss(cls, user, period='month', group_by=None):
+        GSTReturnService._check_report_permission(user)
+        owner = get_user_owner(user)
+        start = timezone.now().date().replace(day=1) if period == 'month' else None
+
+        sales_query = Invoice.objects.filter(status='completed')
+        if owner:
+            sales_query = sales_query.filter(owner=owner)
+        if start:
+            sales_query = sales_query.filter(invoice_date__date__gte=start)
+        invoiced = sales_query.aggregate(
+            sales=Sum('total_amount'),
+            discount=Sum('discount_amount'),
+            tax=Sum('cgst_amount') + Sum('sgst_amount') + Sum('igst_amount'),
+        )
+
+        breakdown = cls.margins(owner, start, group_by) if group_by else None
+        if breakdown is None:
+            totals = cls.margins(owner, start)
+        else:
+            # Roll the grouped rows up rather than scanning the ledger twice
+            totals = cls._with_margin({
+                'units': sum(row['quantity'] for row in breakdown),
+                'revenue': sum((row['revenue'] for row in breakdown), ZERO),
+                'cost': sum((row['cost'] for row in breakdown), ZERO),
+            })
+        report = {
+            'period': period,
+            'sales': invoiced['sales'] or ZERO,
+            'discount': invoiced['discount'] or ZERO,
+            'tax': invoiced['tax'] or ZERO,
+            'net_sales': totals['revenue'],
+            'cost_of_goods': totals['cost'],
+            'profit': totals['gross_profit'],
+            'profit_margin': totals['margin_percent'],
+        }
+        if breakdown is not None:
+            report['breakdown'] = breakdown
+        return report
+
+
+class ProductSalesService:
+    """
+    Product rankings by quantity, revenue or margin over any window.
+
+    `aggregate` groups completed invoice lines (net of returns) by product and
+    day in one query, with FIFO cost taken from the same invoices' sale/return
+    movements. Its output is stored in `ProductSalesDaily`, rebuilt for the day
+    of every invoice that changes, so `ranking` only sums summary rows.
+    """
+    RANKINGS = ('quantity', 'revenue', 'margin')
+
+    @staticmethod
+    def period_window(period='month', start_date=None, end_date=None):
+        """(start, end) dates for the dashboard periods; start is None for 'all'."""
+        today = timezone.localdate()
+        if start_date and end_date:
+            try:
+                return (datetime.strptime(start_date, '%Y-%m-%d').date(),
+                        datetime.strptime(end_date, '%Y-%m-%d').date())
+            except ValueError:
+                raise ValidationError({'start_date': "Use the YYYY-MM-DD format."})
+        starts = {
+            'day': today,
+            'week': today - timedelta(days=7),
+            'month': today.replace(day=1),
+            'year': today.replace(month=1, day=1),
+            'all': None,
+        }
+        if period not in starts:
+            raise ValidationError({'period': f"Choose one of: {', '.join(starts)}."})
+        return starts[period], today
+
+    @staticmethod
+    def _invoices(owner_id, start, end):
+        tz = timezone.get_current_timezone()
+        return Invoice.objects.filter(
+            owner_id=owner_id,
+            status='completed',
+            invoice_date__gte=datetime.combine(start, datetime.min.time(), tzinfo=tz),
+            invoice_date__lt=datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=tz),
+        )
+
+    @classmethod
+    def aggregate(cls, owner_id, start, end):
+        """{(product_id, day): totals} for the owner's completed sales between two dates."""
+        invoices = cls._invoices(owner_id, start, end)
+        lines = InvoiceItem.objects.filter(invoice__in=invoices, product__isnull=False).values(
+            'product_id', day=TruncDate('invoice__invoice_date'),
+        ).annotate(
+            units=Sum(F('quantity') - F('returned_quantity')),
+            revenue=Sum(net_share(F('line_total') - F('tax_amount'))),
+            invoices=Count('invoice_id', distinct=True),
+        ).order_by()
+        totals = {
+            (row['product_id'], row['day']): {
+                'quantity': row['units'] or 0, 'revenue': money(row['revenue']), 'cost': ZERO, 'invoices': row['invoices'],
+            }
+            for row in lines
+        }
+
+        # Sale movements carry the FIFO cost consumed; returns against the invoice give it back.
+        # Each movement takes its invoice's day from a correlated subquery, so no id list is built.
+        invoice_day = invoices.filter(pk=OuterRef('reference_id')).annotate(day=TruncDate('invoice_date')).values('day')[:1]
+        movements = InventoryMovement.objects.filter(
+            product__owner_id=owner_id, reference_type__in=['invoice', 'invoice_return'],
+        ).annotate(day=Subquery(invoice_day)).filter(day__isnull=False).values('product_id', 'day').annotate(
+            cost=Sum(ExpressionWrapper(-F('quantity') * Coalesce(F('unit_cost'), Value(ZERO)), output_field=DecimalField(max_digits=16, decimal_places=4)))
+        ).order_by()
+        for row in movements:
+            entry = totals.get((row['product_id'], row['day']))
+            if entry is not None:
+                entry['cost'] += money(row['cost'])
+        return totals
+
+    @classmethod
+    def refresh(cls, owner_id, start, end=None):
+        """Rebuild the owner's summary rows for every day in [start, end], a calendar month at a time."""
+        end = end or start
+        rows = 0
+        while start <= end:
+            next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            window_end = min(end, next_month - timedelta(days=1))
+            rows += cls._refresh_window(owner_id, start, window_end)
+            start = next_month
+        return rows
+
+    @classmethod
+    def _refresh_window(cls, owner_id, start, end):
+        totals = cls.aggregate(owner_id, start, end)
+        totals = {key: values for key, values in totals.items() if values['quantity']}
+        with transaction.atomic():
+            # Upsert rather than delete-and-insert so overlapping refreshes of a day cannot collide
+            existing = ProductSalesDaily.objects.filter(owner_id=owner_id, day__gte=start, day__lte=end)
+            ProductSalesDaily.objects.filter(pk__in=[
+                pk for pk, product_id, day in existing.values_list('pk', 'product_id', 'day') if (product_id, day) not in totals
+            ]).delete()
+            ProductSalesDaily.objects.bulk_create(
+                [
+                    ProductSalesDaily(owner_id=owner_id, product_id=product_id, day=day, **values)
+                    for (product_id, day), values in totals.items()
+                ],
+                update_conflicts=True, unique_fields=['owner', 'product', 'day'],
+                update_fields=['quantity', 'revenue', 'cost', 'invoices'],
+            )
+        return len(totals)
+
+    @classmethod
+    def schedule_refresh(cls, invoice):
+        """Re-summarise the invoice's day once the current transaction commits."""
+        if invoice.owner_id and invoice.invoice_date:
+            run_after_commit(cls.refresh, invoice.owner_id, timezone.localdate(invoice.invoice_date))
+
+    @classmethod
+    def ranking(cls, owner, start=None, end=None, by='quantity', limit=10):
+        """Top products in the window, ordered by `by` (quantity, revenue or margin)."""
+        if by not in cls.RANKINGS:
+            raise ValidationError({'by': f"Choose one of: {', '.join(cls.RANKINGS)}."})
+        rows = ProductSalesDaily.objects.all()
+        if owner:
+            rows = rows.filter(owner=owner)
+        if start:
+            rows = rows.filter(day__gte=start)
+        if end:
+            rows = rows.filter(day__lte=end)
+        rows = rows.values(
+            'product_id', name=F('product__name'), code=F('product__product_code'), stock=F('product__stock'),
+        ).annotate(
+            quantity_total=Sum('quantity'), revenue_total=Sum('revenue'), cost_total=Sum('cost'),
+            margin_total=Sum('revenue') - Sum('cost'), invoice_total=Sum('invoices'),
+        ).order_by(f'-{by}_total', 'product_id')[:limit]
+        return [
+            {
+                'product_id': row['product_id'], 'name': row['name'], 'code': row['code'], 'stock': row['stock'],
+                'quantity': row['quantity_total'], 'revenue': row['revenue_total'], 'cost': row['cost_total'],
+                'margin': row['margin_total'], 'invoices': row['invoice_total'],
+            }
+            for row in rows
+        ]
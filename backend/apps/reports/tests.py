@@ -0,0 +1,213 @@
+import json
+from datetime import datetime
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from apps.auth_app.models import User
+from apps.billing.models import Invoice, InvoiceItem, ProductSalesDaily
+from apps.customer.models import Customer
+from apps.product.models import Category, InventoryMovement, Product
+from .services import GSTReturnService
+
+
+class GSTReturnServiceTests(TestCase):
+    """Test GSTR-1 summaries built from invoice lines."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(phone='9000000060', password='test123', is_superuser=True)
+        category = Category.objects.create(name='Grocery')
+        self.milk = Product.objects.create(
+            product_code='MILK', name='Milk', category=category, unit_price=Decimal('50.00'),
+            tax_rate=Decimal('5.00'), hsn_code='0401', owner=self.owner
+        )
+        self.laptop = Product.objects.create(
+            product_code='LAP', name='Laptop', category=category, unit_price=Decimal('1000.00'),
+            tax_rate=Decimal('18.00'), hsn_code='8471', owner=self.owner
+        )
+        self.trader = Customer.objects.create(
+            phone='9333333333', name='Trader', gstin='29ABCDE1234F1Z5', owner=self.owner
+        )
+        billed_on = timezone.make_aware(datetime(2026, 9, 15, 10, 0))
+        self._invoice('B2B-1', self.trader, billed_on, igst=Decimal('180.00'), lines=[(self.laptop, 1, '1000.00', '18', '180.00')])
+        self._invoice('B2C-1', None, billed_on, igst=Decimal('0'), lines=[
+            (self.milk, 2, '50.00', '5', '5.00'), (self.laptop, 1, '1000.00', '18', '180.00'),
+        ])
+        self._invoice('B2C-OCT', None, timezone.make_aware(datetime(2026, 10, 1, 0, 30)), igst=Decimal('0'),
+                      lines=[(self.milk, 1, '50.00', '5', '2.50')])
+
+    def _invoice(self, number, customer, billed_on, igst, lines):
+        invoice = Invoice.objects.create(
+            invoice_number=number, customer=customer, owner=self.owner, status='completed', igst_amount=igst
+        )
+        Invoice.objects.filter(pk=invoice.pk).update(invoice_date=billed_on)
+        for product, quantity, price, rate, tax_amount in lines:
+            taxable = Decimal(price) * quantity
+            InvoiceItem.objects.create(
+                invoice=invoice, product=product, product_name=product.name, product_code=product.product_code,
+                quantity=quantity, unit_price=Decimal(price), tax_rate=Decimal(rate),
+                tax_amount=Decimal(tax_amount), line_total=taxable + Decimal(tax_amount)
+            )
+
+    def test_gstr1_sections_for_closed_month_are_cached(self):
+        """Test B2B/B2C/HSN grouping stays inside the month and is served from cache."""
+        report = GSTReturnService.get_gstr1(self.owner, '2026-09')
+
+        self.assertEqual([row['invoice_number'] for row in report['b2b']], ['B2B-1'])
+        self.assertEqual(report['b2b'][0]['igst_amount'], Decimal('180.00'))
+        self.assertEqual(report['b2b'][0]['gstin'], '29ABCDE1234F1Z5')
+        b2c = {row['tax_rate']: row for row in report['b2c']}
+        self.assertEqual(b2c[Decimal('5.00')]['taxable_value'], Decimal('100.00'))
+        self.assertEqual(b2c[Decimal('18.00')]['cgst_amount'], Decimal('90.00'))
+
+        hsn = {row['hsn_code']: row for row in report['hsn']}
+        self.assertEqual(hsn['8471']['quantity'], 2)
+        self.assertEqual(hsn['8471']['taxable_value'], Decimal('2000.00'))
+        self.assertEqual((hsn['8471']['cgst_amount'], hsn['8471']['igst_amount']), (Decimal('90.00'), Decimal('180.00')))
+        self.assertEqual(hsn['0401']['quantity'], 2)
+
+        with self.assertNumQueries(0):
+            self.assertEqual(GSTReturnService.get_gstr1(self.owner, '2026-09'), report)
+
+        csv_lines = ''.join(GSTReturnService.iter_csv(report)).splitlines()
+        self.assertEqual(len(csv_lines), 1 + len(report['b2b']) + len(report['b2c']) + len(report['hsn']))
+        self.assertEqual(len(json.loads(''.join(GSTReturnService.iter_json(report)))['hsn']), 2)
+
+    def test_returned_units_are_netted_out(self):
+        """Test a partial return lowers the reported supply while the invoice stays completed."""
+        InvoiceItem.objects.filter(invoice__invoice_number='B2C-1', product=self.milk).update(returned_quantity=1)
+        report = GSTReturnService.build(self.owner, datetime(2026, 9, 1).date(), datetime(2026, 10, 1).date())
+
+        b2c = {row['tax_rate']: row for row in report['b2c']}
+        self.assertEqual(b2c[Decimal('5.00')]['taxable_value'], Decimal('50.00'))
+        self.assertEqual(b2c[Decimal('5.00')]['tax_amount'], Decimal('2.50'))
+        hsn = {row['hsn_code']: row for row in report['hsn']}
+        self.assertEqual(hsn['0401']['quantity'], 1)
+
+
+class ProfitLossServiceTests(TestCase):
+    """Test FIFO-costed margins from the movement ledger."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000061', password='test123', is_superuser=True)
+        self.category = Category.objects.create(name='Dairy')
+        self.product = Product.objects.create(
+            product_code='GHEE', name='Ghee', category=self.category, unit_price=Decimal('100.00'),
+            cost_price=Decimal('90.00'), tax_rate=Decimal('5.00'), stock=10, owner=self.owner
+        )
+        from apps.product.models import InventoryBatch
+        InventoryBatch.objects.create(product=self.product, received_quantity=3, remaining_quantity=3, unit_cost=Decimal('60.00'))
+        InventoryBatch.objects.create(product=self.product, received_quantity=3, remaining_quantity=3, unit_cost=Decimal('70.00'))
+
+    def test_sale_consumes_batches_fifo_and_margins_come_from_ledger(self):
+        """Test each movement carries its batch cost and P&L uses only what was sold."""
+        from .services import ProfitLossService
+        first = Invoice.objects.create(invoice_number='PL-1', owner=self.owner, status='completed')
+        second = Invoice.objects.create(invoice_number='PL-2', owner=self.owner, status='completed')
+        self.product.deduct_stock(5, reference_id=first.id, reference_type='invoice', user=self.owner, unit_price=Decimal('100.00'))
+        self.product.deduct_stock(2, reference_id=second.id, reference_type='invoice', user=self.owner, unit_price=Decimal('100.00'))
+
+        costs = sorted(self.product.movements.values_list('quantity', 'unit_cost'))
+        self.assertEqual(costs, [(-3, Decimal('60.00')), (-2, Decimal('70.00')), (-1, Decimal('70.00')), (-1, Decimal('90.00'))])
+
+        with self.assertNumQueries(2):
+            report = ProfitLossService.get_profit_loss(self.owner, period='all', group_by='category')
+        self.assertEqual(report['net_sales'], Decimal('700.00'))
+        self.assertEqual(report['cost_of_goods'], Decimal('480.00'))
+        self.assertEqual(report['profit'], Decimal('220.00'))
+        self.assertEqual(report['breakdown'][0]['name'], 'Dairy')
+        self.assertEqual(report['breakdown'][0]['margin_percent'], Decimal('31.43'))
+
+    def test_draft_and_cancelled_invoices_stay_out_of_margins(self):
+        """Test stock moved by drafts and cancelled bills is not counted as sold."""
+        from .services import ProfitLossService
+        completed = Invoice.objects.create(invoice_number='PL-3', owner=self.owner, status='completed')
+        draft = Invoice.objects.create(invoice_number='PL-4', owner=self.owner, status='draft')
+        cancelled = Invoice.objects.create(invoice_number='PL-5', owner=self.owner, status='cancelled')
+        for invoice in (completed, draft, cancelled):
+            self.product.deduct_stock(1, reference_id=invoice.id, reference_type='invoice', user=self.owner, unit_price=Decimal('100.00'))
+
+        report = ProfitLossService.get_profit_loss(self.owner, period='all')
+        self.assertEqual(report['net_sales'], Decimal('100.00'))
+        self.assertEqual(report['cost_of_goods'], Decimal('60.00'))
+
+
+class ProductSalesServiceTests(TestCase):
+    """Test the daily product sales summary and rankings read from it."""
+
+    def setUp(self):
+        self.owner = User.objects.create_user(phone='9000000062', password='test123', is_superuser=True)
+        category = Category.objects.create(name='Snacks')
+        self.chips = Product.objects.create(
+            product_code='CHIPS', name='Chips', category=category, unit_price=Decimal('20.00'),
+            cost_price=Decimal('12.00'), tax_rate=Decimal('5.00'), stock=100, owner=self.owner
+        )
+        self.cola = Product.objects.create(
+            product_code='COLA', name='Cola', category=category, unit_price=Decimal('40.00'),
+            cost_price=Decimal('10.00'), tax_rate=Decimal('5.00'), stock=100, owner=self.owner
+        )
+        self.today = timezone.localdate()
+        self._sell('S1', [(self.chips, 10, '20.00')])
+        self._sell('S2', [(self.chips, 5, '20.00'), (self.cola, 4, '40.00')], returned={self.cola: 1})
+        Invoice.objects.create(invoice_number='DRAFT', owner=self.owner, status='draft')
+
+    def _sell(self, number, lines, returned=None):
+        returned = returned or {}
+        invoice = Invoice.objects.create(invoice_number=number, owner=self.owner, status='completed')
+        for product, quantity, price in lines:
+            taxable = Decimal(price) * quantity
+            InvoiceItem.objects.create(
+                invoice=invoice, product=product, product_name=product.name, product_code=product.product_code,
+                quantity=quantity, returned_quantity=returned.get(product, 0), unit_price=Decimal(price),
+                tax_rate=Decimal('5.00'), tax_amount=taxable * Decimal('0.05'), line_total=taxable * Decimal('1.05')
+            )
+            product.deduct_stock(quantity, reference_id=invoice.id, reference_type='invoice', user=self.owner, unit_price=Decimal(price))
+            if product in returned:
+                InventoryMovement.objects.create(
+                    product=product, change_type='return', quantity=returned[product], unit_cost=product.cost_price,
+                    unit_price=Decimal(price), reference_id=invoice.id, reference_type='invoice_return'
+                )
+
+    def test_rankings_are_served_from_the_daily_summary(self):
+        from .services import ProductSalesService
+        ProductSalesService.refresh(self.owner.id, self.today)
+        self.assertEqual(ProductSalesDaily.objects.filter(owner=self.owner).count(), 2)
+
+        with self.assertNumQueries(1):
+            by_quantity = ProductSalesService.ranking(self.owner, self.today, self.today, by='quantity')
+        self.assertEqual([(row['code'], row['quantity'], row['invoices']) for row in by_quantity], [('CHIPS', 15, 2), ('COLA', 3, 1)])
+
+        by_margin = ProductSalesService.ranking(self.owner, self.today, self.today, by='margin')
+        self.assertEqual([(row['code'], row['revenue'], row['margin']) for row in by_margin],
+                         [('CHIPS', Decimal('300.00'), Decimal('120.00')), ('COLA', Decimal('120.00'), Decimal('90.00'))])
+
+        # A refresh after cancelling replaces the day's rows
+        Invoice.objects.filter(invoice_number='S2').update(status='cancelled')
+        ProductSalesService.refresh(self.owner.id, self.today)
+        self.assertEqual([row['quantity'] for row in ProductSalesService.ranking(self.owner, by='revenue')], [10])
+
+    def test_long_refresh_runs_month_by_month(self):
+        """Test a multi-month refresh summarises each invoice on its own day with its FIFO cost."""
+        from datetime import timedelta
+        from .services import ProductSalesService
+        earlier = timezone.now() - timedelta(days=70)
+        Invoice.objects.filter(invoice_number='S1').update(invoice_date=earlier)
+
+        self.assertEqual(ProductSalesService.refresh(self.owner.id, self.today - timedelta(days=90), self.today), 3)
+        chips = {
+            row.day: (row.quantity, row.cost)
+            for row in ProductSalesDaily.objects.filter(owner=self.owner, product=self.chips)
+        }
+        self.assertEqual(chips, {
+            timezone.localdate(earlier): (10, Decimal('120.00')), self.today: (5, Decimal('60.00')),
+        })
+
+    def test_refresh_overwrites_rows_written_concurrently(self):
+        """Test a refresh upserts over a row another refresh already inserted for the day."""
+        from .services import ProductSalesService
+        ProductSalesDaily.objects.create(owner=self.owner, product=self.chips, day=self.today, quantity=1, revenue=Decimal('1.00'))
+        ProductSalesService.refresh(self.owner.id, self.today)
+
+        chips = ProductSalesDaily.objects.get(owner=self.owner, product=self.chips, day=self.today)
+        self.assertEqual((chips.quantity, chips.revenue, chips.invoices), (15, Decimal('300.00'), 2))
@@ -3,6 +3,7 @@ from .views import (
     SalesReportView,
     InventoryReportView,
     TaxReportView,
+    GSTR1ReportView,
     ProfitLossReportView,
     ExportReportView
 )
@@ -11,6 +12,7 @@ urlpatterns = [
     path('sales/', SalesReportView.as_view(), name='sales-report'),
     path('inventory/', InventoryReportView.as_view(), name='inventory-report'),
     path('tax/', TaxReportView.as_view(), name='tax-report'),
+    path('gstr1/', GSTR1ReportView.as_view(), name='gstr1-report'),
     path('profit-loss/', ProfitLossReportView.as_view(), name='profit-loss-report'),
     path('export/', ExportReportView.as_view(), name='export-report'),
 ]
@@ -9,10 +9,10 @@ from apps.auth_app.permissions import IsAuthenticated
 from apps.billing.models import Invoice, InvoiceItem
 from apps.product.models import Product, InventoryBatch
 from apps.customer.models import Customer
-from apps.purchase.models import PurchaseOrder, PurchaseOrderItem
 from decimal import Decimal
 import csv
-from django.http import HttpResponse
+from django.http import HttpResponse, StreamingHttpResponse
+from .services import GSTReturnService, ProductSalesService, ProfitLossService
 
 class SalesReportView(APIView):
     """Sales report."""
@@ -75,22 +75,18 @@ class SalesReportView(APIView):
             'pending_amount': total_sales - cash_received
         }
         
-        # Get top products
-        item_query = InvoiceItem.objects.filter(
-            invoice__status='completed'
-        )
-        if owner:
-            item_query = item_query.filter(invoice__owner=owner)
-            
-        top_products = item_query.values('product_name').annotate(
-            qty=Sum('quantity'),
-            total=Sum('line_total')
-        ).order_by('-qty')[:10]
+        # Top products for the same window, read from the daily product sales summary
+        window_start, window_end = ProductSalesService.period_window(period, start_date, end_date)
+        top_products = [
+            {'product_id': row['product_id'], 'product_name': row['name'], 'qty': row['quantity'],
+             'total': row['revenue'], 'margin': row['margin']}
+            for row in ProductSalesService.ranking(owner, window_start, window_end, by=request.query_params.get('by', 'quantity'))
+        ]
         
         return Response({
             'period': period,
             'aggregates': aggregates,
-            'top_products': list(top_products)
+            'top_products': top_products
         })
 
 class InventoryReportView(APIView):
@@ -178,70 +174,52 @@ class TaxReportView(APIView):
             total_tax=Sum('cgst_amount') + Sum('sgst_amount') + Sum('igst_amount'),
             total_sales=Sum('total_amount')
         )
-        
+
+        hsn_summary = GSTReturnService.hsn(
+            GSTReturnService.annotate_lines(InvoiceItem.objects.filter(invoice__in=query))
+        )
+
         return Response({
             'period': period,
-            'tax_data': aggregates
+            'tax_data': aggregates,
+            'hsn_summary': hsn_summary,
         })
 
+class GSTR1ReportView(APIView):
+    """GSTR-1 B2B/B2C/HSN summaries for a month, streamed as JSON or CSV."""
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        try:
+            report = GSTReturnService.get_gstr1(request.user, request.query_params.get('period'))
+        except Exception as e:
+            return Response({'detail': str(e)}, status=getattr(e, 'status_code', 400))
+
+        if request.query_params.get('export') == 'csv':
+            response = StreamingHttpResponse(GSTReturnService.iter_csv(report), content_type='text/csv')
+            response['Content-Disposition'] = f'attachment; filename="gstr1_{report["period"]}.csv"'
+            return response
+        return StreamingHttpResponse(GSTReturnService.iter_json(report), content_type='application/json')
+
 class ProfitLossReportView(APIView):
     """Profit & Loss report."""
     permission_classes = [IsAuthenticated]
 
     def get(self, request):
-        """Get P&L report."""
-        if not request.user.is_superuser:
-             from apps.users.utils import has_permission
-             if not has_permission(request.user, 'view_reports'):
-                 from rest_framework.exceptions import PermissionDenied
-                 raise PermissionDenied("You do not have permission to view reports.")
+        """Get P&L report; `group_by=product|category` adds a margin breakdown."""
+        try:
+            report = ProfitLossService.get_profit_loss(
+                request.user,
+                period=request.query_params.get('period', 'month'),
+                group_by=request.query_params.get('group_by'),
+            )
+        except Exception as e:
+            return Response({'detail': str(e)}, status=getattr(e, 'status_code', 400))
 
-        period = request.query_params.get('period', 'month')
-        
-        from apps.common.helpers import get_user_owner
-        owner = get_user_owner(request.user)
-        
-        # Sales
-        sales_query = Invoice.objects.filter(status='completed')
-        purchase_query = PurchaseOrder.objects.filter(status='received')
-        
-        if owner:
-            sales_query = sales_query.filter(owner=owner)
-            purchase_query = purchase_query.filter(owner=owner)
-        
-        if period == 'month':
-            start = timezone.now().date().replace(day=1)
-            sales_query = sales_query.filter(invoice_date__date__gte=start)
-            purchase_query = purchase_query.filter(order_date__date__gte=start)
-        
-        sales = sales_query.aggregate(total=Sum('total_amount'))['total'] or 0
-        discount = sales_query.aggregate(total=Sum('discount_amount'))['total'] or 0
-        tax = sales_query.aggregate(
-            total=Sum('cgst_amount') + Sum('sgst_amount') + Sum('igst_amount')
-        )['total'] or 0
-        
-        # Cost
-        item_query = PurchaseOrderItem.objects.filter(
-            purchase_order__status='received'
-        )
-        if owner:
-            item_query = item_query.filter(purchase_order__owner=owner)
-            
-        cost_of_goods = item_query.aggregate(
-            total=Sum(F('quantity') * F('unit_price'), output_field=DecimalField())
-        )['total'] or 0
-        
-        profit = (sales - discount) - cost_of_goods
-        
-        return Response({
-            'period': period,
-            'sales': float(sales),
-            'discount': float(discount),
-            'tax': float(tax),
-            'cost_of_goods': float(cost_of_goods),
-            'profit': float(profit),
-            'profit_margin': float((profit / sales * 100) if sales > 0 else 0)
-        })
+        for key, value in report.items():
+            if isinstance(value, Decimal):
+                report[key] = float(value)
+        return Response(report)
 
 class ExportReportView(APIView):
     """Export report to CSV."""
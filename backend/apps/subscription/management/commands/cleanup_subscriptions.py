@@ -1,59 +1,67 @@
+"""
+Expire subscriptions past their grace period and move expired Free Trials onto
+the Basic plan, then notify Super Admin and the affected owners.
+Both status changes are single set-based UPDATEs (see SubscriptionStateService).
+
+Usage:
+    python manage.py cleanup_subscriptions
+    python manage.py cleanup_subscriptions --skip-upgrades
+
+Cron (hourly):
+    0 * * * * python manage.py cleanup_subscriptions >> logs/subscriptions.log 2>&1
+"""
+
+from django.core.mail import send_mass_mail
 from django.core.management.base import BaseCommand
 from django.utils import timezone
-from django.core.mail import send_mail
-from apps.subscription.models import UserSubscription
+from apps.subscription.services import SubscriptionStateService
 from apps.super_admin.models import SystemNotification
 
 class Command(BaseCommand):
     help = "Checks for expired subscriptions and updates their status. Notifies Super Admin and Owner."
 
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-upgrades', action='store_true', help='Only expire; do not upgrade expired trials')
+
     def handle(self, *args, **options):
         now = timezone.now()
-        
-        # 1. Process Expired Subscriptions
-        expired_subs = UserSubscription.objects.filter(
-            status="ACTIVE",
-            end_date__lt=now
-        )
-        
-        count = expired_subs.count()
-        if count > 0:
-            self.stdout.write(self.style.SUCCESS(f"Found {count} expired subscriptions."))
-            
-            for sub in expired_subs:
-                # Update status
-                sub.status = "EXPIRED"
-                sub.save()
-                
-                # 2. Create notification for Super Admin
-                try:
-                    SystemNotification.objects.create(
+        if options.get('skip_upgrades'):
+            result = {'expired': SubscriptionStateService.expire_lapsed(now), 'upgraded': []}
+        else:
+            result = SubscriptionStateService.sweep(now=now)
+
+        expired = result['expired']
+        if expired:
+            try:
+                SystemNotification.objects.bulk_create([
+                    SystemNotification(
                         title="Plan Expired",
-                        message=f"Subscription for {sub.user.first_name or sub.user.phone} ({sub.plan.name}) has expired.",
+                        message=f"Subscription for {row['user__first_name'] or row['user__phone']} ({row['plan__name']}) has expired.",
                         severity="WARNING",
-                        related_user=sub.user
+                        related_user_id=row['user_id']
                     )
-                except Exception as e:
-                    self.stderr.write(f"Failed to create Super Admin notification: {str(e)}")
-                
-                # 3. Notify Owner via Email
-                if sub.user.email:
-                    try:
-                        send_mail(
-                            subject="Your Geo Billing Subscription Has Exired",
-                            message=(
-                                f"Hello {sub.user.first_name or 'there'},\n\n"
-                                f"Your subscription for {sub.plan.name} has expired on {sub.end_date.strftime('%Y-%m-%d')}.\n\n"
-                                "Please upgrade your plan to continue using the system (POS, Reports, Inventory, etc.).\n\n"
-                                "Thank you,\nGeo Billing Team"
-                            ),
-                            from_email=None,
-                            recipient_list=[sub.user.email],
-                            fail_silently=True
-                        )
-                    except Exception as e:
-                        self.stderr.write(f"Failed to send email to {sub.user.email}: {str(e)}")
-                
-            self.stdout.write(self.style.SUCCESS(f"Successfully processed {count} subscriptions."))
+                    for row in expired
+                ])
+            except Exception as e:
+                self.stderr.write(f"Failed to create Super Admin notifications: {str(e)}")
+
+            messages = [
+                (
+                    "Your Geo Billing Subscription Has Exired",
+                    f"Hello {row['user__first_name'] or 'there'},\n\n"
+                    f"Your subscription for {row['plan__name']} has expired on {row['end_date'].strftime('%Y-%m-%d')}.\n\n"
+                    "Please upgrade your plan to continue using the system (POS, Reports, Inventory, etc.).\n\n"
+                    "Thank you,\nGeo Billing Team",
+                    None,
+                    [row['user__email']],
+                )
+                for row in expired if row['user__email']
+            ]
+            if messages:
+                send_mass_mail(messages, fail_silently=True)
+            self.stdout.write(self.style.SUCCESS(f"Successfully processed {len(expired)} expired subscriptions."))
         else:
             self.stdout.write("No newly expired subscriptions found.")
+
+        for user in result['upgraded']:
+            self.stdout.write(self.style.SUCCESS(f"✓ Upgraded {user['phone']} ({user['name']}) to {user['new_plan']}"))
@@ -0,0 +1,36 @@
+"""
+Rebuild the per-owner quota usage counters from the source tables.
+The counters are kept current on every create/delete; this catches rows changed
+outside those paths (admin edits, staff deactivation, raw SQL) and rolls the
+monthly invoice count over for owners who have not billed yet this month.
+
+Usage:
+    python manage.py reconcile_quota_usage
+    python manage.py reconcile_quota_usage --owner-id 12
+
+Cron (nightly):
+    30 0 * * * python manage.py reconcile_quota_usage >> logs/quota_usage.log 2>&1
+"""
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from apps.subscription.models import QuotaUsage
+
+User = get_user_model()
+
+class Command(BaseCommand):
+    help = "Recount invoices, products, customers and staff used by each owner against their plan"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--owner-id', type=int, help='Only recount this owner')
+
+    def handle(self, *args, **options):
+        owner_id = options.get('owner_id')
+        if owner_id:
+            if not User.objects.filter(pk=owner_id).exists():
+                raise CommandError(f"Owner {owner_id} not found")
+            QuotaUsage.recount(owner_id)
+            count = 1
+        else:
+            count = QuotaUsage.recount_all()
+        self.stdout.write(self.style.SUCCESS(f"✓ Quota usage reconciled for {count} owners"))
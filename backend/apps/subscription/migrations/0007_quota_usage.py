@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 10:49
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('subscription', '0006_subscriptionplan_customer_limit_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QuotaUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoices', models.IntegerField(default=0)),
+                ('invoice_month', models.DateField(blank=True, null=True)),
+                ('products', models.IntegerField(default=0)),
+                ('customers', models.IntegerField(default=0)),
+                ('staff', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('owner', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='quota_usage', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -1,7 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from apps.auth_app.models import User
-from datetime import timedelta
+from datetime import datetime, timedelta
 
 class SubscriptionPlan(models.Model):
     """Subscription Plan definitions"""
@@ -58,3 +58,134 @@ class UserSubscription(models.Model):
         if not self.end_date and self.plan:
             self.end_date = self.start_date + timedelta(days=self.plan.duration_days)
         super().save(*args, **kwargs)
+
+
+class QuotaUsage(models.Model):
+    """
+    Per-owner usage of the plan-limited resources, adjusted by one conditional
+    UPDATE on every create/delete so quota checks never COUNT the source tables.
+    `invoices` counts the bills of `invoice_month` only. Rebuilt periodically by
+    `reconcile_quota_usage` in case rows changed outside the service paths.
+    """
+    FIELDS = ('invoices', 'products', 'customers', 'staff')
+
+    owner = models.OneToOneField(User, on_delete=models.CASCADE, related_name="quota_usage")
+    invoices = models.IntegerField(default=0)
+    invoice_month = models.DateField(null=True, blank=True)
+    products = models.IntegerField(default=0)
+    customers = models.IntegerField(default=0)
+    staff = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Quota usage (owner {self.owner_id})"
+
+    @staticmethod
+    def current_month():
+        return timezone.localdate().replace(day=1)
+
+    @staticmethod
+    def _querysets(month):
+        from apps.billing.models import Invoice
+        from apps.customer.models import Customer
+        from apps.product.models import Product
+        month_start = timezone.make_aware(datetime.combine(month, datetime.min.time()))
+        return {
+            'invoices': Invoice.objects.filter(invoice_date__gte=month_start),
+            'products': Product.objects.all(),
+            'customers': Customer.objects.all(),
+            'staff': User.objects.filter(parent__isnull=False, is_active=True),
+        }
+
+    @staticmethod
+    def _owner_lookup(field):
+        return 'parent_id' if field == 'staff' else 'owner_id'
+
+    @classmethod
+    def recount(cls, owner_id):
+        """Recompute one owner's usage from the source tables (self-healing)."""
+        month = cls.current_month()
+        counts = {
+            field: queryset.filter(**{cls._owner_lookup(field): owner_id}).count()
+            for field, queryset in cls._querysets(month).items()
+        }
+        usage, _ = cls.objects.update_or_create(owner_id=owner_id, defaults=dict(counts, invoice_month=month))
+        return usage
+
+    @classmethod
+    def recount_all(cls):
+        """Rebuild every owner's usage with one grouped query per resource."""
+        month = cls.current_month()
+        counts = {}
+        for field, queryset in cls._querysets(month).items():
+            lookup = cls._owner_lookup(field)
+            grouped = queryset.filter(**{f'{lookup}__isnull': False}).values(lookup).annotate(
+                total=models.Count('id')
+            ).values_list(lookup, 'total')
+            for owner_id, total in grouped:
+                counts.setdefault(owner_id, dict.fromkeys(cls.FIELDS, 0))[field] = total
+
+        rows = list(cls.objects.all())
+        for usage in rows:
+            values = counts.pop(usage.owner_id, dict.fromkeys(cls.FIELDS, 0))
+            for field in cls.FIELDS:
+                setattr(usage, field, values[field])
+            usage.invoice_month = month
+        cls.objects.bulk_update(rows, list(cls.FIELDS) + ['invoice_month'])
+        owner_ids = set(User.objects.filter(pk__in=list(counts)).values_list('pk', flat=True))
+        cls.objects.bulk_create(
+            [cls(owner_id=owner_id, invoice_month=month, **values) for owner_id, values in counts.items() if owner_id in owner_ids],
+            ignore_conflicts=True
+        )
+        return len(rows) + len(owner_ids)
+
+    @classmethod
+    def _current(cls, owner_id, field):
+        queryset = cls.objects.filter(owner_id=owner_id)
+        if field == 'invoices':
+            queryset = queryset.filter(invoice_month=cls.current_month())
+        return queryset
+
+    @classmethod
+    def take(cls, owner_id, field, limit=None):
+        """
+        Count one more `field` unless that would pass `limit` (None = unlimited).
+        Returns the usage row's value before the increment when refused, else None.
+        """
+        queryset = cls._current(owner_id, field)
+        if limit is not None:
+            queryset = queryset.filter(**{f'{field}__lt': limit})
+        if queryset.update(**{field: models.F(field) + 1, 'updated_at': timezone.now()}):
+            return None
+
+        # Refused, missing, or a new month: settle against the source tables once
+        usage = cls.recount(owner_id)
+        current = getattr(usage, field)
+        if limit is not None and current >= limit:
+            return current
+        cls.objects.filter(pk=usage.pk).update(**{field: models.F(field) + 1, 'updated_at': timezone.now()})
+        return None
+
+    @classmethod
+    def release(cls, owner_id, field, month=None):
+        """Give back one unit; invoices only count against the month they were billed in."""
+        if not owner_id or (field == 'invoices' and month != cls.current_month()):
+            return
+        cls._current(owner_id, field).filter(**{f'{field}__gt': 0}).update(
+            **{field: models.F(field) - 1, 'updated_at': timezone.now()}
+        )
+
+    @classmethod
+    def take_many(cls, owner_id, field, count, limit=None):
+        """Count up to `count` more `field` (bulk imports) without passing `limit`; returns how many were granted."""
+        if count <= 0:
+            return 0
+        with transaction.atomic():
+            usage = cls._current(owner_id, field).select_for_update().first()
+            if usage is None:
+                cls.recount(owner_id)
+                usage = cls._current(owner_id, field).select_for_update().get()
+            granted = count if limit is None else max(0, min(count, limit - getattr(usage, field)))
+            if granted:
+                cls.objects.filter(pk=usage.pk).update(**{field: models.F(field) + granted, 'updated_at': timezone.now()})
+        return granted
@@ -0,0 +1,119 @@
+"""
+Plan quota enforcement.
+
+A plan's limits are free-text strings ("100", "Unlimited"); they are parsed once
+per owner into an entitlements dict and cached under a per-owner version that
+the subscription signals bump (plus a global plan version for plan edits). The
+cached dict carries the subscription's end date, so a lapsed plan is noticed
+without another query. The versions only reach every worker through a shared
+cache backend (see CACHES in settings).
+
+Usage lives in `QuotaUsage` and is moved by one conditional UPDATE per create
+(`reserve`) or delete (`release`), so a create path checks its quota without
+counting any table. Bulk imports reserve a whole chunk at once (`reserve_many`)
+and reject the rows past the limit. Owners without an active plan are only limited on staff,
+matching `User.get_max_staff_allowed`; Super Admins are never limited.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import QuotaUsage
+
+PLANS_VERSION_KEY = "quota_plans_version"
+OWNER_VERSION_KEY = "quota_entitlements_version:{owner_id}"
+ENTITLEMENTS_CACHE_KEY = "quota_entitlements:{owner_id}:{plans_version}:{version}"
+
+LABELS = {'invoices': 'monthly invoice', 'products': 'product', 'customers': 'customer'}
+UNLIMITED = dict.fromkeys(QuotaUsage.FIELDS)
+NO_PLAN = dict(UNLIMITED, staff=0)
+
+
+def parse_limit(value):
+    """'100' -> 100; 'Unlimited', 'Multiple' or anything non-numeric -> None."""
+    try:
+        limit = int(str(value).strip())
+    except (TypeError, ValueError):
+        return None
+    return limit if limit >= 0 else None
+
+
+def _version(key):
+    return cache.get_or_set(key, 1, None)
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, None)
+
+
+def invalidate_owner(owner_id):
+    _bump(OWNER_VERSION_KEY.format(owner_id=owner_id))
+
+
+def invalidate_plans():
+    _bump(PLANS_VERSION_KEY)
+
+
+def _load(owner_id):
+    from .models import UserSubscription
+    subscription = UserSubscription.objects.filter(user_id=owner_id, status='ACTIVE').select_related('plan').first()
+    if subscription is None:
+        return {'expires_at': None, 'limits': NO_PLAN}
+    plan = subscription.plan
+    return {
+        'expires_at': subscription.end_date,
+        'limits': {
+            'invoices': parse_limit(plan.invoice_limit),
+            'products': parse_limit(plan.product_limit),
+            'customers': parse_limit(plan.customer_limit),
+            # 0 means unlimited for staff
+            'staff': plan.max_staff_users or None,
+        },
+    }
+
+
+def entitlements(owner):
+    """{resource: limit or None} for the owner's current plan."""
+    if owner is None or owner.is_super_admin:
+        return UNLIMITED
+    key = ENTITLEMENTS_CACHE_KEY.format(
+        owner_id=owner.id,
+        plans_version=_version(PLANS_VERSION_KEY),
+        version=_version(OWNER_VERSION_KEY.format(owner_id=owner.id)),
+    )
+    cached = cache.get(key)
+    if cached is None:
+        cached = _load(owner.id)
+        cache.set(key, cached, getattr(settings, 'QUOTA_CACHE_TIMEOUT', 60 * 60))
+    if cached['expires_at'] is not None and cached['expires_at'] <= timezone.now():
+        return NO_PLAN
+    return cached['limits']
+
+
+def limit_message(resource, limit):
+    if resource == 'staff':
+        if limit == 0:
+            return "You must subscribe to a plan to add team members."
+        return f"You have reached the maximum number of staff members ({limit}) allowed for your current plan. Please upgrade to add more staff."
+    return f"You have reached the {LABELS[resource]} limit ({limit}) allowed for your current plan. Please upgrade to add more."
+
+
+def reserve_many(owner, resource, count):
+    """Count up to `count` new `resource` rows (bulk imports); returns how many the plan allows."""
+    if owner is None:
+        return count
+    return QuotaUsage.take_many(owner.id, resource, count, entitlements(owner)[resource])
+
+
+def reserve(owner, resource):
+    """Count one new `resource` for the owner, or raise if the plan has none left."""
+    if owner is None:
+        return
+    limit = entitlements(owner)[resource]
+    if QuotaUsage.take(owner.id, resource, limit) is None:
+        return
+    raise ValidationError({"detail": limit_message(resource, limit)})
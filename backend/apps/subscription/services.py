@@ -1,5 +1,9 @@
 from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
 from django.utils import timezone
+from . import quotas
+from .models import UserSubscription
 from .repositories import SubscriptionRepository
 from .serializers import UserSubscriptionSerializer
 import logging
@@ -37,31 +41,9 @@ class SubscriptionService:
         if not free_trial_plan or not basic_plan:
             return None, "Required subscription plans (FREE or BASIC) not found"
 
-        expired_trials = SubscriptionRepository.get_expired_trials('FREE')
-        
-        upgraded_count = 0
-        upgraded_users = []
-        
-        for subscription in expired_trials:
-            try:
-                subscription.plan = basic_plan
-                subscription.status = 'ACTIVE'
-                subscription.start_date = timezone.now()
-                subscription.end_date = timezone.now() + timedelta(days=basic_plan.duration_days)
-                subscription.auto_renew = False
-                subscription.save()
-
-                upgraded_count += 1
-                upgraded_users.append({
-                    'phone': subscription.user.phone,
-                    'name': f"{subscription.user.first_name} {subscription.user.last_name}".strip(),
-                    'new_plan': basic_plan.name
-                })
-            except Exception as e:
-                logger.error(f"Failed to auto-upgrade user {subscription.user.phone}: {str(e)}")
-
+        upgraded_users = SubscriptionStateService.upgrade_expired_trials(free_trial_plan, basic_plan)
         return {
-            'upgraded_count': upgraded_count,
+            'upgraded_count': len(upgraded_users),
             'upgraded_users': upgraded_users
         }, None
 
@@ -123,3 +105,110 @@ class SubscriptionService:
         subscription.save()
             
         return UserSubscriptionSerializer(subscription).data, None
+
+
+class SubscriptionStateService:
+    """
+    Cached subscription status per owner and the set-based expiry/upgrade sweep.
+
+    Logins only need an owner's status and end date, so those are cached per owner
+    and dropped whenever the subscription row is written (signals here, explicit
+    invalidation after the sweep's bulk updates). Access continues for
+    `SystemSettings.grace_period_days` after the end date; the sweep then marks
+    the subscription EXPIRED. Invalidation relies on the shared cache configured
+    in settings, so a renewal is seen by every worker at once.
+    """
+    STATE_KEY = "subscription_state:{owner_id}"
+    GRACE_KEY = "subscription_grace_days"
+    NO_SUBSCRIPTION = {'status': None, 'end_date': None, 'plan_code': None}
+
+    @staticmethod
+    def _timeout():
+        return getattr(settings, 'SUBSCRIPTION_STATE_CACHE_TIMEOUT', 60 * 60)
+
+    @classmethod
+    def get_state(cls, owner_id):
+        key = cls.STATE_KEY.format(owner_id=owner_id)
+        state = cache.get(key)
+        if state is None:
+            row = UserSubscription.objects.filter(user_id=owner_id).values('status', 'end_date', 'plan__code').first()
+            state = cls.NO_SUBSCRIPTION if row is None else {
+                'status': row['status'], 'end_date': row['end_date'], 'plan_code': row['plan__code'],
+            }
+            cache.set(key, state, cls._timeout())
+        return state
+
+    @classmethod
+    def grace_period(cls):
+        days = cache.get(cls.GRACE_KEY)
+        if days is None:
+            from apps.super_admin.models import SystemSettings
+            days = SystemSettings.objects.values_list('grace_period_days', flat=True).first() or 0
+            cache.set(cls.GRACE_KEY, days, cls._timeout())
+        return timedelta(days=days)
+
+    @classmethod
+    def has_access(cls, owner, now=None):
+        """True while the owner's plan is ACTIVE and not past its end date plus the grace period."""
+        if owner.is_super_admin:
+            return True
+        state = cls.get_state(owner.id)
+        if state['status'] != 'ACTIVE':
+            return False
+        return (now or timezone.now()) < state['end_date'] + cls.grace_period()
+
+    @classmethod
+    def invalidate(cls, owner_ids):
+        owner_ids = list(owner_ids)
+        cache.delete_many([cls.STATE_KEY.format(owner_id=owner_id) for owner_id in owner_ids])
+        for owner_id in owner_ids:
+            quotas.invalidate_owner(owner_id)
+
+    @classmethod
+    def invalidate_grace_period(cls):
+        cache.delete(cls.GRACE_KEY)
+
+    @classmethod
+    def expire_lapsed(cls, now=None):
+        """Mark every ACTIVE subscription past its grace period EXPIRED in one UPDATE; returns the rows."""
+        now = now or timezone.now()
+        lapsed = UserSubscription.objects.filter(status='ACTIVE', end_date__lt=now - cls.grace_period())
+        rows = list(lapsed.values(
+            'id', 'user_id', 'end_date', 'plan__name', 'user__phone', 'user__first_name', 'user__email'
+        ))
+        if rows:
+            UserSubscription.objects.filter(id__in=[row['id'] for row in rows]).update(status='EXPIRED', updated_at=now)
+            cls.invalidate(row['user_id'] for row in rows)
+        return rows
+
+    @classmethod
+    def upgrade_expired_trials(cls, trial_plan, upgrade_plan, now=None):
+        """Move every expired trial onto `upgrade_plan` with one UPDATE; returns the upgraded users."""
+        now = now or timezone.now()
+        trials = SubscriptionRepository.get_expired_trials(trial_plan.code, cutoff_date=now)
+        rows = list(trials.values('id', 'user_id', 'user__phone', 'user__first_name', 'user__last_name'))
+        if rows:
+            UserSubscription.objects.filter(id__in=[row['id'] for row in rows]).update(
+                plan=upgrade_plan,
+                status='ACTIVE',
+                start_date=now,
+                end_date=now + timedelta(days=upgrade_plan.duration_days),
+                auto_renew=False,
+                updated_at=now,
+            )
+            cls.invalidate(row['user_id'] for row in rows)
+        return [{
+            'phone': row['user__phone'],
+            'name': f"{row['user__first_name']} {row['user__last_name']}".strip(),
+            'new_plan': upgrade_plan.name
+        } for row in rows]
+
+    @classmethod
+    def sweep(cls, trial_plan_code='FREE', upgrade_plan_code='BASIC', now=None):
+        """Expire lapsed subscriptions, then upgrade expired trials (when both plans exist)."""
+        now = now or timezone.now()
+        expired = cls.expire_lapsed(now)
+        trial_plan = SubscriptionRepository.get_plan_by_code(trial_plan_code)
+        upgrade_plan = SubscriptionRepository.get_plan_by_code(upgrade_plan_code)
+        upgraded = cls.upgrade_expired_trials(trial_plan, upgrade_plan, now) if trial_plan and upgrade_plan else []
+        return {'expired': expired, 'upgraded': upgraded}
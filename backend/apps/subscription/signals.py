@@ -0,0 +1,60 @@
+"""
+Keeps quota entitlements and usage counters in step with their source rows.
+
+Subscription and plan writes drop the cached entitlements, login status and
+platform metrics, and System Settings writes the cached grace period; deleting an invoice,
+product, customer or active staff member gives its unit back to the owner.
+Creates are counted by `quotas.reserve` on the service paths instead.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from apps.auth_app.models import User
+from apps.billing.models import Invoice
+from apps.customer.models import Customer
+from apps.product.models import Product
+from apps.super_admin.models import SystemSettings
+from apps.super_admin.services import PlatformMetricsService
+from . import quotas
+from .models import QuotaUsage, SubscriptionPlan, UserSubscription
+from .services import SubscriptionStateService
+
+
+@receiver([post_save, post_delete], sender=UserSubscription)
+def invalidate_owner_subscription(sender, instance, **kwargs):
+    SubscriptionStateService.invalidate([instance.user_id])
+    PlatformMetricsService.invalidate()
+
+
+@receiver([post_save, post_delete], sender=SubscriptionPlan)
+def invalidate_plan_entitlements(sender, **kwargs):
+    quotas.invalidate_plans()
+    PlatformMetricsService.invalidate()
+
+
+@receiver(post_save, sender=SystemSettings)
+def invalidate_grace_period(sender, **kwargs):
+    SubscriptionStateService.invalidate_grace_period()
+
+
+@receiver(post_delete, sender=Invoice)
+def release_invoice_quota(sender, instance, **kwargs):
+    billed_on = instance.invoice_date and timezone.localdate(instance.invoice_date).replace(day=1)
+    QuotaUsage.release(instance.owner_id, 'invoices', month=billed_on)
+
+
+@receiver(post_delete, sender=Product)
+def release_product_quota(sender, instance, **kwargs):
+    QuotaUsage.release(instance.owner_id, 'products')
+
+
+@receiver(post_delete, sender=Customer)
+def release_customer_quota(sender, instance, **kwargs):
+    QuotaUsage.release(instance.owner_id, 'customers')
+
+
+@receiver(post_delete, sender=User)
+def release_staff_quota(sender, instance, **kwargs):
+    if instance.parent_id and instance.is_active:
+        QuotaUsage.release(instance.parent_id, 'staff')
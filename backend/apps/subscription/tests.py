@@ -0,0 +1,116 @@
+from datetime import timedelta
+from unittest import mock
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from apps.auth_app.models import User
+from apps.customer.models import Customer
+from apps.customer.services import CustomerService
+from apps.super_admin.models import SystemSettings
+from . import quotas
+from .models import QuotaUsage, SubscriptionPlan, UserSubscription
+from .services import SubscriptionStateService
+
+
+class QuotaTests(TestCase):
+    """Test plan limits enforced from cached entitlements and usage counters."""
+
+    def setUp(self):
+        cache.clear()
+        self.owner = User.objects.create_user(phone='9000000070', password='test123', is_superuser=True)
+        self.plan = SubscriptionPlan.objects.create(
+            name='Starter', code='STARTER', customer_limit='2', invoice_limit='Unlimited', max_staff_users=1
+        )
+        self.subscription = UserSubscription.objects.create(
+            user=self.owner, plan=self.plan, end_date=timezone.now() + timedelta(days=30)
+        )
+
+    def test_parse_limit(self):
+        self.assertEqual(quotas.parse_limit('100'), 100)
+        self.assertIsNone(quotas.parse_limit('Unlimited'))
+        self.assertIsNone(quotas.parse_limit(None))
+
+    def test_customer_quota_is_checked_without_counting(self):
+        """Test creates move the counter, the limit is enforced and a delete frees a slot."""
+        CustomerService.create_customer(self.owner, {'phone': '9111111111', 'name': 'First'})
+        with CaptureQueriesContext(connection) as queries:
+            CustomerService.create_customer(self.owner, {'phone': '9111111112', 'name': 'Second'})
+        self.assertFalse([q['sql'] for q in queries if 'COUNT(' in q['sql'].upper()])
+
+        with self.assertRaises(ValidationError):
+            CustomerService.create_customer(self.owner, {'phone': '9111111113', 'name': 'Third'})
+        self.assertEqual(Customer.objects.filter(owner=self.owner).count(), 2)
+
+        Customer.objects.filter(owner=self.owner).first().delete()
+        self.assertEqual(QuotaUsage.objects.get(owner=self.owner).customers, 1)
+        CustomerService.create_customer(self.owner, {'phone': '9111111113', 'name': 'Third'})
+
+    def test_import_stops_at_the_customer_quota(self):
+        """Test a bulk import creates customers only up to the plan limit."""
+        from apps.common.models import BackgroundJob
+        from apps.customer.services import CustomerImportService
+        job = BackgroundJob.objects.create(job_type='customer_import', owner=self.owner)
+        rows = [(index + 2, {'phone': f'911111112{index}', 'name': f'Imported {index}'}) for index in range(3)]
+        result = CustomerImportService.import_rows(job, rows)
+
+        self.assertEqual((result['created'], result['failed']), (2, 1))
+        self.assertEqual(Customer.objects.filter(owner=self.owner).count(), 2)
+        self.assertEqual(QuotaUsage.objects.get(owner=self.owner).customers, 2)
+        job.refresh_from_db()
+        self.assertEqual(job.error_report[0]['row'], 4)
+
+    def test_plan_change_and_expiry_refresh_entitlements(self):
+        self.assertEqual(quotas.entitlements(self.owner)['customers'], 2)
+        self.plan.customer_limit = 'Unlimited'
+        self.plan.save()
+        self.assertIsNone(quotas.entitlements(self.owner)['customers'])
+
+        # Nothing is written when the plan runs out; the cached end date lapses it
+        with mock.patch('apps.subscription.quotas.timezone.now', return_value=timezone.now() + timedelta(days=31)):
+            with self.assertNumQueries(0):
+                self.assertEqual(quotas.entitlements(self.owner)['staff'], 0)
+
+    def test_reconcile_rebuilds_counters(self):
+        Customer.objects.create(phone='9111111114', name='Imported', owner=self.owner)
+        QuotaUsage.objects.create(owner=self.owner, customers=5)
+        QuotaUsage.recount_all()
+        usage = QuotaUsage.objects.get(owner=self.owner)
+        self.assertEqual((usage.customers, usage.invoice_month), (1, QuotaUsage.current_month()))
+
+
+class SubscriptionStateTests(TestCase):
+    """Test cached login status and the set-based expiry/upgrade sweep."""
+
+    def setUp(self):
+        cache.clear()
+        SystemSettings.objects.create(grace_period_days=3)
+        self.trial = SubscriptionPlan.objects.create(name='Trial', code='FREE', duration_days=7)
+        self.basic = SubscriptionPlan.objects.create(name='Basic', code='BASIC', duration_days=30)
+        self.owner = User.objects.create_user(phone='9000000071', password='test123')
+        self.subscription = UserSubscription.objects.create(
+            user=self.owner, plan=self.trial, end_date=timezone.now() - timedelta(days=1)
+        )
+
+    def test_access_is_cached_and_honours_grace_period(self):
+        self.assertTrue(SubscriptionStateService.has_access(self.owner))
+        with self.assertNumQueries(0):
+            self.assertTrue(SubscriptionStateService.has_access(self.owner))
+        self.assertFalse(SubscriptionStateService.has_access(self.owner, now=timezone.now() + timedelta(days=3)))
+
+    def test_sweep_expires_after_grace_then_upgrades_trials(self):
+        other = User.objects.create_user(phone='9000000072', password='test123')
+        UserSubscription.objects.create(user=other, plan=self.basic, end_date=timezone.now() - timedelta(days=5))
+
+        self.assertEqual(SubscriptionStateService.sweep()['expired'][0]['user_id'], other.id)
+        self.assertFalse(SubscriptionStateService.has_access(other))
+
+        # Four days later the trial is past its grace period too: expired, then upgraded
+        result = SubscriptionStateService.sweep(now=timezone.now() + timedelta(days=3))
+        self.assertEqual([row['user_id'] for row in result['expired']], [self.owner.id])
+        self.assertEqual([user['phone'] for user in result['upgraded']], [self.owner.phone])
+        self.subscription.refresh_from_db()
+        self.assertEqual((self.subscription.plan, self.subscription.status), (self.basic, 'ACTIVE'))
+        self.assertEqual(SubscriptionStateService.get_state(self.owner.id)['plan_code'], 'BASIC')
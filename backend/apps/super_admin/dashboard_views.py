@@ -8,6 +8,7 @@ from django.utils import timezone
 from datetime import timedelta
 from apps.auth_app.models import User
 from apps.subscription.models import UserSubscription, SubscriptionPlan
+from .services import PlatformMetricsService, PlatformReportService
 # Import Invoice if available for total revenue, else mock or use placeholder
 # from apps.billing.models import Invoice 
 
@@ -18,37 +19,20 @@ class DashboardStatsView(APIView):
     permission_classes = [IsSuperAdmin]
 
     def get(self, request):
-        # Basic user counts - Only owners (parent__isnull=True)
-        total_users = User.objects.filter(is_super_admin=False, parent__isnull=True).count()  # Exclude Super Admin and staff
-        active_owners = User.objects.filter(is_active=True, is_super_admin=False, parent__isnull=True).count()
-        
-        # Subscription stats
-        active_subscriptions = UserSubscription.objects.filter(status="ACTIVE").count()
-        expired_subscriptions = UserSubscription.objects.filter(status="EXPIRED").count()
-        
-        # New signups in last 7 days (exclude Super Admin and staff - only owners)
-        seven_days_ago = timezone.now() - timedelta(days=7)
-        new_signups = User.objects.filter(date_joined__gte=seven_days_ago, is_super_admin=False, parent__isnull=True).count()
-        
-        # Revenue calculation (from UserSubscription price or mocked)
-        # This sums up all active subscription prices as monthly revenue estimate
-        active_subs = UserSubscription.objects.filter(status="ACTIVE")
-        total_revenue = sum([
-            float(sub.plan.price) if hasattr(sub.plan, 'price') else 0 
-            for sub in active_subs
-        ])
-        
-        # Failed payments (mocked - 10% of expired subscriptions as estimate)
-        failed_payments = max(0, expired_subscriptions // 3) if expired_subscriptions > 0 else 0
+        metrics = PlatformMetricsService.get_metrics()
+        # Failed payments (mocked - a third of expired subscriptions as estimate)
+        failed_payments = metrics['expired_subscriptions'] // 3
         
         return Response({
-            "total_users": total_users,
-            "active_owners": active_owners,
-            "active_subscriptions": active_subscriptions,
-            "total_revenue": int(total_revenue),
-            "new_signups": new_signups,
+            "total_users": metrics['total_users'],
+            "active_owners": metrics['active_owners'],
+            "active_subscriptions": metrics['active_subscriptions'],
+            "total_revenue": int(metrics['total_revenue']),
+            "mrr": float(metrics['mrr']),
+            "new_signups": metrics['new_signups'],
             "failed_payments": failed_payments,
-            "expired_subscriptions": expired_subscriptions,
+            "expired_subscriptions": metrics['expired_subscriptions'],
+            "cancelled_subscriptions": metrics['cancelled_subscriptions'],
             "system_health": "Healthy"
         })
 
@@ -62,20 +46,15 @@ class GlobalReportsView(APIView):
         report_type = request.query_params.get('type')
         
         if report_type == 'revenue':
-            # return 12 months data
+            # Monthly revenue, last 12 months by default
+            try:
+                start, end, interval = PlatformReportService.parse_window(request.query_params, default='12m')
+            except Exception as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            label = '%d %b' if interval == 'day' else '%b'
             data = [
-                {"name": "Jan", "value": 40000},
-                {"name": "Feb", "value": 30000},
-                {"name": "Mar", "value": 20000},
-                {"name": "Apr", "value": 27800},
-                {"name": "May", "value": 18900},
-                {"name": "Jun", "value": 23900},
-                {"name": "Jul", "value": 34900},
-                {"name": "Aug", "value": 45000},
-                {"name": "Sep", "value": 52000},
-                {"name": "Oct", "value": 61000},
-                {"name": "Nov", "value": 67000},
-                {"name": "Dec", "value": 75000},
+                {"name": row['period'].strftime(label), "value": float(row['revenue'])}
+                for row in PlatformReportService.revenue_trend(start, end, interval)
             ]
             return Response({"data": data})
 
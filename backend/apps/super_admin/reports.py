@@ -9,6 +9,7 @@ from datetime import timedelta
 from apps.auth_app.models import User
 from apps.billing.models import Invoice
 from apps.subscription.models import UserSubscription, SubscriptionPlan
+from .services import PlatformReportService
 
 class ReportsView(APIView):
     """Reports API for Super Admin"""
@@ -31,23 +32,14 @@ class ReportsView(APIView):
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 
     def get_revenue_trend(self, request):
-        """Get revenue trend for last 30 days"""
-        data = []
-        today = timezone.now().date()
-        
-        for i in range(29, -1, -1):
-            date = today - timedelta(days=i)
-            daily_revenue = Invoice.objects.filter(
-                status='completed',
-                invoice_date__date=date
-            ).aggregate(total=Sum('total_amount'))['total'] or 0
-            
-            data.append({
-                'name': date.strftime('%d %b'),
-                'value': float(daily_revenue)
-            })
-        
-        return Response({'data': data})
+        """Get revenue trend (last 30 days by default; see PlatformReportService.parse_window)"""
+        start, end, interval = PlatformReportService.parse_window(request.query_params)
+        label = '%d %b' if interval == 'day' else '%b %Y'
+        data = [
+            {'name': row['period'].strftime(label), 'value': float(row['revenue']), 'invoices': row['invoices']}
+            for row in PlatformReportService.revenue_trend(start, end, interval)
+        ]
+        return Response({'data': data, 'start': start, 'end': end, 'interval': interval})
 
     def get_subscription_plans(self, request):
         """Get subscription plan distribution"""
@@ -71,24 +63,18 @@ class ReportsView(APIView):
 
     def get_top_businesses(self, request):
         """Get top performing businesses by revenue"""
+        start, end, _ = PlatformReportService.parse_window(request.query_params, default='12m')
         try:
-            businesses = User.objects.filter(is_super_admin=False).annotate(
-                revenue=Sum('invoices__total_amount', filter=Q(invoices__status='completed')),
-                active_subs=Count('usersubscription', filter=Q(usersubscription__status='ACTIVE'))
-            ).filter(revenue__gt=0).order_by('-revenue')[:5]
-            
-            data = []
-            for business in businesses:
-                business_name = f"{business.first_name} {business.last_name}".strip()
-                if not business_name:
-                    business_name = business.phone
-                
-                data.append({
-                    'name': business_name,
-                    'revenue': float(business.revenue or 0),
-                    'subscriptions': business.active_subs or 0
-                })
-        except Exception as e:
-            data = []
-        
+            limit = min(int(request.query_params.get('limit', 5)), 100)
+        except ValueError:
+            limit = 5
+        data = [
+            {
+                'name': business['name'],
+                'revenue': float(business['revenue']),
+                'invoices': business['invoices'],
+                'subscriptions': business['subscriptions']
+            }
+            for business in PlatformReportService.top_tenants(start, end, limit)
+        ]
         return Response({'data': data})
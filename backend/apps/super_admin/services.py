@@ -0,0 +1,188 @@
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Case, Count, DateField, DecimalField, ExpressionWrapper, F, Q, Sum, When
+from django.db.models.functions import TruncDay, TruncMonth
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from apps.auth_app.models import User
+from apps.billing.models import Invoice
+from apps.subscription.models import UserSubscription
+
+
+class PlatformMetricsService:
+    """
+    Tenant and subscription headline numbers for the Super Admin dashboard.
+
+    Owners are counted with one conditional aggregate over `User` and
+    subscriptions (per status, plus revenue) with one over `UserSubscription`
+    joined to its plan, so the cost does not grow with the number of tenants'
+    rows returned. The result is cached for a short TTL since every dashboard
+    refresh asks for the same numbers.
+    """
+    CACHE_KEY = "platform_metrics"
+    SIGNUP_WINDOW_DAYS = 7
+
+    @staticmethod
+    def _owner_metrics(now):
+        since = now - timedelta(days=PlatformMetricsService.SIGNUP_WINDOW_DAYS)
+        return User.objects.filter(is_super_admin=False, parent__isnull=True).aggregate(
+            total_users=Count('id'),
+            active_owners=Count('id', filter=Q(is_active=True)),
+            new_signups=Count('id', filter=Q(date_joined__gte=since)),
+        )
+
+    @staticmethod
+    def _subscription_metrics():
+        active = Q(status='ACTIVE')
+        # Plan price spread over its duration and scaled to 30 days; open-ended plans count once
+        monthly_price = Case(
+            When(plan__duration_days__gt=0, then=ExpressionWrapper(
+                F('plan__price') * 30 / F('plan__duration_days'), output_field=DecimalField(max_digits=14, decimal_places=2)
+            )),
+            default=F('plan__price'),
+            output_field=DecimalField(max_digits=14, decimal_places=2),
+        )
+        metrics = UserSubscription.objects.aggregate(
+            active_subscriptions=Count('id', filter=active),
+            expired_subscriptions=Count('id', filter=Q(status='EXPIRED')),
+            cancelled_subscriptions=Count('id', filter=Q(status='CANCELLED')),
+            total_revenue=Sum('plan__price', filter=active),
+            mrr=Sum(monthly_price, filter=active),
+        )
+        metrics['total_revenue'] = metrics['total_revenue'] or Decimal('0')
+        metrics['mrr'] = (metrics['mrr'] or Decimal('0')).quantize(Decimal('0.01'))
+        return metrics
+
+    @classmethod
+    def build(cls, now=None):
+        now = now or timezone.now()
+        metrics = cls._owner_metrics(now)
+        metrics.update(cls._subscription_metrics())
+        metrics['generated_at'] = now
+        return metrics
+
+    @classmethod
+    def get_metrics(cls):
+        metrics = cache.get(cls.CACHE_KEY)
+        if metrics is None:
+            metrics = cls.build()
+            cache.set(cls.CACHE_KEY, metrics, getattr(settings, 'PLATFORM_METRICS_CACHE_TIMEOUT', 60))
+        return metrics
+
+    @classmethod
+    def invalidate(cls):
+        cache.delete(cls.CACHE_KEY)
+
+
+class PlatformReportService:
+    """
+    Cross-tenant revenue reports over an arbitrary window.
+
+    Each report is a single grouped query over completed invoices (served by the
+    status/date/owner covering index on `Invoice`): the trend is bucketed with
+    TruncDay/TruncMonth and gaps are zero-filled in Python, and the tenant
+    ranking groups by owner and keeps the top N.
+    """
+    INTERVALS = {'day': TruncDay, 'month': TruncMonth}
+
+    @staticmethod
+    def _parse_date(value, field):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except (TypeError, ValueError):
+            raise ValidationError({field: "Use the YYYY-MM-DD format."})
+
+    @classmethod
+    def parse_window(cls, params, default='30d'):
+        """
+        (start, end, interval) for `range`: '<n>d', '<n>m', 'ytd' or 'custom'
+        (with start/end dates). End is inclusive; `interval` may override the
+        default bucket (days up to ~3 months, months beyond).
+        """
+        today = timezone.localdate()
+        window = params.get('range') or default
+        if window == 'ytd':
+            start, end = today.replace(month=1, day=1), today
+        elif window == 'custom':
+            start = cls._parse_date(params.get('start'), 'start')
+            end = cls._parse_date(params.get('end'), 'end') if params.get('end') else today
+        elif window[:-1].isdigit() and window[-1] in 'dm' and int(window[:-1]) > 0:
+            count = int(window[:-1])
+            if window[-1] == 'd':
+                start = today - timedelta(days=count - 1)
+            else:
+                months = today.year * 12 + today.month - count
+                start = date(months // 12, months % 12 + 1, 1)
+            end = today
+        else:
+            raise ValidationError({'range': "Use '<n>d', '<n>m', 'ytd' or 'custom'."})
+        if start > end:
+            raise ValidationError({'start': "Start date must be on or before the end date."})
+
+        interval = params.get('interval') or ('day' if (end - start).days <= 92 else 'month')
+        if interval not in cls.INTERVALS:
+            raise ValidationError({'interval': f"Choose one of: {', '.join(cls.INTERVALS)}."})
+        return start, end, interval
+
+    @staticmethod
+    def _completed_between(start, end):
+        tz = timezone.get_current_timezone()
+        return Invoice.objects.filter(
+            status='completed',
+            invoice_date__gte=datetime.combine(start, datetime.min.time(), tzinfo=tz),
+            invoice_date__lt=datetime.combine(end + timedelta(days=1), datetime.min.time(), tzinfo=tz),
+        )
+
+    @staticmethod
+    def _buckets(start, end, interval):
+        if interval == 'day':
+            return [start + timedelta(days=offset) for offset in range((end - start).days + 1)]
+        buckets, month = [], start.replace(day=1)
+        while month <= end:
+            buckets.append(month)
+            month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+        return buckets
+
+    @classmethod
+    def revenue_trend(cls, start, end, interval='day'):
+        """[{'period', 'revenue', 'invoices'}] for every bucket in the window, gaps as zero."""
+        trunc = cls.INTERVALS[interval]('invoice_date', output_field=DateField())
+        totals = {
+            row['period']: row
+            for row in cls._completed_between(start, end).order_by().values(period=trunc).annotate(
+                revenue=Sum('total_amount'), invoices=Count('id')
+            )
+        }
+        return [
+            {
+                'period': bucket,
+                'revenue': totals[bucket]['revenue'] if bucket in totals else Decimal('0'),
+                'invoices': totals[bucket]['invoices'] if bucket in totals else 0,
+            }
+            for bucket in cls._buckets(start, end, interval)
+        ]
+
+    @classmethod
+    def top_tenants(cls, start, end, limit=5):
+        """Owners ranked by completed-invoice revenue in the window."""
+        rows = cls._completed_between(start, end).filter(owner__isnull=False).order_by().values(
+            'owner_id',
+            first_name=F('owner__first_name'),
+            last_name=F('owner__last_name'),
+            phone=F('owner__phone'),
+            subscription_status=F('owner__subscription__status'),
+        ).annotate(revenue=Sum('total_amount'), invoices=Count('id')).order_by('-revenue')[:limit]
+        return [
+            {
+                'owner_id': row['owner_id'],
+                'name': f"{row['first_name']} {row['last_name']}".strip() or row['phone'],
+                'revenue': row['revenue'] or Decimal('0'),
+                'invoices': row['invoices'],
+                'subscriptions': 1 if row['subscription_status'] == 'ACTIVE' else 0,
+            }
+            for row in rows
+        ]
@@ -0,0 +1,72 @@
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from apps.auth_app.models import User
+from apps.billing.models import Invoice
+from apps.subscription.models import SubscriptionPlan, UserSubscription
+from .services import PlatformMetricsService, PlatformReportService
+
+
+class PlatformMetricsServiceTests(TestCase):
+    """Test dashboard metrics come from two aggregates and are cached."""
+
+    def setUp(self):
+        cache.clear()
+        monthly = SubscriptionPlan.objects.create(name='Basic', code='BASIC_M', price=Decimal('600.00'), duration_days=30)
+        yearly = SubscriptionPlan.objects.create(name='Basic Yearly', code='BASIC_Y', price=Decimal('3650.00'), duration_days=365)
+        end = timezone.now() + timedelta(days=30)
+        for index, (plan, status) in enumerate([(monthly, 'ACTIVE'), (yearly, 'ACTIVE'), (monthly, 'EXPIRED')]):
+            owner = User.objects.create_user(phone=f'900000008{index}', password='test123')
+            UserSubscription.objects.create(user=owner, plan=plan, status=status, end_date=end)
+        User.objects.create_user(phone='9000000089', password='test123', parent=owner)
+        User.objects.create_user(phone='9000000090', password='test123', is_super_admin=True)
+
+    def test_metrics_in_two_queries_then_cached(self):
+        with self.assertNumQueries(2):
+            metrics = PlatformMetricsService.get_metrics()
+        self.assertEqual((metrics['total_users'], metrics['active_owners'], metrics['new_signups']), (3, 3, 3))
+        self.assertEqual((metrics['active_subscriptions'], metrics['expired_subscriptions']), (2, 1))
+        self.assertEqual(metrics['total_revenue'], Decimal('4250.00'))
+        self.assertEqual(metrics['mrr'], Decimal('900.00'))
+        with self.assertNumQueries(0):
+            PlatformMetricsService.get_metrics()
+
+    def test_subscription_write_drops_cached_metrics(self):
+        PlatformMetricsService.get_metrics()
+        UserSubscription.objects.filter(status='EXPIRED').get().delete()
+        metrics = PlatformMetricsService.get_metrics()
+        self.assertEqual((metrics['active_subscriptions'], metrics['expired_subscriptions']), (2, 0))
+
+
+class PlatformReportServiceTests(TestCase):
+    """Test grouped revenue trend and tenant ranking."""
+
+    def setUp(self):
+        self.today = timezone.localdate()
+        self.shop = User.objects.create_user(phone='9000000091', password='test123', first_name='Shop')
+        self.mart = User.objects.create_user(phone='9000000092', password='test123')
+        for number, owner, days_ago, total in [('A1', self.shop, 0, '100.00'), ('A2', self.shop, 2, '50.00'), ('B1', self.mart, 2, '300.00')]:
+            invoice = Invoice.objects.create(invoice_number=number, owner=owner, status='completed', total_amount=Decimal(total))
+            Invoice.objects.filter(pk=invoice.pk).update(invoice_date=timezone.now() - timedelta(days=days_ago))
+        Invoice.objects.create(invoice_number='D1', owner=self.mart, status='draft', total_amount=Decimal('999.00'))
+
+    def test_revenue_trend_is_one_query_with_zero_fill(self):
+        start, end, interval = PlatformReportService.parse_window({'range': '5d'})
+        self.assertEqual((end - start).days, 4)
+        with self.assertNumQueries(1):
+            trend = PlatformReportService.revenue_trend(start, end, interval)
+        self.assertEqual([row['revenue'] for row in trend], [0, 0, Decimal('350.00'), 0, Decimal('100.00')])
+
+        start, end, interval = PlatformReportService.parse_window({'range': '12m'})
+        self.assertEqual(interval, 'month')
+        trend = PlatformReportService.revenue_trend(start, end, interval)
+        self.assertEqual(len(trend), 12)
+        self.assertEqual(sum(row['invoices'] for row in trend), 3)
+
+    def test_top_tenants_ranked_in_one_query(self):
+        start, end, _ = PlatformReportService.parse_window({'range': 'custom', 'start': str(self.today - timedelta(days=7))})
+        with self.assertNumQueries(1):
+            ranking = PlatformReportService.top_tenants(start, end, limit=5)
+        self.assertEqual([(row['name'], row['revenue']) for row in ranking], [('9000000092', Decimal('300.00')), ('Shop', Decimal('150.00'))])
@@ -13,7 +13,9 @@ from apps.auth_app.models import User
 from apps.billing.models import Invoice
 from apps.payment.models import Payment
 from apps.subscription.models import UserSubscription, SubscriptionPlan
+from apps.subscription.services import SubscriptionStateService
 from .models import SystemSettings, ActivityLog, Unit, SystemNotification
+from .services import PlatformMetricsService
 from .serializers import (
     UserListSerializer,
     UserDetailSerializer,
@@ -31,28 +33,7 @@ class DashboardStatsView(APIView):
     def get(self, request):
         """Get dashboard statistics for super admin"""
         try:
-            # Total users (excluding super admin and staff - only owners)
-            total_users = User.objects.filter(is_super_admin=False, parent__isnull=True).count()
-            
-            # Active owners
-            active_owners = User.objects.filter(is_active=True, is_super_admin=False, parent__isnull=True).count()
-            
-            # Active subscriptions
-            active_subscriptions = UserSubscription.objects.filter(status='ACTIVE').count()
-            
-            # Total revenue (sum of all subscription prices)
-            total_revenue = 0
-            try:
-                subs = UserSubscription.objects.filter(status='ACTIVE')
-                for sub in subs:
-                    if hasattr(sub.plan, 'price'):
-                        total_revenue += float(sub.plan.price)
-            except:
-                total_revenue = 0
-            
-            # New signups in last 7 days
-            seven_days_ago = timezone.now() - timedelta(days=7)
-            new_signups = User.objects.filter(date_joined__gte=seven_days_ago, is_super_admin=False, parent__isnull=True).count()
+            metrics = PlatformMetricsService.get_metrics()
             
             # Failed payments (unpaid invoices)
             try:
@@ -60,17 +41,15 @@ class DashboardStatsView(APIView):
             except:
                 failed_payments = 0
             
-            # Expired subscriptions
-            expired_subscriptions = UserSubscription.objects.filter(status='EXPIRED').count()
-            
             return Response({
-                'total_users': total_users,
-                'active_owners': active_owners,
-                'active_subscriptions': active_subscriptions,
-                'total_revenue': int(total_revenue),
-                'new_signups': new_signups,
+                'total_users': metrics['total_users'],
+                'active_owners': metrics['active_owners'],
+                'active_subscriptions': metrics['active_subscriptions'],
+                'total_revenue': int(metrics['total_revenue']),
+                'mrr': float(metrics['mrr']),
+                'new_signups': metrics['new_signups'],
                 'failed_payments': failed_payments,
-                'expired_subscriptions': expired_subscriptions,
+                'expired_subscriptions': metrics['expired_subscriptions'],
             })
         except Exception as e:
             return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
@@ -819,11 +798,8 @@ class CleanupView(APIView):
         try:
             now = timezone.now()
             
-            # 1. Update Expired Subscriptions
-            expired_count = UserSubscription.objects.filter(
-                end_date__lt=now, 
-                status='ACTIVE'
-            ).update(status='EXPIRED')
+            # 1. Expire subscriptions past their grace period (one UPDATE)
+            expired_count = len(SubscriptionStateService.expire_lapsed(now))
 
             # 2. Cleanup Inactive Owners (e.g. registered but never logged in / no subscription for > 90 days)
             # This is a safe cleanup implementation
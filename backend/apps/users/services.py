@@ -12,6 +12,7 @@ from .repositories import (
 )
 from .serializers import UserSerializer, StaffCreateSerializer, RolePermissionSerializer, UserRoleSerializer, PermissionSerializer
 from apps.auth_app.serializers import UserMinimalSerializer
+from apps.subscription import quotas
 
 logger = logging.getLogger(__name__)
 audit_logger = logging.getLogger('audit')
@@ -79,24 +80,14 @@ class StaffService:
             if not has_permission(owner, 'manage_users'):
                 raise PermissionDenied("You do not have permission to manage users.")
 
-        # 2. Check Staff Limit
-        max_staff = owner.get_max_staff_allowed()
-        if max_staff != -1:
-            current_count = StaffRepository.get_active_staff_count(owner)
-            if current_count >= max_staff:
-                if max_staff == 0:
-                    raise ValidationError({"detail": "You must subscribe to a plan to add team members."})
-                raise ValidationError(
-                    {"detail": f"You have reached the maximum number of staff members ({max_staff}) allowed for your current plan. Please upgrade to add more staff."}
-                )
-
-        # 3. Create Staff User
+        # 2. Create Staff User against the plan's staff quota
         with transaction.atomic():
             serializer = StaffCreateSerializer(data=serializer_data)
             serializer.is_valid(raise_exception=True)
+            quotas.reserve(owner, 'staff')
             staff_user = serializer.save(parent=owner)
             
-            # 4. Assign Role
+            # 3. Assign Role
             role = RoleRepository.get_role_by_name("SALES_EXECUTIVE")
             if role:
                 UserRoleRepository.assign_role(staff_user, role)
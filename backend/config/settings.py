@@ -96,6 +96,20 @@ DATABASES = {
     }
 }
 
+# Cache
+# Cached entitlements, subscription state, discount rules and reports are
+# invalidated by bumping or deleting keys here, so every worker process must
+# share one cache. Set REDIS_URL in production; without it a non-debug deploy
+# falls back to the database cache (run `python manage.py createcachetable`).
+# The per-process local-memory cache is only for single-process development.
+REDIS_URL = os.getenv('REDIS_URL')
+if REDIS_URL:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': REDIS_URL}}
+elif DEBUG:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+else:
+    CACHES = {'default': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'django_cache'}}
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -115,6 +129,13 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Bulk product import: image_path columns are resolved inside this directory only
+PRODUCT_IMPORT_IMAGE_ROOT = os.getenv('PRODUCT_IMPORT_IMAGE_ROOT', os.path.join(MEDIA_ROOT, 'imports'))
+
+# Document numbers reserved per counter round trip, e.g. {'grn': 20}. Blocks >1 trade
+# gap-free numbering for fewer locks on the shared counter row.
+DOCUMENT_SEQUENCE_BLOCK_SIZES = {}
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'auth_app.User'
 